@@ -0,0 +1,132 @@
+""" Sharded parallel (re)load of every CSV file, e.g. after db_init.py recreated the tables or after
+    surrogate_key_columns changed (run db_init.py first then, old keys would not match).
+    Files are cut into shards that workers process and merge in parallel, each worker with its own
+    database connection. A shard is not one transaction: every merge commits on its own, once per
+    mapping type for the shard's regular files and once per chunk of a streamed file. One worker commits
+    its merges one after another, merges of different workers overlap. Files of one mapping_type/bank/
+    acc_type can share keys; an anti-join merge cannot see rows of another worker's uncommitted merge, so
+    such files only go to different shards with --strategy on_conflict on a table with a unique
+    surrogate_key (otherwise every group is one shard). Finished shards are checkpointed, so a rerun
+    resumes an interrupted backfill; a shard that failed halfway keeps its committed merges and is simply
+    merged again (merging is idempotent).
+    Secondary indexes are dropped for the load and created again afterwards, aggregate tables are
+    rebuilt once at the end.
+
+    Usage: python backfill.py [--workers 4] [--executor process] [--shard-mb 64] [--strategy on_conflict] [--restart] """
+
+import os
+import logging
+import argparse
+import multiprocessing
+from typing import List
+from config import logger
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from db_init import DatabaseInitializer
+from utils.manifest import RunManifest
+from utils.db_manager import DatabaseManager
+from utils.instrumentation import REPORT
+from utils.backfill import MB, plan_shards, init_worker, load_shard
+from config.settings import config_loader, csv_files_loader, DATA_CONFIG_PATH, CSV_FILES_DIR, DATABASE_URL, DB_CONFIG_PATH, MANIFEST_PATH
+from config.settings import CSV_WORKERS, CSV_EXECUTOR, DEDUP_STRATEGY, COMPACT_FRAMES, PROFILER, BACKFILL_SHARD_MB, BACKFILL_CHECKPOINT_PATH
+
+log = logging.getLogger()
+
+EXECUTORS = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=max(CSV_WORKERS, os.cpu_count() or 1), help="Shards loaded in parallel (default: %(default)s)")
+    parser.add_argument('--executor', choices=list(EXECUTORS), default=CSV_EXECUTOR, help="Worker pool type (default: %(default)s)")
+    parser.add_argument('--shard-mb', type=float, default=BACKFILL_SHARD_MB, help="Approximate CSV size of a shard (default: %(default)s)")
+    parser.add_argument('--strategy', choices=list(DatabaseManager.DEDUP_STRATEGIES), default=DEDUP_STRATEGY, help="Merge strategy, see DatabaseManager.merge_records (default: %(default)s)")
+    parser.add_argument('--compact', action=argparse.BooleanOptionalAction, default=COMPACT_FRAMES, help="Keep processed frames in the compact layout until upload (default: %(default)s)")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of an earlier backfill and load every file")
+    return parser.parse_args()
+
+def run_shards(shards: List[List[str]], workers: int, executor: str, strategy: str, compact: bool, checkpoint: RunManifest, data_config: dict) -> List[List[str]]:
+    # Loads shards in a worker pool, checkpoints each one that succeeded. Returns the failed shards.
+    process = executor == 'process'
+    pool_kwargs = {'mp_context': multiprocessing.get_context('spawn')} if process else {}
+    failed = []
+    with EXECUTORS[executor](max_workers=min(workers, len(shards)), initializer=init_worker, initargs=(process, compact), **pool_kwargs) as pool:
+        futures = [pool.submit(load_shard, shard, strategy) for shard in shards]
+        for number, (shard, future) in enumerate(zip(shards, futures), start=1):
+            try:
+                success, loaded, stage_records = future.result()
+            except Exception as e:
+                # Worker died (e.g. BrokenProcessPool) - the shard is retried, the rest goes on
+                log.error(f"Backfill: Worker failed on a shard of {len(shard)} files. Error: {e}")
+                success, loaded, stage_records = False, [], []
+            REPORT.add(stage_records)
+            if not success:
+                failed.append(shard)
+                continue
+
+            for csv_file_path in loaded:
+                checkpoint.record(csv_file_path, RunManifest.config_version(RunManifest.file_config(csv_file_path, data_config)[1]))
+            checkpoint.save()
+            log.info(f"Backfill: Shard {number}/{len(shards)} done ({len(loaded)} files)")
+    return failed
+
+def shard_bytes(db_manager: DatabaseManager, strategy: str, shard_mb: float, workers: int) -> float:
+    # Shard size limit. Groups are only split where concurrent merges of the same key are safe:
+    # ON CONFLICT waits for the other transaction and then skips the key, an anti-join would insert it twice
+    unique = all(db_manager.has_unique_key(mapping_type) for mapping_type in db_manager.table_names)
+    if strategy == 'on_conflict' and not unique:
+        raise ValueError("Backfill: Strategy 'on_conflict' needs a unique or primary key on surrogate_key alone")
+    if workers > 1 and strategy != 'on_conflict':
+        log.warning("Backfill: Strategy 'anti_join' with parallel workers, every mapping_type/bank/acc_type is loaded as one shard")
+        return float('inf')
+    return shard_mb * MB
+
+def backfill(workers: int, executor: str, shard_mb: float, strategy: str, compact: bool, restart: bool):
+    if restart and os.path.exists(BACKFILL_CHECKPOINT_PATH):
+        os.remove(BACKFILL_CHECKPOINT_PATH)
+    checkpoint = RunManifest(BACKFILL_CHECKPOINT_PATH)
+    data_config = config_loader(DATA_CONFIG_PATH)
+    csv_files_paths = csv_files_loader(CSV_FILES_DIR)
+    pending = checkpoint.changed_files(csv_files_paths, data_config)
+    db_manager = DatabaseManager(DATABASE_URL, DB_CONFIG_PATH)
+    shards = plan_shards(pending, data_config, shard_bytes(db_manager, strategy, shard_mb, workers))
+    log.info(f"Backfill: {len(csv_files_paths) - len(pending)} files loaded by an earlier backfill, {len(pending)} files in {len(shards)} shards to load")
+
+    initializer = DatabaseInitializer(db_manager)
+    initializer.drop_secondary_indexes()
+    failed = []
+    try:
+        if shards:
+            failed = run_shards(shards, workers, executor, strategy, compact, checkpoint, data_config)
+        if failed:
+            # E.g. a lost connection or a worker that died
+            log.warning(f"Backfill: Retrying {len(failed)} failed shards one at a time")
+            failed = run_shards(failed, 1, executor, strategy, compact, checkpoint, data_config)
+    finally:
+        # Also after a failure: the tables stay usable while the backfill is resumed
+        with REPORT.stage('backfill indexes'):
+            initializer.migrate()
+        with REPORT.stage('backfill aggregates'):
+            db_manager.rebuild_aggregates()
+
+    if failed:
+        raise RuntimeError(f"Backfill: {len(failed)} shards failed, run the backfill again to resume")
+
+    # Backfilled files count as uploaded for regular runs, the checkpoint is done
+    manifest = RunManifest(MANIFEST_PATH)
+    manifest.entries.update(checkpoint.entries)
+    manifest.save()
+    if os.path.exists(BACKFILL_CHECKPOINT_PATH):
+        os.remove(BACKFILL_CHECKPOINT_PATH)
+    log.info("Backfill: Finished")
+
+def main(workers: int = CSV_WORKERS, executor: str = CSV_EXECUTOR, shard_mb: float = BACKFILL_SHARD_MB, strategy: str = DEDUP_STRATEGY, compact: bool = COMPACT_FRAMES, restart: bool = False):
+    logger.setup_logger() # here, not on import: spawned worker processes import this module again (as __mp_main__)
+    REPORT.start(PROFILER)
+    try:
+        backfill(workers, executor, shard_mb, strategy, compact, restart)
+    finally:
+        REPORT.write(str(logger.run_report_path()), backfill=True, workers=workers, executor=executor, shard_mb=shard_mb, strategy=strategy, compact=compact)
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(workers=args.workers, executor=args.executor, shard_mb=args.shard_mb, strategy=args.strategy, compact=args.compact, restart=args.restart)
@@ -0,0 +1,59 @@
+""" Compares per-file pd.concat accumulation with FrameAccumulator on hundreds of synthetic files.
+    Each measurement runs in a fresh (spawned) process so peak RSS is not shared between runs.
+
+    Usage: python -m benchmarks.bench_accumulation [--files 100 200 400] [--rows 2000] """
+
+import time
+import resource
+import argparse
+import numpy as np
+import pandas as pd
+import multiprocessing as mp
+from utils.frame_accumulator import FrameAccumulator
+
+
+def make_file_frame(rows: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'surrogate_key': [f'{seed:08x}{i:024x}' for i in range(rows)]
+        , 'bank_name': 'swed'
+        , 'acc_type': 'personal'
+        , 'dt': pd.to_datetime('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, rows), unit='D')
+        , 'details': [f'Card payment {i}' for i in range(rows)]
+        , 'sum': rng.normal(0, 100, rows).round(2)
+        , 'file_name': f'swed_personal_stm_{seed}.csv'
+    })
+
+def run(mode: str, files: int, rows: int) -> dict:
+    start = time.perf_counter()
+    if mode == 'legacy':
+        ready = pd.DataFrame()
+        for seed in range(files):
+            ready = pd.concat([ready, make_file_frame(rows, seed)])
+    else:
+        accumulator = FrameAccumulator(['stm'])
+        for seed in range(files):
+            accumulator.add('stm', make_file_frame(rows, seed))
+        ready = accumulator.materialize('stm')
+    elapsed = time.perf_counter() - start
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KB on Linux
+    return {'mode': mode, 'files': files, 'rows': len(ready), 'seconds': elapsed, 'peak_rss_mb': peak_rss_mb}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, nargs='+', default=[100, 200, 400])
+    parser.add_argument('--rows', type=int, default=2000, help="Rows per synthetic file")
+    args = parser.parse_args()
+
+    context = mp.get_context('spawn')
+    print(f"{'mode':<12}{'files':>8}{'rows':>12}{'seconds':>10}{'s/file (ms)':>13}{'peak RSS MB':>13}")
+    for mode in ('legacy', 'accumulator'):
+        for files in args.files:
+            with context.Pool(1) as pool:
+                result = pool.apply(run, (mode, files, args.rows))
+            print(f"{result['mode']:<12}{result['files']:>8}{result['rows']:>12,}{result['seconds']:>10.2f}"
+                  f"{result['seconds'] / files * 1000:>13.2f}{result['peak_rss_mb']:>13.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+""" Micro-benchmark of the date columns in FileProcessor._transform, per mapping type and bank:
+    pd.to_datetime + dt.strftime('%Y-%m') per file (before) against utils.derived_columns (after),
+    on synthetic files from benchmarks.generator. Checks that both give the same values.
+
+    Usage: python -m benchmarks.bench_derived [--data-config PATH] [--files 4] [--rows 100000] [--repeat 3] """
+
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List
+from benchmarks import generator
+from utils import derived_columns
+from utils.derived_columns import date_parser, year_month
+
+# Date column -> its (year, year-month) columns, as derived in FileProcessor._transform
+DATE_COLUMNS = {
+    'stm': {'dt': ('year', 'ym')}
+    , 'sec': {'send_dt': None, 'effect_dt': ('effect_year', 'effect_ym')}
+}
+
+
+def before(df: pd.DataFrame, date_format: str, columns: Dict[str, tuple]) -> pd.DataFrame:
+    derived = {}
+    for column, parts in columns.items():
+        derived[column] = pd.to_datetime(df[column], format=date_format)
+        if parts:
+            derived[parts[0]] = derived[column].dt.year
+            derived[parts[1]] = derived[column].dt.strftime('%Y-%m')
+    return pd.DataFrame(derived)
+
+def after(df: pd.DataFrame, date_format: str, columns: Dict[str, tuple]) -> pd.DataFrame:
+    dates = date_parser(date_format)
+    derived = {}
+    for column, parts in columns.items():
+        derived[column] = dates.parse(df[column])
+        if parts:
+            derived[parts[0]] = derived[column].dt.year
+            derived[parts[1]] = year_month(derived[column])
+    return pd.DataFrame(derived)
+
+def run_files(transform: Callable, frames: List[pd.DataFrame], date_format: str, columns: Dict[str, tuple], repeat: int) -> float:
+    # Best of `repeat` runs over all files; each run starts with empty parser caches, like a new run
+    timings = []
+    for _ in range(repeat):
+        derived_columns._DATE_PARSERS.clear()
+        start = time.perf_counter()
+        for df in frames:
+            transform(df, date_format, columns)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-config', default=os.environ.get('DATA_CONFIG_PATH'), help="Data config with the 'mapping' section (default: $DATA_CONFIG_PATH)")
+    parser.add_argument('--files', type=int, default=4, help="Files per mapping_type/bank")
+    parser.add_argument('--rows', type=int, default=100_000, help="Rows per file")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the best is reported")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if not args.data_config:
+        parser.error("--data-config is not set and neither is DATA_CONFIG_PATH")
+
+    data_config = generator.load_data_config(args.data_config)
+    rng = np.random.default_rng(args.seed)
+    print(f"{'case':<24}{'rows':>10}{'before s':>11}{'after s':>10}{'speedup':>9}")
+    for mapping_type, banks in data_config['mapping'].items():
+        columns = DATE_COLUMNS.get(mapping_type)
+        if not columns:
+            continue
+        for bank, file_specific_config in banks.items():
+            # Standardized column names, raw text values, as _transform gets them
+            frames = [
+                generator.make_file_frame(args.rows, file_specific_config, rng).rename(columns=file_specific_config['original_fields'])
+                for _ in range(args.files)
+            ]
+            date_format = file_specific_config['date_format']
+            for df in frames:
+                pd.testing.assert_frame_equal(before(df, date_format, columns), after(df, date_format, columns))
+
+            before_seconds = run_files(before, frames, date_format, columns, args.repeat)
+            after_seconds = run_files(after, frames, date_format, columns, args.repeat)
+            rows = args.rows * args.files
+            print(f"{f'{mapping_type} {bank}':<24}{rows:>10}{before_seconds:>11.3f}{after_seconds:>10.3f}{before_seconds / after_seconds:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
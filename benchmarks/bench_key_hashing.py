@@ -0,0 +1,67 @@
+""" Compares the former row-wise surrogate key hashing with SurrogateKeyHasher.
+
+    Usage: python -m benchmarks.bench_key_hashing [--rows 500000] [--workers 4] """
+
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from utils.key_hasher import SurrogateKeyHasher, key_hash_pool
+
+KEY_COLUMNS = ['acc_number', 'dt', 'beneficiary', 'details', 'sum', 'dc', 'ref_no']
+
+
+def make_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ref_no = rng.integers(1, 10_000, rows).astype(float)
+    ref_no[rng.random(rows) < 0.3] = np.nan # missing reference numbers are common
+    return pd.DataFrame({
+        'acc_number': rng.choice(['EE382200221020145685', 'EE471000001020145685'], rows)
+        , 'dt': pd.to_datetime('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, rows), unit='D')
+        , 'beneficiary': rng.choice([f'Merchant {i}' for i in range(500)], rows)
+        , 'details': [f'Card payment {i}' for i in range(rows)]
+        , 'sum': rng.integers(1, 1_000_000, rows).astype(str)
+        , 'dc': rng.choice(['D', 'K'], rows)
+        , 'ref_no': ref_no
+    })
+
+def legacy_keys(df: pd.DataFrame) -> pd.Series:
+    concat_key = df[KEY_COLUMNS].astype(str).agg('#'.join, axis=1)
+    return concat_key.apply(lambda x: hashlib.md5(x.encode()).hexdigest())
+
+def batched_keys(df: pd.DataFrame, workers: int) -> pd.Series:
+    # Pool start-up is included, a run pays it once
+    pool = key_hash_pool(workers)
+    try:
+        hasher = SurrogateKeyHasher(KEY_COLUMNS, executor=pool)
+        return hasher.hash_keys(hasher.concat_keys(df))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def report(label: str, rows: int, seconds: float):
+    print(f"{label:<24}: {rows / seconds:>12,.0f} rows/sec ({seconds:.2f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    legacy, legacy_time = timed(legacy_keys, df)
+    report('legacy row-wise', args.rows, legacy_time)
+
+    for workers in sorted({1, args.workers}):
+        batched, batched_time = timed(batched_keys, df, workers)
+        assert batched.equals(legacy), "SurrogateKeyHasher output differs from legacy keys!"
+        report(f'batched, {workers} worker(s)', args.rows, batched_time)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+""" End-to-end benchmark suite on synthetic CSVs made by benchmarks.generator from the data config:
+    DataManager.process_csv_files (per worker count), get_new_records and the DatabaseManager load
+    path (upload_records into empty tables, merge_records of rows that all exist already).
+    The database is a temporary SQLite file, or BENCH_DATABASE_URL (throwaway PostgreSQL; tables are
+    created in a separate 'bench_suite' schema that is dropped afterwards).
+    Results go to a JSON file per commit, --compare diffs them against an earlier one.
+
+    Usage: python -m benchmarks.bench_suite --data-config PATH --db-config PATH [--files 4] [--rows 10000]
+           [--workers 1 4] [--repeat 3] [--output PATH] [--compare BASELINE.json] [--tolerance 0.1] """
+
+import os
+import sys
+import json
+import time
+import yaml
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Callable
+
+# config.settings reads these at import time; the suite passes its own paths explicitly
+ENV_CONFIG_PATHS = {name: os.environ.get(name) for name in ('DATA_CONFIG_PATH', 'DB_CONFIG_PATH')}
+for name in ('DATA_CONFIG_PATH', 'DB_CONFIG_PATH', 'CSV_FILES_DIR'):
+    os.environ.setdefault(name, tempfile.gettempdir())
+
+import pandas as pd
+from sqlalchemy import event, text
+from benchmarks import generator
+from utils.instrumentation import peak_rss_mb
+from utils.data_manager import DataManager
+from utils.db_manager import DatabaseManager
+
+SCHEMA = 'bench_suite'
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+MIN_REGRESSION_SECONDS = 0.01 # smaller slowdowns are timer noise, whatever the ratio
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except Exception:
+        return 'unknown'
+
+def measure(func: Callable, repeat: int, setup: Callable = None) -> Dict[str, Any]:
+    # Median and best wall time of `repeat` runs; rows from the last result
+    timings, result = [], None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    seconds = statistics.median(timings)
+    rows = result if isinstance(result, int) else None
+    return {
+        'seconds': round(seconds, 6)
+        , 'min_seconds': round(min(timings), 6)
+        , 'rows': rows
+        , 'rows_per_sec': round(rows / seconds, 1) if rows and seconds > 0 else None
+        , 'peak_rss_mb': peak_rss_mb()
+    }
+
+def bench_processing(csv_dir: str, data_config_path: str, workers_list: List[int], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for workers in workers_list:
+        def process() -> int:
+            stm_df, sec_df = DataManager(csv_dir, data_config_path, workers=workers).process_csv_files()
+            return len(stm_df) + len(sec_df)
+        results[f'process_csv_files workers={workers}'] = measure(process, repeat)
+    return results
+
+def bench_new_records(ready_data: Dict[str, pd.DataFrame], repeat: int) -> Dict[str, Dict[str, Any]]:
+    # Every other key already exists, so half of the rows are new
+    results = {}
+    for mapping_type, df in ready_data.items():
+        if df.empty:
+            continue
+        existing_keys = df[['surrogate_key']].iloc[::2].reset_index(drop=True)
+
+        def new_records() -> int:
+            DataManager.get_new_records(df, existing_keys, df_name=mapping_type)
+            return len(df)
+        results[f'get_new_records {mapping_type}'] = measure(new_records, repeat)
+    return results
+
+def write_db_config(db_config_path: str, path: str):
+    # Same tables, separate schema, so the suite never touches real tables
+    with open(db_config_path, 'r', encoding='utf-8') as file:
+        db_config = yaml.safe_load(file)
+    db_config['schema'] = SCHEMA
+    with open(path, 'w', encoding='utf-8') as file:
+        yaml.safe_dump(db_config, file)
+
+def connect(database_url: str, db_config_path: str) -> DatabaseManager:
+    manager = DatabaseManager(database_url, db_config_path)
+    if manager.engine.dialect.name == 'sqlite':
+        # SQLite has no schemas, an attached database plays its part
+        schema_file = os.path.join(os.path.dirname(db_config_path), f'{SCHEMA}.db')
+        event.listen(manager.engine, 'connect', lambda connection, _: connection.execute(f"attach database '{schema_file}' as {SCHEMA}"))
+        manager.engine.dispose() # drop the pooled connection made before the listener
+    return manager
+
+def reset_tables(manager: DatabaseManager):
+    from db_init import DatabaseInitializer # only when needed, it declares the table models on import
+    logging.getLogger().setLevel(logging.WARNING)
+    DatabaseInitializer(manager).initialize()
+
+def truncate(manager: DatabaseManager, mapping_type: str):
+    with manager.engine.begin() as connection:
+        connection.execute(text(f"delete from {SCHEMA}.{manager.table_names[mapping_type]}"))
+
+def bench_loading(manager: DatabaseManager, ready_data: Dict[str, pd.DataFrame], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for mapping_type, df in ready_data.items():
+        if df.empty:
+            continue
+
+        def upload() -> int:
+            if not manager.upload_records(mapping_type, df):
+                raise RuntimeError(f"upload_records failed for {mapping_type}, see log")
+            return len(df)
+        results[f'upload_records {mapping_type}'] = measure(upload, repeat, setup=lambda: truncate(manager, mapping_type))
+
+        def merge() -> int:
+            if not manager.merge_records(mapping_type, df):
+                raise RuntimeError(f"merge_records failed for {mapping_type}, see log")
+            return len(df)
+        results[f'merge_records {mapping_type} (all existing)'] = measure(merge, repeat) # table still holds df from upload
+    return results
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    # Prints time ratios against the baseline, returns the cases slower by more than tolerance
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    print(f"\nCompared to {baseline_path} ({baseline.get('commit')}):")
+    regressions = []
+    for case, result in results.items():
+        before = baseline['results'].get(case)
+        if not before:
+            print(f"{case:<44}{'new case':>12}")
+            continue
+        ratio = result['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        flag = ' REGRESSION' if ratio > 1 + tolerance and result['seconds'] - before['seconds'] > MIN_REGRESSION_SECONDS else ''
+        print(f"{case:<44}{before['seconds']:>10.3f}s -> {result['seconds']:>8.3f}s {ratio:>7.2f}x{flag}")
+        if flag:
+            regressions.append(case)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-config', default=ENV_CONFIG_PATHS['DATA_CONFIG_PATH'], help="Data config (default: $DATA_CONFIG_PATH)")
+    parser.add_argument('--db-config', default=ENV_CONFIG_PATHS['DB_CONFIG_PATH'], help="DB config, its tables are created in a '%s' schema (default: $DB_CONFIG_PATH)" % SCHEMA)
+    parser.add_argument('--files', type=int, default=4, help="Files per mapping_type/bank")
+    parser.add_argument('--rows', type=int, default=10_000, help="Rows per file")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the median is reported")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', help="Earlier results file to diff against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Slowdown counted as a regression by --compare (default: %(default)s)")
+    args = parser.parse_args()
+    if not args.data_config or not args.db_config:
+        parser.error("--data-config and --db-config (or DATA_CONFIG_PATH and DB_CONFIG_PATH) are required")
+
+    commit = git_commit()
+    params = {k: v for k, v in vars(args).items() if k in ('files', 'rows', 'seed', 'workers', 'repeat')}
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_dir = os.path.join(tmp_dir, 'csv')
+        paths = generator.generate(generator.load_data_config(args.data_config), csv_dir, args.files, args.rows, seed=args.seed)
+        print(f"Generated {len(paths)} files ({sum(os.path.getsize(p) for p in paths) / 1024 / 1024:.1f} MB) in {csv_dir}")
+
+        results.update(bench_processing(csv_dir, args.data_config, args.workers, args.repeat))
+        stm_df, sec_df = DataManager(csv_dir, args.data_config).process_csv_files()
+        ready_data = {'stm': stm_df, 'sec': sec_df}
+        results.update(bench_new_records(ready_data, args.repeat))
+
+        db_config_path = os.path.join(tmp_dir, 'db.yaml')
+        write_db_config(args.db_config, db_config_path)
+        database_url = os.environ.get('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(tmp_dir, 'main.db')}"
+        manager = connect(database_url, db_config_path)
+        try:
+            reset_tables(manager)
+            # Overlapping files repeat rows, a table with a primary key takes each only once
+            unique_data = {mapping_type: df.drop_duplicates('surrogate_key') for mapping_type, df in ready_data.items()}
+            results.update(bench_loading(manager, unique_data, args.repeat))
+        finally:
+            if manager.engine.dialect.name == 'postgresql':
+                with manager.engine.begin() as connection:
+                    connection.execute(text(f"drop schema if exists {SCHEMA} cascade"))
+            manager.engine.dispose()
+
+    print(f"\n{'case':<44}{'seconds':>10}{'rows/sec':>14}{'peak RSS MB':>13}")
+    for case, result in results.items():
+        rows_per_sec = f"{result['rows_per_sec']:,.0f}" if result['rows_per_sec'] else '-'
+        print(f"{case:<44}{result['seconds']:>10.3f}{rows_per_sec:>14}{result['peak_rss_mb'] or 0:>13.0f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    report = {
+        'commit': commit
+        , 'created_at': datetime.now(timezone.utc).isoformat()
+        , 'python': platform.python_version()
+        , 'pandas': pd.__version__
+        , 'platform': platform.platform()
+        , 'cpu_count': os.cpu_count()
+        , 'database': manager.engine.dialect.name
+        , 'params': params
+        , 'results': results
+    }
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    print(f"\nResults written to {output}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
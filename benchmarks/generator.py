@@ -0,0 +1,137 @@
+""" Generates synthetic stm/sec CSV files from the 'mapping' section of the data config: one set of
+    files per configured bank, with its separator, date format, decimal separator, account numbers
+    and debit/credit markers. Output is identical for the same config, arguments and seed.
+
+    Usage: python -m benchmarks.generator OUT_DIR [--data-config PATH] [--files 4] [--rows 10000] [--overlap 0.1] """
+
+import os
+import re
+import yaml
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+
+NAME_TEMPLATE = '{bank}_{acc_type}_{mapping_type}_{index:03d}.csv'
+ACC_TYPES = {'stm': 'personal', 'sec': 'investment'}
+DATE_FIELDS = ('dt', 'date')
+NUMERIC_FIELDS = ('sum', 'amount', 'qty', 'quantity', 'price', 'fee', 'total', 'value', 'rate')
+WORDS = ['Card payment', 'Transfer', 'Salary', 'Rent', 'Groceries', 'Fuel', 'Dividend', 'Interest', 'Refund', 'Subscription']
+MERCHANTS = [f'Merchant {i}' for i in range(200)]
+TICKERS = ['AAPL', 'MSFT', 'TSLA', 'LHV1T', 'TAL1T', 'EFT1T', 'VOO', 'IWDA', 'NVDA', 'AMZN']
+CURRENCIES = ['EUR', 'EUR', 'EUR', 'USD']
+
+
+def load_data_config(data_config_path: str) -> Dict[str, Any]:
+    with open(data_config_path, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+def decimal_separator(file_specific_config: Dict[str, Any]) -> str:
+    # Banks exporting with ';' write decimal commas, unless the config says otherwise
+    configured = file_specific_config.get('decimal_separator')
+    if configured:
+        return configured
+    return ',' if file_specific_config['csv_separator'] != ',' else '.'
+
+def account_numbers(file_specific_config: Dict[str, Any], rng: np.random.Generator) -> List[str]:
+    accounts = list((file_specific_config.get('accounts') or {}).keys())
+    if accounts:
+        return [str(account) for account in accounts]
+    return [f"EE{rng.integers(10, 99)}{rng.integers(10**15, 10**16 - 1)}" for _ in range(2)]
+
+def format_numbers(values: np.ndarray, decimal: str) -> pd.Series:
+    formatted = pd.Series(values).map('{:.2f}'.format)
+    return formatted.str.replace('.', decimal, regex=False) if decimal != '.' else formatted
+
+def field_values(field: str, rows: int, file_specific_config: Dict[str, Any], dates: pd.DatetimeIndex, rng: np.random.Generator) -> pd.Series:
+    """ Values of one standardized field (the right side of original_fields), in CSV text form. """
+
+    decimal = decimal_separator(file_specific_config)
+    name = field.lower()
+    if name == 'acc_number':
+        return pd.Series(rng.choice(account_numbers(file_specific_config, rng), rows))
+    if name == 'dc':
+        markers = list((file_specific_config.get('debit_multiplier') or {'D': -1, 'K': 1}).keys())
+        return pd.Series(rng.choice([str(m) for m in markers], rows))
+    if name in ('ref_no', 'reference'):
+        ref_no = pd.Series(rng.integers(1, 10**6, rows)).astype(str)
+        return ref_no.mask(rng.random(rows) < 0.3, '') # missing reference numbers are common
+    if name.endswith(DATE_FIELDS) or name.startswith(DATE_FIELDS):
+        if name.startswith('effect'):
+            dates = dates + pd.to_timedelta(rng.integers(0, 3, rows), unit='D') # settles a few days after it was sent
+        return pd.Series(dates.strftime(file_specific_config['date_format']))
+    if any(part in name for part in NUMERIC_FIELDS):
+        values = rng.lognormal(3, 1.5, rows)
+        if name in ('qty', 'quantity'):
+            values = rng.integers(1, 500, rows).astype(float)
+        return format_numbers(values, decimal)
+    if 'ticker' in name or 'isin' in name or 'symbol' in name:
+        return pd.Series(rng.choice(TICKERS, rows))
+    if 'currency' in name:
+        return pd.Series(rng.choice(CURRENCIES, rows))
+    if 'beneficiary' in name or 'merchant' in name or 'name' in name:
+        return pd.Series(rng.choice(MERCHANTS, rows))
+    words = rng.choice(WORDS, rows)
+    return pd.Series([f'{word} {number}' for word, number in zip(words, rng.integers(1, 10**7, rows))])
+
+def make_file_frame(rows: int, file_specific_config: Dict[str, Any], rng: np.random.Generator) -> pd.DataFrame:
+    # Columns in original CSV names and text form, plus a few unmapped columns real exports have
+    dates = pd.to_datetime('2018-01-01') + pd.to_timedelta(rng.integers(0, 2500, rows), unit='D')
+    columns = {
+        original: field_values(field, rows, file_specific_config, dates, rng)
+        for original, field in file_specific_config['original_fields'].items()
+    }
+    columns['Unmapped comment'] = pd.Series(rng.choice(WORDS, rows))
+    columns['Unmapped balance'] = format_numbers(rng.normal(1000, 500, rows), decimal_separator(file_specific_config))
+    return pd.DataFrame(columns)
+
+def file_name(file_pattern: str, bank: str, mapping_type: str, index: int, template: str = NAME_TEMPLATE) -> str:
+    name = template.format(bank=bank, acc_type=ACC_TYPES.get(mapping_type, mapping_type), mapping_type=mapping_type, index=index)
+    if not re.match(file_pattern, name):
+        raise ValueError(f"Generated file name '{name}' does not match file_pattern '{file_pattern}', pass a matching --name-template")
+    return name
+
+def generate(data_config: Dict[str, Any], out_dir: str, files: int, rows: int, overlap: float = 0.1, seed: int = 42,
+             mapping_types: Optional[List[str]] = None, template: str = NAME_TEMPLATE) -> List[str]:
+    """ Writes `files` CSV files of `rows` rows for every configured mapping_type/bank.
+        overlap: share of each file repeated from the bank's previous file (re-exported periods),
+        so dedup has something to find. Returns the written paths. """
+
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for mapping_type, banks in data_config['mapping'].items():
+        if mapping_types and mapping_type not in mapping_types:
+            continue
+        for bank, file_specific_config in banks.items():
+            previous = None
+            for index in range(files):
+                df = make_file_frame(rows, file_specific_config, rng)
+                repeated = int(rows * overlap) if previous is not None else 0
+                if repeated:
+                    df = pd.concat([previous.iloc[-repeated:], df.iloc[repeated:]], ignore_index=True)
+                path = os.path.join(out_dir, file_name(data_config['file_pattern'], bank, mapping_type, index, template))
+                df.to_csv(path, sep=file_specific_config['csv_separator'], index=False, encoding='utf-8')
+                paths.append(path)
+                previous = df
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--data-config', default=os.environ.get('DATA_CONFIG_PATH'), help="Data config with the 'mapping' section (default: $DATA_CONFIG_PATH)")
+    parser.add_argument('--files', type=int, default=4, help="Files per mapping_type/bank")
+    parser.add_argument('--rows', type=int, default=10_000, help="Rows per file")
+    parser.add_argument('--overlap', type=float, default=0.1, help="Share of rows repeated from the previous file")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--name-template', default=NAME_TEMPLATE, help="File name template, must match file_pattern (default: %(default)s)")
+    args = parser.parse_args()
+    if not args.data_config:
+        parser.error("--data-config is not set and neither is DATA_CONFIG_PATH")
+
+    paths = generate(load_data_config(args.data_config), args.out_dir, args.files, args.rows, args.overlap, args.seed, template=args.name_template)
+    size_mb = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+    print(f"Wrote {len(paths)} files ({size_mb:.1f} MB) to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
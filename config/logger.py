@@ -1,34 +1,49 @@
 import os
 import logging
 from pathlib import Path
+from typing import Optional
 from datetime import datetime
 
 # Create 'logs' directory if it doesn't exist
 ROOT_DIR = Path(__file__).resolve().parent.parent
 LOGS_DIR = ROOT_DIR / 'logs'
 LOGS_DIR.mkdir(exist_ok=True)
+WORKER_LOGS_DIR = LOGS_DIR / 'workers' # each worker process of a parallel run logs to its own file
 
 # Logging settings
 LOG_LEVEL = logging.INFO #DEBUG
 LOG_FORMAT = '%(asctime)s - [%(levelname)s] - %(message)s' #- [%(filename)s:%(funcName)s:%(lineno)d]
 DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+WORKER_LOG_FORMAT = '%(asctime)s - [%(levelname)s] - [%(processName)s] - %(message)s'
 MAX_LOG_FILES = 5 # max log files we want to keep
+MAX_WORKER_LOG_FILES = 50 # max worker log files we want to keep
+REPORT_PATTERNS = ('*.json', '*.prof') # run reports and profiles, kept as long as their logs
 
+current_log_file: Optional[Path] = None # set by setup_logger, the run report is written next to it
 
-def cleanup_logs() -> None:
+
+def cleanup_logs(logs_dir: Path = LOGS_DIR, max_log_files: int = MAX_LOG_FILES, pattern: str = "*.log") -> None:
     try:
-        log_files = [f for f in LOGS_DIR.glob("*.log")] # get .log files
+        log_files = [f for f in logs_dir.glob(pattern)] # get .log files (or run reports)
         log_files.sort(key=lambda x: os.path.getmtime(x), reverse=True) # newest first
 
-        for old_log in log_files[MAX_LOG_FILES-1:]:
+        for old_log in log_files[max_log_files-1:]:
             old_log.unlink() # delete log
     except Exception as e:
         error_msg = f"Error during log cleanup. Error: {e}"
         print(error_msg)
 
 def setup_logger() -> logging.Logger:
+    # Entry modules (main, db_init, backfill) all call this; one log file per process
+    global current_log_file
+    if current_log_file is not None:
+        return logging.getLogger()
     cleanup_logs() # clean up old logs before creating new one
+    cleanup_logs(WORKER_LOGS_DIR, MAX_WORKER_LOG_FILES)
+    for pattern in REPORT_PATTERNS:
+        cleanup_logs(LOGS_DIR, MAX_LOG_FILES, pattern)
     log_file = LOGS_DIR / f'{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+    current_log_file = log_file
     logging.basicConfig(
         level=LOG_LEVEL
         , format=LOG_FORMAT
@@ -40,3 +55,26 @@ def setup_logger() -> logging.Logger:
     )
 
     return logging.getLogger()
+
+def run_report_path() -> Path:
+    # Same name as the run's log file, with a .json suffix
+    log_file = current_log_file or LOGS_DIR / f'{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+    return log_file.with_suffix('.json')
+
+def setup_worker_logger() -> logging.Logger:
+    # Used as worker pool initializer: replaces handlers inherited from the parent
+    # process, so every worker writes its own .log file (and still echoes to console)
+    WORKER_LOGS_DIR.mkdir(exist_ok=True)
+    log_file = WORKER_LOGS_DIR / f'{datetime.now().strftime("%Y%m%d_%H%M%S")}_{os.getpid()}.log'
+    logging.basicConfig(
+        level=LOG_LEVEL
+        , format=WORKER_LOG_FORMAT
+        , datefmt=DATE_FORMAT
+        , handlers=[
+            logging.FileHandler(str(log_file))
+            , logging.StreamHandler()
+        ]
+        , force=True
+    )
+
+    return logging.getLogger()
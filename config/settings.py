@@ -1,5 +1,6 @@
 import os
-import yaml
+import json
+import hashlib
 import logging
 from typing import Dict, Any, List
 
@@ -11,6 +12,19 @@ DB_HOST = os.environ.get('PG_LOC_DB_HOST', 'localhost')
 DB_PORT = os.environ.get('PG_LOC_DB_PORT', '5432')
 DATABASE_URL = f"postgresql+psycopg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?client_encoding=utf8"
 
+# Dedup mode: 'server' merges through a staging table in the database,
+# 'index' checks a local surrogate key index (see KEY_INDEX_DIR),
+# 'client' downloads all existing surrogate keys and filters in pandas (fallback)
+DEDUP_MODE = os.environ.get('DEDUP_MODE', 'server')
+DEDUP_STRATEGY = os.environ.get('DEDUP_STRATEGY', 'anti_join') # or 'on_conflict' (needs unique surrogate_key)
+
+# Bulk loader: 'copy' streams COPY FROM STDIN on PostgreSQL (to_sql on other engines), 'to_sql' always uses INSERTs
+BULK_LOADER = os.environ.get('BULK_LOADER', 'copy')
+COPY_BATCH_SIZE = int(os.environ.get('COPY_BATCH_SIZE', '50000'))
+
+# Aggregate tables declared under 'aggregates' in the DB config are updated with every insert ('0' skips them)
+MAINTAIN_AGGREGATES = os.environ.get('MAINTAIN_AGGREGATES', '1') == '1'
+
 # Config paths
 DATA_CONFIG_PATH = os.environ['DATA_CONFIG_PATH']
 DB_CONFIG_PATH = os.environ['DB_CONFIG_PATH']
@@ -18,18 +32,116 @@ DB_CONFIG_PATH = os.environ['DB_CONFIG_PATH']
 # Data directory
 CSV_FILES_DIR = os.environ['CSV_FILES_DIR']
 
+# Local state (manifest, config cache, key index, backfill checkpoint) lives next to the logs by default,
+# never in CSV_FILES_DIR: the input directory may be shared or writable by others, and watch mode reads it
+STATE_DIR = os.environ.get('STATE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'state'))
+
+# Run manifest (files uploaded in earlier runs and unchanged since are skipped)
+MANIFEST_PATH = os.environ.get('MANIFEST_PATH', os.path.join(STATE_DIR, 'manifest.json'))
+
+# Parsed YAML configs are cached here as JSON and reused while the config file keeps its size and mtime,
+# so most runs never import or run the YAML parser. Empty disables the cache.
+CONFIG_CACHE_DIR = os.environ.get('CONFIG_CACHE_DIR', os.path.join(STATE_DIR, 'config_cache'))
+
+# Local surrogate key index used by DEDUP_MODE='index' (BLOOM_BITS=0 disables the Bloom filter)
+KEY_INDEX_DIR = os.environ.get('KEY_INDEX_DIR', os.path.join(STATE_DIR, 'key_index'))
+KEY_INDEX_BLOOM_BITS = int(os.environ.get('KEY_INDEX_BLOOM_BITS', '10'))
+
+# Parallel file processing (workers > 1 runs files in a 'process' or 'thread' pool)
+CSV_WORKERS = int(os.environ.get('CSV_WORKERS', '1'))
+CSV_EXECUTOR = os.environ.get('CSV_EXECUTOR', 'process')
+
+# CSV parser engine ('c' or 'pyarrow', the latter needs the optional pyarrow package).
+# A mapping can override it with 'csv_engine' in the data config.
+CSV_ENGINE = os.environ.get('CSV_ENGINE', 'c')
+
+# Compact frames: categoricals for repeated strings and binary surrogate keys until upload
+COMPACT_FRAMES = os.environ.get('COMPACT_FRAMES', '0') == '1'
+
+# Staging cache: transformed files are kept as Parquet (optional pyarrow package) and reused while the file
+# content and its config stay the same, e.g. to reload everything after db_init. Empty disables it.
+STAGING_DIR = os.environ.get('STAGING_DIR', '')
+
+# Backfill (backfill.py): files are loaded in shards of about BACKFILL_SHARD_MB, progress is checkpointed
+# per shard so an interrupted backfill resumes where it stopped
+BACKFILL_SHARD_MB = float(os.environ.get('BACKFILL_SHARD_MB', '64'))
+BACKFILL_CHECKPOINT_PATH = os.environ.get('BACKFILL_CHECKPOINT_PATH', os.path.join(STATE_DIR, 'backfill.json'))
+
+# Surrogate key hashing (workers > 1 fans md5 batches out to one process pool per run,
+# files over KEY_HASH_BATCH_SIZE rows only; CSV_EXECUTOR='process' workers hash in-process)
+KEY_HASH_WORKERS = int(os.environ.get('KEY_HASH_WORKERS', '1'))
+KEY_HASH_BATCH_SIZE = int(os.environ.get('KEY_HASH_BATCH_SIZE', '100000'))
+
+# Run report: stage timings/rows/memory are always written next to the log file as JSON.
+# PROFILER='cprofile' (main thread, .prof file next to the report) or 'tracemalloc' adds a profile to it.
+PROFILER = os.environ.get('PROFILER', '')
+
+# Watch mode (--watch): files are loaded once unchanged for WATCH_DEBOUNCE seconds; the directory is
+# polled every WATCH_POLL_INTERVAL seconds where inotify is not available; failed batches are retried
+WATCH_DEBOUNCE = float(os.environ.get('WATCH_DEBOUNCE', '2'))
+WATCH_POLL_INTERVAL = float(os.environ.get('WATCH_POLL_INTERVAL', '5'))
+WATCH_RETRY_DELAY = float(os.environ.get('WATCH_RETRY_DELAY', '60'))
+
 
 # Loaders
 def config_loader(config_path: str) -> Dict[str, Any]:
     try:
+        stat = os.stat(config_path)
+        config = _load_cached_config(config_path, stat)
+        if config is not None:
+            logging.info(f"Config loaded from {config_path} (cached)")
+            return config
+
+        import yaml # only on a cache miss
         with open(config_path, 'r', encoding='utf-8') as file:
             config = yaml.safe_load(file)
             logging.info(f"Config loaded from {config_path}")
-            return config
+        _save_cached_config(config_path, stat, config)
+        return config
     except Exception as e:
         logging.error(f"Error loading configuration: {e}")
         raise
 
+def _config_cache_path(config_path: str) -> str:
+    name = hashlib.sha256(os.path.abspath(config_path).encode()).hexdigest()[:16]
+    return os.path.join(CONFIG_CACHE_DIR, f"{name}.json")
+
+def _load_cached_config(config_path: str, stat: os.stat_result) -> Any:
+    # None if there is no cache entry for this version of the file
+    if not CONFIG_CACHE_DIR:
+        return None
+    try:
+        with open(_config_cache_path(config_path), 'r', encoding='utf-8') as file:
+            entry = json.load(file)
+        if (entry['size'], entry['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            return entry['config']
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # A broken cache entry only costs a YAML parse
+        logging.warning(f"Error reading cached configuration of {config_path}: {e}")
+    return None
+
+def _save_cached_config(config_path: str, stat: os.stat_result, config: Any):
+    if not CONFIG_CACHE_DIR:
+        return
+    # YAML values without a JSON form (dates, non-string keys) would come back changed: those configs are not cached
+    try:
+        if json.loads(json.dumps(config)) != config:
+            return
+    except (TypeError, ValueError):
+        return
+
+    cache_path = _config_cache_path(config_path)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CONFIG_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'config': config}, file)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logging.warning(f"Error caching configuration of {config_path}: {e}")
+
 def csv_files_loader(csv_files_dir: str) -> List[str]:
     try:
         files = os.listdir(csv_files_dir)
@@ -1,22 +1,126 @@
+import logging
+import argparse
+from datetime import date
 from config import logger
-from typing import Any, Dict
-from sqlalchemy import Column, inspect
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Column, Index, UniqueConstraint, event, inspect, text
 from sqlalchemy.types import TypeEngine
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.schema import CreateSchema
+from sqlalchemy.schema import CreateSchema, AddConstraint
 from utils.db_manager import DatabaseManager
-from sqlalchemy.types import Integer, String, Date, Numeric, TIMESTAMP
+from sqlalchemy.types import Integer, BigInteger, String, Date, Numeric, TIMESTAMP
+from utils.aggregates import AggregateSpec
 from config.settings import DATABASE_URL, DB_CONFIG_PATH
 
 
-log = logger.setup_logger()
+log = logging.getLogger()
 
 
 class Base(DeclarativeBase):
     pass
 
+class PartitionSpec:
+    """ Range partitioning of a table from the 'partition' key of its config (PostgreSQL only):
+          partition: {column: dt, interval: year, start: 2015, ahead: 1}
+        column: Date/Timestamp, Integer (a year, interval 'year' only) or String ('YYYY-MM') field
+        interval: 'year' or 'month'; start: first year ('2015') or month ('2015-01')
+        ahead: partitions created past the current year/month (default 1)
+        A default partition takes rows outside the created ranges, so inserts never fail. """
+
+    INTERVALS = ('year', 'month')
+
+    def __init__(self, table_name: str, partition_config: Dict[str, Any], table_fields: Dict[str, Any]):
+        self.table_name = table_name
+        self.column = partition_config['column']
+        self.interval = partition_config.get('interval', 'year')
+        self.ahead = int(partition_config.get('ahead', 1))
+        if self.interval not in self.INTERVALS:
+            raise ValueError(f"PartitionSpec: Unsupported interval '{self.interval}' for {table_name}. Expected one of: {self.INTERVALS}")
+        if self.column not in table_fields:
+            raise ValueError(f"PartitionSpec: Partition column '{self.column}' is not a field of {table_name}")
+        self.column_type = table_fields[self.column]['type']
+        if self.column_type == 'Integer' and self.interval != 'year':
+            raise ValueError(f"PartitionSpec: Integer partition column '{self.column}' of {table_name} only supports interval 'year'")
+
+        start_year, _, start_month = str(partition_config['start']).partition('-')
+        self.start = (int(start_year), int(start_month or 1) if self.interval == 'month' else 1)
+
+    @property
+    def default_name(self) -> str:
+        return f"{self.table_name}_default"
+
+    def _bound(self, year: int, month: int) -> str:
+        if self.column_type == 'Integer':
+            return str(year)
+        if self.column_type == 'String':
+            return f"'{year}'" if self.interval == 'year' else f"'{year}-{month:02d}'"
+        return f"'{date(year, month, 1).isoformat()}'"
+
+    def ranges(self, today: Optional[date] = None) -> List[Tuple[str, str, str]]:
+        # (partition name, lower bound, upper bound) from start up to `ahead` intervals past today
+        today = today or date.today()
+        step = 12 if self.interval == 'year' else 1
+        current = today.year * 12 + (today.month - 1 if self.interval == 'month' else 0)
+        ranges = []
+        for month_index in range(self.start[0] * 12 + self.start[1] - 1, current + (self.ahead + 1) * step, step):
+            year, month = divmod(month_index, 12)
+            next_year, next_month = divmod(month_index + step, 12)
+            name = f"{self.table_name}_y{year}" if self.interval == 'year' else f"{self.table_name}_m{year}{month + 1:02d}"
+            ranges.append((name, self._bound(year, month + 1), self._bound(next_year, next_month + 1)))
+        return ranges
+
+    def existing_partitions(self, connection, schema: str) -> List[str]:
+        query = text("""
+            select c.relname from pg_inherits i
+            join pg_class c on c.oid = i.inhrelid
+            join pg_class p on p.oid = i.inhparent
+            join pg_namespace n on n.oid = p.relnamespace
+            where n.nspname = :schema and p.relname = :table_name""")
+        return [row[0] for row in connection.execute(query, {'schema': schema, 'table_name': self.table_name})]
+
+    def is_partitioned(self, connection, schema: str) -> bool:
+        query = text("""
+            select c.relkind from pg_class c join pg_namespace n on n.oid = c.relnamespace
+            where n.nspname = :schema and c.relname = :table_name""")
+        return connection.execute(query, {'schema': schema, 'table_name': self.table_name}).scalar() == 'p'
+
+    def create_missing(self, connection, schema: str) -> List[str]:
+        """ Creates missing range partitions (and the default one). Rows of a new range that landed
+            in the default partition meanwhile are moved into it, in the caller's transaction. """
+
+        existing = set(self.existing_partitions(connection, schema))
+        parent = f"{schema}.{self.table_name}"
+        has_default = self.default_name in existing
+        created = []
+        for name, lower, upper in self.ranges():
+            if name in existing:
+                continue
+            if has_default:
+                # Postgres refuses a new partition while the default one holds rows of its range
+                connection.execute(text(f"create temporary table moved_rows (like {parent}) on commit drop"))
+                connection.execute(text(
+                    f"with moved as (delete from {schema}.{self.default_name} where {self.column} >= {lower} and {self.column} < {upper} returning *) "
+                    f"insert into moved_rows select * from moved"))
+            connection.execute(text(f"create table {schema}.{name} partition of {parent} for values from ({lower}) to ({upper})"))
+            if has_default:
+                connection.execute(text(f"insert into {parent} select * from moved_rows"))
+                connection.execute(text("drop table moved_rows"))
+            created.append(name)
+
+        if not has_default:
+            connection.execute(text(f"create table {schema}.{self.default_name} partition of {parent} default"))
+            created.append(self.default_name)
+        return created
+
 class TableModelBuilder:
-    # Helper class to build SQLAlchemy table models from config.
+    """ Helper class to build SQLAlchemy table models from config.
+        Besides 'fields' (with optional primary_key, nullable, index and unique flags) a table config can have:
+          indexes: [{columns: [year, ym]}, {columns: [effect_ym], name: ix_sec_month, unique: false}]
+          unique_constraints: [{columns: [surrogate_key, dt]}]
+          partition: see PartitionSpec
+        surrogate_key always gets an index (unless a key or index already starts with it), dedup looks it up.
+        On a partitioned table primary keys and unique constraints must include the partition column. """
+
     TYPE_MAPPING = {
         'Integer': Integer
         , 'String': String
@@ -24,6 +128,7 @@ class TableModelBuilder:
         , 'Decimal': Numeric
         , 'Timestamp': TIMESTAMP
     }
+    KEY_FIELD = 'surrogate_key'
 
     @classmethod
     def get_sql_type(cls, field_config: dict) -> TypeEngine:
@@ -42,66 +147,255 @@ class TableModelBuilder:
 
         return cls.TYPE_MAPPING[field_type]
 
+    @staticmethod
+    def partition_spec(table_config: Dict[str, Any]) -> Optional[PartitionSpec]:
+        if not table_config.get('partition'):
+            return None
+        return PartitionSpec(table_config['table_name'], table_config['partition'], table_config['fields'])
+
     @classmethod
-    def build_model(cls, schema:str, table_name: str, table_fields: Dict[str, Any]):
+    def build_table_args(cls, schema: str, table_config: Dict[str, Any]) -> tuple:
+        """ Indexes, unique constraints and partitioning of a table, as __table_args__. """
+
+        table_name = table_config['table_name']
+        table_fields = table_config['fields']
+        partition = cls.partition_spec(table_config)
+
+        leading_columns = set()
+        primary_key = [name for name, field in table_fields.items() if field.get('primary_key')]
+        keys = [primary_key] if primary_key else []
+
+        args = []
+        for index_config in table_config.get('indexes') or []:
+            columns = list(index_config['columns'])
+            name = index_config.get('name', f"ix_{table_name}_{'_'.join(columns)}")
+            args.append(Index(name, *columns, unique=index_config.get('unique', False)))
+            if index_config.get('unique'):
+                keys.append(columns)
+            leading_columns.add(columns[0])
+        for constraint_config in table_config.get('unique_constraints') or []:
+            columns = list(constraint_config['columns'])
+            args.append(UniqueConstraint(*columns, name=constraint_config.get('name', f"uq_{table_name}_{'_'.join(columns)}")))
+            keys.append(columns)
+            leading_columns.add(columns[0])
+        keys += [[name] for name, field in table_fields.items() if field.get('unique')]
+        leading_columns |= {name for name, field in table_fields.items() if field.get('index') or field.get('unique')}
+
+        # Dedup (anti-join / key lookups) needs surrogate_key indexed on its own
+        if primary_key:
+            leading_columns.add(primary_key[0])
+        if cls.KEY_FIELD in table_fields and cls.KEY_FIELD not in leading_columns:
+            args.append(Index(f"ix_{table_name}_{cls.KEY_FIELD}", cls.KEY_FIELD))
+
+        kwargs: Dict[str, Any] = {'schema': schema}
+        if partition:
+            for columns in keys:
+                if partition.column not in columns:
+                    raise ValueError(f"TableModelBuilder: Key ({', '.join(columns)}) of partitioned table {table_name} must include partition column '{partition.column}'")
+            kwargs['postgresql_partition_by'] = f"RANGE ({partition.column})"
+        return (*args, kwargs)
+
+    @classmethod
+    def build_model(cls, schema:str, table_name: str, table_fields: Dict[str, Any], table_config: Optional[Dict[str, Any]] = None):
         """ Build SQLAlchemy Model class from table configuration. """
 
-        table = {'__tablename__': table_name, '__table_args__': {'schema': schema}}
+        table_config = table_config or {'table_name': table_name, 'fields': table_fields}
+        table = {'__tablename__': table_name, '__table_args__': cls.build_table_args(schema, table_config)}
 
         for field_name, field_config in table_fields.items():
             table[field_name] = Column(
                 cls.get_sql_type(field_config)
                 , primary_key=field_config.get('primary_key', False)
                 , nullable=field_config.get('nullable', True)
+                , index=field_config.get('index', False) or None
+                , unique=field_config.get('unique', False) or None
             )
 
-        return type(table_name, (Base,), table)
+        model = type(table_name, (Base,), table)
+
+        # Partitions are created with the table (also by a plain create_all)
+        partition = cls.partition_spec(table_config)
+        if partition:
+            def create_partitions(target, connection, **kw):
+                if connection.dialect.name == 'postgresql':
+                    partition.create_missing(connection, schema)
+            event.listen(model.__table__, 'after_create', create_partitions)
+        return model
+
+    @classmethod
+    def build_aggregate_model(cls, schema: str, spec: AggregateSpec):
+        """ Build SQLAlchemy Model class of an aggregate table: text group keys as primary key, totals, row count. """
+
+        table = {'__tablename__': spec.table_name, '__table_args__': {'schema': schema}}
+        for column in spec.group_by:
+            table[column] = Column(String(255), primary_key=True, nullable=False)
+        for column in spec.sums:
+            table[spec.total_column(column)] = Column(Numeric(precision=18, scale=spec.scale(column)), nullable=False)
+        table[spec.COUNT_COLUMN] = Column(BigInteger, nullable=False)
+        return type(spec.table_name, (Base,), table)
 
 class DatabaseInitializer:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
         self.tables = self.db_manager.config['tables']
+        self.models: Dict[str, Any] = {}
+
+    def _create_schema(self):
+        # Create schema if not exists
+        inspector = inspect(self.db_manager.engine)
+        schema_exists = inspector.has_schema(self.db_manager.schema_name)
+
+        if not schema_exists:
+            with self.db_manager.session_scope() as session:
+                session.execute(CreateSchema(self.db_manager.schema_name))
+                log.info(f"DatabaseManager: Created schema: {self.db_manager.schema_name}")
+        else:
+            log.info(f"DatabaseManager: Schema '{self.db_manager.schema_name}' already exists")
+
+    def _build_models(self):
+        # Create table models (once, they are registered in Base.metadata)
+        if self.models:
+            return
+        for _, table_config in self.tables.items():
+            table_name = table_config['table_name']
+            table_fields = table_config['fields']
+            self.models[table_name] = TableModelBuilder.build_model(self.db_manager.schema_name, table_name, table_fields, table_config)
+            log.info(f"DatabaseManager: Created model for table {table_name}")
+            if table_config.get('partition') and self.db_manager.engine.dialect.name != 'postgresql':
+                log.warning(f"DatabaseManager: Partitioning of {table_name} needs PostgreSQL, creating a plain table")
+        for specs in self.db_manager.aggregates.values():
+            for spec in specs:
+                self.models[spec.table_name] = TableModelBuilder.build_aggregate_model(self.db_manager.schema_name, spec)
+                log.info(f"DatabaseManager: Created model for aggregate table {spec.table_name}")
 
     def initialize(self):
         """ Initializes database schema and tables.
-            NB! It will drop existing tables and recreate them! """
+            NB! It will drop existing tables and recreate them! Use migrate() to keep the data. """
 
         try:
             log.info("DatabaseManager: Starting database initialization")
-
-            # Create schema if not exists
-            inspector = inspect(self.db_manager.engine)
-            schema_exists = inspector.has_schema(self.db_manager.schema_name)
-
-            if not schema_exists:
-                with self.db_manager.session_scope() as session:
-                    session.execute(CreateSchema(self.db_manager.schema_name))
-                    log.info(f"DatabaseManager: Created schema: {self.db_manager.schema_name}")
-            else:
-                log.info(f"DatabaseManager: Schema '{self.db_manager.schema_name}' already exists")
-
-            # Create table models
-            for _, table_config in self.tables.items():
-                table_name = table_config['table_name']
-                table_fields = table_config['fields']
-                TableModelBuilder.build_model(self.db_manager.schema_name, table_name, table_fields)
-                log.info(f"DatabaseManager: Created model for table {table_name}")
+            self._create_schema()
+            self._build_models()
 
             # Drop existing tables if they exist (in database)
             Base.metadata.drop_all(self.db_manager.engine)
             log.info("DatabaseManager: Dropped existing tables")
 
-            # Create all tables in database (in database)
+            # Create all tables in database (in database), with their indexes and partitions
             Base.metadata.create_all(self.db_manager.engine)
             log.info("DatabaseManager: Successfully created all tables")
         except Exception as e:
             log.error(f"DatabaseManager: Database initialization failed: {e}", exc_info=True)
             raise
 
-def main():
+    def migrate(self):
+        """ Additive migration: creates missing tables, columns, partitions, indexes and unique
+            constraints. Never drops anything, so it is safe to run on a database with history. """
+
+        try:
+            log.info("DatabaseManager: Starting additive database migration")
+            self._create_schema()
+            self._build_models()
+            for table_config in self.tables.values():
+                self._migrate_table(table_config, self.models[table_config['table_name']].__table__)
+
+            # A new aggregate table starts empty, fill it from the history already loaded
+            created_aggregates = []
+            for specs in self.db_manager.aggregates.values():
+                for spec in specs:
+                    if self._migrate_table({'table_name': spec.table_name}, self.models[spec.table_name].__table__):
+                        created_aggregates.append(spec.table_name)
+            if created_aggregates:
+                self.db_manager.rebuild_aggregates(created_aggregates)
+            log.info("DatabaseManager: Migration finished")
+        except Exception as e:
+            log.error(f"DatabaseManager: Database migration failed: {e}", exc_info=True)
+            raise
+
+    def drop_secondary_indexes(self) -> List[str]:
+        """ Drops the non-unique indexes of the data tables, except the ones dedup looks surrogate_key up
+            with, so a bulk load does not maintain them row by row. migrate() creates them again. """
+
+        self._build_models()
+        engine = self.db_manager.engine
+        schema = self.db_manager.schema_name
+        inspector = inspect(engine)
+        dropped = []
+        with engine.begin() as connection:
+            for table_config in self.tables.values():
+                table = self.models[table_config['table_name']].__table__
+                if not inspector.has_table(table.name, schema=schema):
+                    continue
+                existing_indexes = {index['name'] for index in inspector.get_indexes(table.name, schema=schema)}
+                for index in table.indexes:
+                    if index.unique or index.name not in existing_indexes or index.columns[0].name == TableModelBuilder.KEY_FIELD:
+                        continue
+                    index.drop(connection)
+                    dropped.append(index.name)
+                    log.info(f"DatabaseManager: Dropped index {index.name}")
+        return dropped
+
+    def _migrate_table(self, table_config: Dict[str, Any], table) -> bool:
+        # Returns True if the table was missing and got created
+        engine = self.db_manager.engine
+        schema = self.db_manager.schema_name
+        inspector = inspect(engine)
+        if not inspector.has_table(table.name, schema=schema):
+            table.create(engine) # with indexes and partitions
+            log.info(f"DatabaseManager: Created missing table {schema}.{table.name}")
+            return True
+
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name, schema=schema)}
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name, schema=schema)}
+        existing_uniques = {constraint['name'] for constraint in inspector.get_unique_constraints(table.name, schema=schema)}
+        with engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    connection.execute(text(f'alter table {schema}.{table.name} add column "{column.name}" {column.type.compile(engine.dialect)}'))
+                    log.info(f"DatabaseManager: Added column {table.name}.{column.name}")
+
+            partition = TableModelBuilder.partition_spec(table_config)
+            if partition and engine.dialect.name == 'postgresql':
+                if partition.is_partitioned(connection, schema):
+                    created = partition.create_missing(connection, schema)
+                    log.info(f"DatabaseManager: Created {len(created)} missing partitions of {table.name}")
+                else:
+                    # Turning a plain table into a partitioned one means rewriting it, not an additive change
+                    log.warning(f"DatabaseManager: {table.name} exists and is not partitioned, partitions skipped (initialize would recreate it)")
+
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    log.info(f"DatabaseManager: Created index {index.name}")
+
+            for constraint in table.constraints:
+                if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in existing_uniques:
+                    if engine.dialect.name == 'sqlite':
+                        log.warning(f"DatabaseManager: SQLite cannot add constraint {constraint.name} to an existing table, skipped")
+                        continue
+                    connection.execute(AddConstraint(constraint))
+                    log.info(f"DatabaseManager: Created unique constraint {constraint.name}")
+        return False
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Create the database schema and tables from the DB config.")
+    parser.add_argument('--migrate', action='store_true', help="Only add missing tables, columns, partitions and indexes, keep all data (default drops and recreates the tables)")
+    parser.add_argument('--rebuild-aggregates', action='store_true', help="Only recompute all aggregate tables from their source tables")
+    return parser.parse_args()
+
+def main(migrate: bool = False, rebuild_aggregates: bool = False):
+    logger.setup_logger()
     db_manager = DatabaseManager(DATABASE_URL, DB_CONFIG_PATH)
+    if rebuild_aggregates:
+        db_manager.rebuild_aggregates()
+        return
+
     initializer = DatabaseInitializer(db_manager)
-    initializer.initialize()
+    if migrate:
+        initializer.migrate()
+    else:
+        initializer.initialize()
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(migrate=args.migrate, rebuild_aggregates=args.rebuild_aggregates)
@@ -1,32 +1,170 @@
+from __future__ import annotations
+
+import logging
+import argparse
+import itertools
 from config import logger
-from utils.data_manager import DataManager
-from utils.db_manager import DatabaseManager
-from config.settings import DATA_CONFIG_PATH, CSV_FILES_DIR, DATABASE_URL, DB_CONFIG_PATH
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from utils.manifest import RunManifest
+from utils.instrumentation import REPORT
+from config.settings import config_loader, csv_files_loader, DATA_CONFIG_PATH, CSV_FILES_DIR, DATABASE_URL, DB_CONFIG_PATH, CSV_WORKERS, CSV_EXECUTOR, MANIFEST_PATH, DEDUP_MODE, COMPACT_FRAMES, PROFILER, STAGING_DIR
+from config.settings import WATCH_DEBOUNCE, WATCH_POLL_INTERVAL, WATCH_RETRY_DELAY
+
+# pandas and SQLAlchemy (everything below utils.pipeline) take most of the startup time.
+# They are imported once a run has work to do, see run().
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from utils.data_manager import DataManager
+    from utils.db_manager import DatabaseManager
+
+log = logging.getLogger()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load bank statements and securities reports into the database.")
+    parser.add_argument('--workers', type=int, default=CSV_WORKERS, help="Number of CSV files processed in parallel (default: %(default)s)")
+    parser.add_argument('--executor', choices=['process', 'thread'], default=CSV_EXECUTOR, help="Worker pool type used when --workers > 1 (default: %(default)s)")
+    parser.add_argument('--dedup', choices=['server', 'index', 'client'], default=DEDUP_MODE, help="Dedup in the database via a staging table, against a local key index, or by downloading existing keys (default: %(default)s)")
+    parser.add_argument('--compact', action=argparse.BooleanOptionalAction, default=COMPACT_FRAMES, help="Keep processed frames in the compact layout until upload (default: %(default)s)")
+    parser.add_argument('--full-reprocess', action='store_true', help="Process every CSV file, including files unchanged since the last run")
+    parser.add_argument('--watch', action='store_true', help="Keep running and load files as they land in the CSV directory")
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE, help="--watch: seconds a file must stay unchanged before it is loaded (default: %(default)s)")
+    parser.add_argument('--poll-interval', type=float, default=WATCH_POLL_INTERVAL, help="--watch: seconds between directory scans when inotify is not available (default: %(default)s)")
+    return parser.parse_args()
+
+def main(workers: int = CSV_WORKERS, executor: str = CSV_EXECUTOR, full_reprocess: bool = False, dedup_mode: str = DEDUP_MODE, compact: bool = COMPACT_FRAMES,
+         watch_dir: bool = False, debounce: float = WATCH_DEBOUNCE, poll_interval: float = WATCH_POLL_INTERVAL):
+    logger.setup_logger() # here, not on import: spawned worker processes import this module again (as __mp_main__)
+    if watch_dir:
+        return watch(workers, executor, full_reprocess, dedup_mode, compact, debounce, poll_interval)
+
+    # Stage timings, rows and memory of the run are written as JSON next to the log file, even if it fails
+    REPORT.start(PROFILER)
+    try:
+        run(workers, executor, full_reprocess, dedup_mode, compact)
+    finally:
+        REPORT.write(str(logger.run_report_path()), workers=workers, executor=executor, dedup_mode=dedup_mode, compact=compact, full_reprocess=full_reprocess)
+
+def run(workers: int, executor: str, full_reprocess: bool, dedup_mode: str, compact: bool):
+    # Nothing new or changed since the last run (the usual cron case) - stop before pandas is imported
+    manifest = RunManifest(MANIFEST_PATH)
+    csv_files_paths = csv_files_loader(CSV_FILES_DIR)
+    if not full_reprocess and not manifest.changed_files(csv_files_paths, config_loader(DATA_CONFIG_PATH)):
+        if manifest.modified:
+            manifest.save() # touched files that kept their content, no need to hash them again next time
+        log.info("No new or changed files to load")
+        return
 
-log = logger.setup_logger()
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.staging import open_staging_cache
+    from utils.data_manager import DataManager
+    from utils.db_manager import DatabaseManager
+    from utils.pipeline import MAPPING_TYPES, StageClock, prefetch_existing_keys
+    clock = StageClock()
 
-def main():
     # Prepare data manager
-    data_manager = DataManager(CSV_FILES_DIR, DATA_CONFIG_PATH)
+    data_manager = DataManager(CSV_FILES_DIR, DATA_CONFIG_PATH, workers=workers, executor=executor, manifest=manifest, full_reprocess=full_reprocess, compact=compact, csv_files_paths=csv_files_paths, staging=open_staging_cache(STAGING_DIR))
+
+    try:
+        # Nothing to process after all (e.g. a full reprocess of an empty directory) - no need to touch the database
+        if not data_manager.prepare_files():
+            log.info("No new or changed files to load")
+            return
+
+        with ThreadPoolExecutor(max_workers=1 + 2 * len(MAPPING_TYPES), thread_name_prefix='pipeline') as pool:
+            # Connect to the database and fetch what dedup needs while CSV files are being parsed
+            db_future = pool.submit(clock.run, 'connect', DatabaseManager, DATABASE_URL, DB_CONFIG_PATH)
+            prefetched = {mapping_type: pool.submit(clock.run, f'prefetch {mapping_type}', prefetch_existing_keys, db_future, dedup_mode, mapping_type) for mapping_type in MAPPING_TYPES}
+
+            # Return ready to upload DataFrames from raw data files
+            stm_df, sec_df = clock.run('parse', data_manager.process_csv_files)
+            log.info(f"Processed stm data: {len(stm_df)} records")
+            log.info(f"Processed sec data: {len(sec_df)} records")
+            db_manager = db_future.result()
+
+            uploaded, failed = load_branches(pool, clock, data_manager, db_manager, dedup_mode, {'stm': stm_df, 'sec': sec_df}, prefetched)
+
+        if failed:
+            raise RuntimeError(f"Load failed for: {', '.join(failed)}")
+    finally:
+        data_manager.close() # key hashing processes
+
+def load_branches(pool: ThreadPoolExecutor, clock: StageClock, data_manager: DataManager, db_manager: DatabaseManager, dedup_mode: str,
+                  ready_data: Dict[str, Any], prefetched: Dict[str, Future], known_keys: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, bool], List[str]]:
+    from utils.pipeline import MAPPING_TYPES, load_mapping_type
+    # stm and sec are independent: dedup and upload them at the same time, each branch
+    # checks out its own pooled connection
+    branches = {
+        mapping_type: pool.submit(clock.run, f'load {mapping_type}', load_mapping_type, data_manager, db_manager, dedup_mode, mapping_type, ready_data[mapping_type], prefetched[mapping_type], known_keys)
+        for mapping_type in MAPPING_TYPES
+    }
+
+    # Wait for both branches, a failing one must not hide the result of the other
+    uploaded, failed = {}, []
+    for mapping_type, branch in branches.items():
+        try:
+            uploaded[mapping_type] = branch.result()
+        except Exception as e:
+            log.error(f"Load of {mapping_type} failed: {e}", exc_info=True)
+            uploaded[mapping_type] = False
+            failed.append(mapping_type)
 
-    # Return ready to upload DataFrames from raw data files
-    stm_df, sec_df = data_manager.process_csv_files()
-    log.info(f"Processed stm data: {len(stm_df)} records")
-    log.info(f"Processed sec data: {len(sec_df)} records")
+    # Remember uploaded files, so they are skipped while unchanged
+    for mapping_type, success in uploaded.items():
+        if success:
+            data_manager.record_uploaded_files(mapping_type)
 
+    return uploaded, failed
 
-    # Prepare database manager
-    db_manager = DatabaseManager(DATABASE_URL, DB_CONFIG_PATH)
+def watch(workers: int, executor: str, full_reprocess: bool, dedup_mode: str, compact: bool, debounce: float, poll_interval: float):
+    # Long-running mode: the engine, data config, read plans, manifest and known keys stay in memory,
+    # and each batch only processes files that just landed (or changed) in CSV_FILES_DIR
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.watcher import DirectoryWatcher
+    from utils.staging import open_staging_cache
+    from utils.data_manager import DataManager
+    from utils.db_manager import DatabaseManager
+    from utils.pipeline import MAPPING_TYPES, prefetch_existing_keys, completed
+    manifest = RunManifest(MANIFEST_PATH)
+    data_manager = DataManager(CSV_FILES_DIR, DATA_CONFIG_PATH, workers=workers, executor=executor, manifest=manifest, full_reprocess=full_reprocess, compact=compact, csv_files_paths=[], staging=open_staging_cache(STAGING_DIR))
+    db_manager = DatabaseManager(DATABASE_URL, DB_CONFIG_PATH, pool_pre_ping=True) # connections may go stale between batches
+    known_keys = {mapping_type: prefetch_existing_keys(completed(db_manager), dedup_mode, mapping_type) for mapping_type in MAPPING_TYPES}
+    watcher = DirectoryWatcher(CSV_FILES_DIR, debounce=debounce, poll_interval=poll_interval)
 
-    # Get existing surrogate keys from database
-    stm_keys, sec_keys = db_manager.get_existing_surrogate_keys()
+    # Files already in the directory first (the manifest skips unchanged ones), then every new batch
+    try:
+        with ThreadPoolExecutor(max_workers=len(MAPPING_TYPES), thread_name_prefix='pipeline') as pool:
+            for paths in itertools.chain([sorted(watcher.seen)], watcher.batches()):
+                if not load_batch(pool, data_manager, db_manager, dedup_mode, known_keys, paths, workers=workers, executor=executor, compact=compact):
+                    log.warning(f"Watch: Batch of {len(paths)} files not fully loaded, retrying in {WATCH_RETRY_DELAY}s")
+                    watcher.requeue(paths, WATCH_RETRY_DELAY) # files uploaded already are skipped by the manifest
+    finally:
+        data_manager.close()
 
-    # Get only new records from DataFrames to be uploaded to database
-    stm_new = data_manager.get_new_records(stm_df, stm_keys, df_name="stm_df")
-    sec_new = data_manager.get_new_records(sec_df, sec_keys, df_name="sec_df")
+def load_batch(pool: ThreadPoolExecutor, data_manager: DataManager, db_manager: DatabaseManager, dedup_mode: str, known_keys: Dict[str, Any], paths: List[str], **report_values) -> bool:
+    # One watch mode batch, with its own run report. Returns False if anything has to be retried.
+    from utils.pipeline import MAPPING_TYPES, StageClock, refresh_known_keys, completed
+    REPORT.start(PROFILER)
+    clock = StageClock()
+    try:
+        data_manager.reset(paths)
+        if not data_manager.prepare_files():
+            return True
 
-    # Upload new records to database
-    db_manager.upload_new_records(stm_new, sec_new)
+        stm_df, sec_df = clock.run('parse', data_manager.process_csv_files)
+        for mapping_type in MAPPING_TYPES:
+            known_keys[mapping_type] = clock.run(f'refresh {mapping_type}', refresh_known_keys, db_manager, dedup_mode, mapping_type, known_keys[mapping_type])
+        prefetched = {mapping_type: completed(known_keys[mapping_type]) for mapping_type in MAPPING_TYPES}
+        uploaded, _ = load_branches(pool, clock, data_manager, db_manager, dedup_mode, {'stm': stm_df, 'sec': sec_df}, prefetched, known_keys)
+        log.info(f"Watch: Batch of {len(paths)} files done in {clock.elapsed():.2f}s")
+        return all(uploaded.values())
+    except Exception as e:
+        log.error(f"Watch: Batch failed: {e}", exc_info=True)
+        return False
+    finally:
+        # Latest batch only, a long-running process would otherwise pile up reports
+        REPORT.write(str(logger.run_report_path()), dedup_mode=dedup_mode, watch=True, files=len(paths), **report_values)
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(workers=args.workers, executor=args.executor, full_reprocess=args.full_reprocess, dedup_mode=args.dedup, compact=args.compact,
+         watch_dir=args.watch, debounce=args.debounce, poll_interval=args.poll_interval)
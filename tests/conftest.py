@@ -0,0 +1,71 @@
+import os
+import uuid
+import tempfile
+import pytest
+import yaml
+from sqlalchemy import create_engine, text
+
+# config.settings reads these at import time; tests pass their own paths explicitly
+for name in ('DATA_CONFIG_PATH', 'DB_CONFIG_PATH', 'CSV_FILES_DIR'):
+    os.environ.setdefault(name, tempfile.gettempdir())
+os.environ.setdefault('CONFIG_CACHE_DIR', '') # no cache files outside the test's tmp_path
+
+# Tables of the db_manager fixture: a small stm table (with a monthly aggregate) and sec
+DB_CONFIG = {
+    'tables': {
+        'stm': {
+            'table_name': 'stm'
+            , 'fields': {
+                'surrogate_key': {'type': 'String', 'length': 32, 'primary_key': True}
+                , 'acc_number': {'type': 'String', 'length': 50}
+                , 'dt': {'type': 'Date'}
+                , 'year': {'type': 'Integer'}
+                , 'ym': {'type': 'String', 'length': 7}
+                , 'details': {'type': 'String', 'length': 255}
+                , 'sum': {'type': 'Decimal', 'precision': 10, 'scale': 2}
+            }
+        }
+        , 'sec': {
+            'table_name': 'sec'
+            , 'fields': {
+                'surrogate_key': {'type': 'String', 'length': 32, 'primary_key': True}
+                , 'qty': {'type': 'Integer'}
+            }
+        }
+    }
+    , 'aggregates': [{'table_name': 'stm_monthly', 'source': 'stm', 'group_by': ['acc_number', 'ym'], 'sums': ['sum']}]
+}
+TABLES = [
+    "create table {schema}.stm (surrogate_key varchar(32) primary key, acc_number varchar(50), dt date, year integer, ym varchar(7), details varchar(255), sum numeric(10, 2))"
+    , "create table {schema}.sec (surrogate_key varchar(32) primary key, qty integer)"
+    , "create table {schema}.stm_monthly (acc_number varchar(255), ym varchar(255), sum_total numeric(18, 2) not null, row_count bigint not null, primary key (acc_number, ym))"
+]
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def db_manager(request, tmp_path):
+    """ DatabaseManager on fresh tables, on SQLite and on the PostgreSQL database of TEST_DATABASE_URL
+        (e.g. postgresql+psycopg://postgres@/postgres?host=/tmp/pgdata, skipped when not set). """
+
+    from utils.db_manager import DatabaseManager
+    if request.param == 'sqlite':
+        url, schema = f"sqlite:///{tmp_path / 'fin.db'}", 'main'
+    else:
+        url, schema = os.environ.get('TEST_DATABASE_URL'), f"test_{uuid.uuid4().hex[:8]}"
+        if not url:
+            pytest.skip("TEST_DATABASE_URL is not set")
+
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        if schema != 'main':
+            connection.execute(text(f"create schema {schema}"))
+        for query in TABLES:
+            connection.execute(text(query.format(schema=schema)))
+    db_config_path = tmp_path / 'db.yaml'
+    db_config_path.write_text(yaml.safe_dump({'schema': schema, **DB_CONFIG}))
+
+    yield DatabaseManager(url, str(db_config_path))
+    if schema != 'main':
+        with engine.begin() as connection:
+            connection.execute(text(f"drop schema {schema} cascade"))
+    engine.dispose()
@@ -0,0 +1,66 @@
+import hashlib
+import numpy as np
+import pandas as pd
+import pytest
+from decimal import Decimal
+from sqlalchemy import text
+from utils.aggregates import AggregateSpec
+
+FIELDS = {
+    'acc_number': {'type': 'String'}
+    , 'year': {'type': 'Integer'}
+    , 'sum': {'type': 'Decimal', 'precision': 10, 'scale': 2}
+    , 'qty': {'type': 'Integer'}
+}
+
+
+def spec(group_by, sums):
+    return AggregateSpec({'table_name': 'agg', 'source': 'stm', 'group_by': group_by, 'sums': sums}, FIELDS)
+
+def stm_records(keys, sums):
+    return pd.DataFrame({
+        'surrogate_key': [hashlib.md5(str(k).encode()).hexdigest() for k in keys]
+        , 'acc_number': ['EE1' if k % 2 else 'EE2' for k in keys]
+        , 'dt': pd.to_datetime('2024-01-15')
+        , 'year': 2024
+        , 'ym': '2024-01'
+        , 'details': 'x'
+        , 'sum': sums
+    })
+
+def aggregate(db_manager):
+    query = f"select acc_number, ym, sum_total, row_count from {db_manager.schema_name}.stm_monthly order by acc_number, ym"
+    with db_manager.engine.connect() as connection:
+        return [(a, ym, round(Decimal(str(total)), 2), count) for a, ym, total, count in connection.execute(text(query))]
+
+
+def test_decimal_totals_are_exact():
+    df = pd.DataFrame({'acc_number': ['EE1'] * 10 + ['EE2'] * 3, 'sum': [0.1] * 10 + [0.125, -0.125, np.nan]})
+    deltas = spec(['acc_number'], ['sum']).deltas_from_frame(df)
+    assert deltas.to_dict('records') == [
+        {'acc_number': 'EE1', 'sum_total': Decimal('1.00'), 'row_count': 10}
+        , {'acc_number': 'EE2', 'sum_total': Decimal('0.00'), 'row_count': 3} # 0.13 - 0.13, half away from zero
+    ]
+
+def test_totals_of_any_value_type():
+    df = pd.DataFrame({'year': [2024.0, 2024.0, np.nan], 'sum': ['1.005', Decimal('2.10'), None], 'qty': [1, 2, 3]})
+    deltas = spec(['year'], ['sum', 'qty']).deltas_from_frame(df)
+    assert deltas.to_dict('records') == [
+        {'year': '2024', 'sum_total': Decimal('3.11'), 'qty_total': 3, 'row_count': 2}
+        , {'year': '', 'sum_total': Decimal('0.00'), 'qty_total': 3, 'row_count': 1}
+    ]
+
+@pytest.mark.parametrize('strategy', ['anti_join', 'on_conflict'])
+def test_merged_aggregates_match_rebuild(db_manager, strategy):
+    assert db_manager.merge_records('stm', stm_records(range(10), [0.1] * 10), strategy=strategy)
+    assert db_manager.merge_records('stm', stm_records(range(5, 20), [0.2] * 15), strategy=strategy)
+    merged = aggregate(db_manager)
+    assert merged == [('EE1', '2024-01', Decimal('1.50'), 10), ('EE2', '2024-01', Decimal('1.50'), 10)]
+
+    db_manager.rebuild_aggregates()
+    assert aggregate(db_manager) == merged
+
+def test_keys_repeated_in_batch_count_once(db_manager):
+    records = stm_records([1, 1, 2, 3, 3, 3], [1.25] * 6)
+    assert db_manager.merge_records('stm', records, strategy='on_conflict')
+    assert aggregate(db_manager) == [('EE1', '2024-01', Decimal('2.50'), 2), ('EE2', '2024-01', Decimal('1.25'), 1)]
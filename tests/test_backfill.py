@@ -0,0 +1,71 @@
+import os
+import pytest
+from types import SimpleNamespace
+from utils.backfill import plan_shards
+from utils.db_manager import DatabaseManager
+
+DATA_CONFIG = {
+    'file_pattern': r'^(\w+)_(\w+)_(stm|sec)_.*\.csv$'
+    , 'mapping': {
+        'stm': {'swed': {'date_format': '%d.%m.%Y'}, 'lhv': {'date_format': '%Y-%m-%d'}}
+        , 'sec': {'lhv': {'date_format': '%Y-%m-%d'}}
+    }
+}
+
+
+def write_files(tmp_path, sizes):
+    paths = []
+    for name, size in sizes.items():
+        path = tmp_path / name
+        path.write_bytes(b'x' * size)
+        paths.append(str(path))
+    return paths
+
+def names(shards):
+    return [[os.path.basename(p) for p in shard] for shard in shards]
+
+
+def test_shards_never_mix_groups(tmp_path):
+    paths = write_files(tmp_path, {
+        'swed_main_stm_01.csv': 10, 'swed_main_stm_02.csv': 10, 'swed_main_stm_03.csv': 10
+        , 'swed_card_stm_01.csv': 10, 'lhv_main_stm_01.csv': 10, 'lhv_main_sec_01.csv': 10
+    })
+    shards = plan_shards(paths, DATA_CONFIG, 15)
+    groups = [{tuple(name.split('_')[:3]) for name in shard} for shard in names(shards)]
+    assert all(len(group) == 1 for group in groups)
+    assert sorted(p for shard in shards for p in shard) == sorted(paths)
+
+def test_group_is_cut_in_name_order(tmp_path):
+    paths = write_files(tmp_path, {f'swed_main_stm_{i:02d}.csv': 10 for i in range(5, 0, -1)})
+    assert names(plan_shards(paths, DATA_CONFIG, 20)) == [
+        ['swed_main_stm_01.csv', 'swed_main_stm_02.csv']
+        , ['swed_main_stm_03.csv', 'swed_main_stm_04.csv']
+        , ['swed_main_stm_05.csv']
+    ]
+
+def test_unlimited_shard_is_whole_group(tmp_path):
+    paths = write_files(tmp_path, {
+        'swed_main_stm_01.csv': 10, 'swed_main_stm_02.csv': 50, 'lhv_main_sec_01.csv': 30, 'lhv_main_sec_02.csv': 5
+    })
+    assert names(plan_shards(paths, DATA_CONFIG, float('inf'))) == [
+        ['swed_main_stm_01.csv', 'swed_main_stm_02.csv']
+        , ['lhv_main_sec_01.csv', 'lhv_main_sec_02.csv']
+    ]
+
+def test_files_without_config_are_skipped(tmp_path):
+    paths = write_files(tmp_path, {'seb_main_stm_01.csv': 10, 'notes.csv': 10, 'lhv_main_sec_01.csv': 10})
+    assert names(plan_shards(paths, DATA_CONFIG, 1)) == [['lhv_main_sec_01.csv']]
+
+
+@pytest.mark.parametrize('table_config, expected', [
+    ({'fields': {'surrogate_key': {'primary_key': True}, 'dt': {}}}, True)
+    , ({'fields': {'surrogate_key': {'unique': True}, 'dt': {}}}, True)
+    , ({'fields': {'surrogate_key': {}}, 'indexes': [{'columns': ['surrogate_key'], 'unique': True}]}, True)
+    , ({'fields': {'surrogate_key': {}}, 'unique_constraints': [{'columns': ['surrogate_key']}]}, True)
+    , ({'fields': {'surrogate_key': {'primary_key': True}, 'dt': {'primary_key': True}}}, False)
+    , ({'fields': {'surrogate_key': {'index': True}}, 'indexes': [{'columns': ['surrogate_key']}]}, False)
+    , ({'fields': {'surrogate_key': {}}, 'unique_constraints': [{'columns': ['surrogate_key', 'dt']}]}, False)
+])
+def test_has_unique_key(table_config, expected):
+    db_manager = SimpleNamespace(config={'tables': {'stm': table_config}})
+    assert DatabaseManager.has_unique_key(db_manager, 'stm') is expected
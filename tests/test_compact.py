@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+from utils.compact import compact_frame, expand_frame, is_compact
+from utils.data_manager import FileProcessor
+
+# File configs like in the data config, desired_fields also keep the intermediate columns
+CONFIGS = {
+    'stm': {
+        'csv_separator': ';'
+        , 'date_format': '%d.%m.%Y'
+        , 'original_fields': {'Account': 'acc_number', 'Date': 'dt', 'Details': 'details', 'Amount': 'sum', 'DC': 'dc'}
+        , 'surrogate_key_columns': ['acc_number', 'dt', 'details', 'sum', 'dc']
+        , 'accounts': {'EE1': 'main'}
+        , 'debit_multiplier': {'D': -1, 'K': 1}
+        , 'desired_fields': ['surrogate_key', 'bank_name', 'acc_type', 'file_name', 'acc_number', 'acc_name', 'dt', 'year', 'ym', 'details', 'sum', 'dc', 'concat_key', 'sum_tmp', 'processed_at']
+    }
+    , 'sec': {
+        'csv_separator': ','
+        , 'date_format': '%Y-%m-%d'
+        , 'original_fields': {'Sent': 'send_dt', 'Effective': 'effect_dt', 'Ticker': 'ticker', 'Qty': 'qty', 'Price': 'price'}
+        , 'surrogate_key_columns': ['send_dt', 'effect_dt', 'ticker', 'qty', 'price']
+        , 'desired_fields': ['surrogate_key', 'bank_name', 'acc_type', 'file_name', 'send_dt', 'effect_dt', 'effect_year', 'effect_ym', 'ticker', 'qty', 'price', 'concat_key', 'processed_at']
+    }
+}
+ROWS = {
+    'stm': ['Account;Date;Details;Amount;DC', 'EE1;05.10.2024;Pay 0;1034,32;D', 'EE2;06.11.2024;Pay 1;12,5;K', 'EE1;05.10.2024;;7;D']
+    , 'sec': ['Sent,Effective,Ticker,Qty,Price', '2024-01-01,2024-02-01,T0,0,0.0', '2024-01-02,2024-03-01,T1,5,', '2024-01-03,2024-03-02,T0,2,1.5']
+}
+
+
+@pytest.fixture(params=['stm', 'sec'])
+def processor(request, tmp_path):
+    mapping_type = request.param
+    path = tmp_path / f'bank_main_{mapping_type}_01.csv'
+    path.write_text('\n'.join(ROWS[mapping_type]) + '\n')
+    def build(config=CONFIGS[mapping_type], compact=False):
+        return FileProcessor(str(path), path.name, 'bank', 'main', mapping_type, config, compact=compact)
+    return build
+
+
+def test_expand_gives_back_processed_frame(processor):
+    df = processor().process_file()
+    assert {'concat_key'} <= set(df.columns) and len(df) == 3
+    compact = compact_frame(df, processor().file_specific_config['desired_fields'])
+    assert is_compact(compact)
+    pd.testing.assert_frame_equal(expand_frame(compact), df)
+
+def test_compact_processing_keeps_desired_fields(processor):
+    df = processor().process_file().drop(columns=['processed_at'])
+    compact = processor(compact=True).process_file()
+    pd.testing.assert_frame_equal(expand_frame(compact).drop(columns=['processed_at']), df)
+
+def test_temporary_columns_dropped_when_not_desired(processor):
+    df = processor().process_file()
+    assert not {'concat_key', 'sum_tmp'} & set(compact_frame(df).columns)
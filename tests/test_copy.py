@@ -0,0 +1,71 @@
+import hashlib
+import numpy as np
+import pandas as pd
+import pytest
+from decimal import Decimal
+from sqlalchemy import text
+from utils.compact import compact_frame
+
+DETAILS = ['plain', None, '\\N', '', 'say "hi", then\nnew line', 'õun € ü']
+
+
+def records(details):
+    n = len(details)
+    return pd.DataFrame({
+        'surrogate_key': [hashlib.md5(str(i).encode()).hexdigest() for i in range(n)]
+        , 'acc_number': 'EE1'
+        , 'dt': pd.to_datetime(['2024-01-15'] * (n - 1) + [None])
+        , 'year': [2024.0] * (n - 1) + [np.nan] # float with a missing value, cast to Int64 for COPY
+        , 'ym': '2024-01'
+        , 'details': details
+        , 'sum': [12.5, -0.01, np.nan, 0, 1e6, 3.14][:n]
+    })
+
+def loaded(db_manager):
+    query = f"select details, year, dt, sum from {db_manager.schema_name}.stm order by surrogate_key"
+    with db_manager.engine.connect() as connection:
+        return connection.execute(text(query)).all()
+
+@pytest.fixture
+def pg_manager(db_manager):
+    if db_manager.engine.dialect.name != 'postgresql':
+        pytest.skip("COPY needs PostgreSQL")
+    return db_manager
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_copy_round_trip(pg_manager, compact):
+    df = records(DETAILS)
+    assert pg_manager.upload_records('stm', compact_frame(df) if compact else df)
+
+    expected = df.sort_values('surrogate_key')
+    rows = loaded(pg_manager)
+    assert [row.details for row in rows] == [None if pd.isna(v) else v for v in expected['details']]
+    assert [row.year for row in rows] == [None if pd.isna(v) else int(v) for v in expected['year']]
+    assert [row.dt for row in rows] == [None if pd.isna(v) else v.date() for v in expected['dt']]
+    assert [row.sum for row in rows] == [None if pd.isna(v) else Decimal(f'{v:.2f}') for v in expected['sum']]
+
+def test_null_marker_avoids_text_values(pg_manager):
+    assert pg_manager._copy_null(records(['plain', None])) == '\\N'
+    assert pg_manager._copy_null(records(['\\N', '\\N\\N', None])) == '\\N\\N\\N'
+
+def test_copy_counts_bytes(pg_manager):
+    df = records(['õõõõ'])
+    payload = df.astype({'year': 'Int64'}).to_csv(header=False, index=False, na_rep='\\N')
+    with pg_manager.engine.begin() as connection:
+        sent = pg_manager._copy_data(connection, df, 'stm', pg_manager.schema_name, ['year'])
+    assert sent == len(payload.encode()) == len(payload) + 4
+
+def test_copy_closes_its_cursor(pg_manager):
+    with pg_manager.engine.begin() as connection:
+        driver_connection = connection.connection.driver_connection
+        cursors, new_cursor = [], driver_connection.cursor
+        def cursor(*args, **kwargs):
+            cursors.append(new_cursor(*args, **kwargs))
+            return cursors[-1]
+        driver_connection.cursor = cursor
+        try:
+            pg_manager._copy_data(connection, records(['plain']), 'stm', pg_manager.schema_name, ['year'])
+        finally:
+            del driver_connection.cursor
+    assert len(cursors) == 1 and cursors[0].closed
@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+from datetime import date
+from sqlalchemy import inspect, text
+from db_init import Base, DatabaseInitializer, PartitionSpec
+
+# Added to the stm table of the db_manager fixture: a column and a secondary index
+MIGRATED_FIELDS = {'memo': {'type': 'String', 'length': 100}}
+MIGRATED_INDEXES = [{'columns': ['year', 'ym']}]
+
+
+@pytest.fixture(autouse=True)
+def fresh_models():
+    # Models are registered in Base.metadata by table name (SQLite tables are all in 'main')
+    yield
+    Base.metadata.clear()
+    Base.registry.dispose()
+
+@pytest.fixture
+def initializer(db_manager):
+    stm = db_manager.config['tables']['stm']
+    db_manager.config['tables']['stm'] = {**stm, 'fields': {**stm['fields'], **MIGRATED_FIELDS}, 'indexes': MIGRATED_INDEXES}
+    return DatabaseInitializer(db_manager)
+
+def load_rows(db_manager, n):
+    records = pd.DataFrame({
+        'surrogate_key': [f"{i:032x}" for i in range(n)]
+        , 'acc_number': 'EE1'
+        , 'dt': pd.to_datetime('2024-01-15')
+        , 'year': 2024
+        , 'ym': '2024-01'
+        , 'details': 'x'
+        , 'sum': 1.0
+    })
+    assert db_manager.merge_records('stm', records)
+
+def stm_state(db_manager):
+    inspector = inspect(db_manager.engine)
+    schema = db_manager.schema_name
+    columns = [column['name'] for column in inspector.get_columns('stm', schema=schema)]
+    indexes = {index['name'] for index in inspector.get_indexes('stm', schema=schema)}
+    with db_manager.engine.connect() as connection:
+        rows = connection.execute(text(f"select count(*) from {schema}.stm")).scalar()
+    return columns, indexes, rows
+
+
+def test_migrate_adds_column_and_index_keeping_rows(initializer):
+    load_rows(initializer.db_manager, 5)
+    initializer.migrate()
+    columns, indexes, rows = stm_state(initializer.db_manager)
+    assert columns[-1] == 'memo'
+    assert 'ix_stm_year_ym' in indexes
+    assert rows == 5
+
+    initializer.migrate() # nothing left to add
+    assert stm_state(initializer.db_manager) == (columns, indexes, rows)
+
+def test_migrate_restores_dropped_indexes(initializer):
+    initializer.migrate()
+    load_rows(initializer.db_manager, 3)
+    assert initializer.drop_secondary_indexes() == ['ix_stm_year_ym']
+    assert 'ix_stm_year_ym' not in stm_state(initializer.db_manager)[1]
+
+    initializer.migrate()
+    _, indexes, rows = stm_state(initializer.db_manager)
+    assert 'ix_stm_year_ym' in indexes
+    assert rows == 3
+
+
+FIELDS = {'dt': {'type': 'Date'}, 'year': {'type': 'Integer'}, 'ym': {'type': 'String'}}
+
+def assert_contiguous(ranges):
+    # Upper bounds are exclusive: each range ends where the next one starts
+    for (_, _, upper), (_, lower, _) in zip(ranges, ranges[1:]):
+        assert upper == lower
+
+def test_month_ranges_cross_year():
+    spec = PartitionSpec('stm', {'column': 'dt', 'interval': 'month', 'start': '2023-11'}, FIELDS)
+    ranges = spec.ranges(today=date(2023, 12, 31))
+    assert ranges == [
+        ('stm_m202311', "'2023-11-01'", "'2023-12-01'")
+        , ('stm_m202312', "'2023-12-01'", "'2024-01-01'")
+        , ('stm_m202401', "'2024-01-01'", "'2024-02-01'")
+    ]
+    assert spec.ranges(today=date(2024, 1, 1))[-1] == ('stm_m202402', "'2024-02-01'", "'2024-03-01'")
+    assert_contiguous(ranges)
+
+def test_year_ranges():
+    spec = PartitionSpec('stm', {'column': 'dt', 'start': 2023, 'ahead': 2}, FIELDS)
+    ranges = spec.ranges(today=date(2024, 12, 31))
+    assert ranges == [
+        ('stm_y2023', "'2023-01-01'", "'2024-01-01'")
+        , ('stm_y2024', "'2024-01-01'", "'2025-01-01'")
+        , ('stm_y2025', "'2025-01-01'", "'2026-01-01'")
+        , ('stm_y2026', "'2026-01-01'", "'2027-01-01'")
+    ]
+    assert spec.ranges(today=date(2025, 1, 1))[-1][0] == 'stm_y2027'
+    assert_contiguous(ranges)
+
+@pytest.mark.parametrize('column, interval, expected', [
+    ('year', 'year', [('stm_y2024', '2024', '2025'), ('stm_y2025', '2025', '2026')])
+    , ('ym', 'year', [('stm_y2024', "'2024'", "'2025'"), ('stm_y2025', "'2025'", "'2026'")])
+    , ('ym', 'month', [('stm_m202412', "'2024-12'", "'2025-01'"), ('stm_m202501', "'2025-01'", "'2025-02'")])
+])
+def test_bounds_follow_column_type(column, interval, expected):
+    start = '2024' if interval == 'year' else '2024-12'
+    spec = PartitionSpec('stm', {'column': column, 'interval': interval, 'start': start}, FIELDS)
+    assert spec.ranges(today=date(2024, 12, 15)) == expected
+
+def test_invalid_partition_config():
+    with pytest.raises(ValueError):
+        PartitionSpec('stm', {'column': 'dt', 'interval': 'week', 'start': 2024}, FIELDS)
+    with pytest.raises(ValueError):
+        PartitionSpec('stm', {'column': 'year', 'interval': 'month', 'start': '2024-01'}, FIELDS)
+    with pytest.raises(ValueError):
+        PartitionSpec('stm', {'column': 'missing', 'start': 2024}, FIELDS)
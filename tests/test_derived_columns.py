@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils import derived_columns
+from utils.derived_columns import DateParser, date_parser, year_month
+
+VALUES = {
+    '%d.%m.%Y': ['15.01.2024', '31.12.2023', None, '15.01.2024', np.nan, '29.02.2024']
+    , '%Y-%m-%d': ['2024-01-15', '2023-12-31', None, '2024-01-15', '1999-07-01', '2024-02-29']
+    , '%Y-%m-%d %H:%M:%S': ['2024-01-15 10:00:00', '2024-01-15 23:59:59', None, '2024-01-15 10:00:00', '2024-03-01 00:00:00', None]
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_parsers():
+    derived_columns._DATE_PARSERS.clear()
+    yield
+    derived_columns._DATE_PARSERS.clear()
+
+
+@pytest.mark.parametrize('date_format', list(VALUES))
+def test_parse_matches_to_datetime(date_format):
+    values = pd.Series(VALUES[date_format], index=range(10, 16), name='dt')
+    parser = date_parser(date_format)
+    for _ in range(2): # parsed, then from the cache
+        pd.testing.assert_series_equal(parser.parse(values), pd.to_datetime(values, format=date_format))
+
+@pytest.mark.parametrize('date_format', list(VALUES))
+def test_year_month_matches_strftime(date_format):
+    dates = pd.to_datetime(pd.Series(VALUES[date_format], name='dt'), format=date_format)
+    pd.testing.assert_series_equal(year_month(dates), dates.dt.strftime('%Y-%m'))
+
+def test_all_missing():
+    values = pd.Series([None, np.nan], dtype=object)
+    dates = DateParser('%Y-%m-%d').parse(values)
+    pd.testing.assert_series_equal(dates, pd.to_datetime(values, format='%Y-%m-%d'))
+    pd.testing.assert_series_equal(year_month(dates), dates.dt.strftime('%Y-%m'))
+
+def test_timezone_falls_back_uncached():
+    values = pd.Series(['2024-01-15 10:00:00+0200', '2024-01-16 10:00:00+0200'])
+    parser = DateParser('%Y-%m-%d %H:%M:%S%z')
+    pd.testing.assert_series_equal(parser.parse(values), pd.to_datetime(values, format='%Y-%m-%d %H:%M:%S%z'))
+    assert parser.cache == {}
+
+def test_full_cache_starts_over(monkeypatch):
+    monkeypatch.setattr(DateParser, 'MAX_CACHE_SIZE', 3)
+    parser = DateParser('%Y-%m-%d')
+    parser.parse(pd.Series(['2024-01-01', '2024-01-02']))
+    values = pd.Series(['2024-02-01', '2024-02-02', '2024-01-01'])
+    pd.testing.assert_series_equal(parser.parse(values), pd.to_datetime(values, format='%Y-%m-%d'))
+    assert len(parser.cache) <= 3
+
+def test_invalid_value_raises():
+    with pytest.raises(ValueError):
+        DateParser('%Y-%m-%d').parse(pd.Series(['2024-13-01']))
+
+def test_one_parser_per_format():
+    assert date_parser('%Y-%m-%d') is date_parser('%Y-%m-%d')
+    assert date_parser('%Y-%m-%d') is not date_parser('%d.%m.%Y')
@@ -0,0 +1,14 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('module', ['main', 'backfill', 'db_init'])
+def test_import_does_not_set_up_logging(module):
+    # Spawned worker processes import the entry module again: that must not clean up the
+    # parent's logs or open a log file of its own, only main() sets up logging
+    code = f"import {module}; from config import logger; assert logger.current_log_file is None"
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, check=True)
@@ -0,0 +1,79 @@
+import hashlib
+import numpy as np
+import pandas as pd
+import pickle
+import pytest
+from utils.key_hasher import SurrogateKeyHasher, key_hash_pool
+
+COLUMNS = ['acc_number', 'dt', 'sum', 'qty', 'details']
+
+
+def frame(n=50):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({
+        'acc_number': rng.choice(['EE1', 'EE2', None], n)
+        , 'dt': rng.choice(['15.01.2024', '16.01.2024'], n)
+        , 'sum': np.where(rng.random(n) < 0.2, np.nan, rng.normal(0, 100, n).round(2))
+        , 'qty': rng.integers(0, 10, n)
+        , 'details': rng.choice(['shop', 'a#b', 'õun', ''], n)
+    })
+
+def legacy_keys(df, columns):
+    # The former row-wise surrogate key
+    concat_keys = df[columns].astype(str).agg('#'.join, axis=1)
+    return concat_keys, concat_keys.apply(lambda key: hashlib.md5(key.encode()).hexdigest())
+
+
+@pytest.mark.parametrize('columns', [COLUMNS, ['sum'], ['details', 'acc_number']])
+def test_keys_match_legacy(columns):
+    df = frame()
+    concat_keys, surrogate_keys = legacy_keys(df, columns)
+    keyed = SurrogateKeyHasher(columns).add_keys(df.copy())
+    assert keyed['concat_key'].tolist() == concat_keys.tolist()
+    assert keyed['surrogate_key'].tolist() == surrogate_keys.tolist()
+
+def test_keys_match_legacy_in_worker_processes():
+    df = frame(250)
+    _, surrogate_keys = legacy_keys(df, COLUMNS)
+    pool = key_hash_pool(2)
+    try:
+        for _ in range(2): # the same pool serves every call
+            keyed = SurrogateKeyHasher(COLUMNS, batch_size=100, executor=pool).add_keys(df.copy())
+            assert keyed['surrogate_key'].tolist() == surrogate_keys.tolist()
+            assert keyed.index.equals(df.index)
+    finally:
+        pool.shutdown()
+
+class RecordingExecutor:
+    def __init__(self):
+        self.batches = []
+    def map(self, func, batches):
+        self.batches += batches
+        return map(func, batches)
+
+def test_small_frames_hash_in_process():
+    executor = RecordingExecutor()
+    hasher = SurrogateKeyHasher(COLUMNS, batch_size=100, executor=executor)
+    hasher.add_keys(frame(100))
+    assert executor.batches == []
+    hasher.add_keys(frame(250))
+    assert [len(batch) for batch in executor.batches] == [100, 100, 50]
+
+def test_one_worker_has_no_pool():
+    assert key_hash_pool(1) is None
+
+def test_keys_keep_index():
+    df = frame(10).set_axis(range(100, 110))
+    keyed = SurrogateKeyHasher(COLUMNS).add_keys(df.copy())
+    assert keyed['surrogate_key'].tolist() == legacy_keys(df, COLUMNS)[1].tolist()
+
+def test_process_workers_get_no_pool():
+    from utils.data_manager import FileProcessor
+    pool = key_hash_pool(2)
+    try:
+        config = {'csv_separator': ';', 'original_fields': {'Date': 'dt'}, 'surrogate_key_columns': ['dt']}
+        processor = FileProcessor('swed_main_stm_01.csv', 'swed_main_stm_01.csv', 'swed', 'main', 'stm', config, key_hash_pool=pool)
+        assert pickle.loads(pickle.dumps(processor)).key_hash_pool is None
+        assert processor.key_hash_pool is pool
+    finally:
+        pool.shutdown()
@@ -0,0 +1,62 @@
+import hashlib
+import numpy as np
+import pandas as pd
+import pytest
+from utils.key_index import SurrogateKeyIndex
+
+
+def digests(values):
+    return np.array([hashlib.md5(str(v).encode()).digest() for v in values], dtype='S16')
+
+def keys_frame(values):
+    return pd.DataFrame({'surrogate_key': [hashlib.md5(str(v).encode()).hexdigest() for v in values]})
+
+
+@pytest.mark.parametrize('n', range(1, 18))
+def test_every_indexed_key_is_found(tmp_path, n):
+    index = SurrogateKeyIndex(str(tmp_path), 'stm', bloom_bits_per_key=10)
+    index.verify(n, lambda: keys_frame(range(n)))
+
+    reopened = SurrogateKeyIndex(str(tmp_path), 'stm', bloom_bits_per_key=10)
+    assert reopened.contains(digests(range(n))).all()
+    assert not reopened.contains(digests(range(1000, 1100))).any()
+
+@pytest.mark.parametrize('bloom_bits', [0, 7, 10])
+def test_added_keys_are_found_before_save(tmp_path, bloom_bits):
+    index = SurrogateKeyIndex(str(tmp_path), 'stm', bloom_bits_per_key=bloom_bits)
+    index.verify(5, lambda: keys_frame(range(5)))
+
+    index.add(digests(range(5, 40)))
+    assert index.modified
+    assert index.contains(digests(range(40))).all()
+    index.save()
+    assert SurrogateKeyIndex(str(tmp_path), 'stm', bloom_bits_per_key=bloom_bits).contains(digests(range(40))).all()
+
+def test_empty_index_finds_added_keys(tmp_path):
+    index = SurrogateKeyIndex(str(tmp_path), 'stm')
+    assert not index.contains(digests(range(3))).any()
+    index.add(digests(range(3)))
+    assert index.contains(digests(range(3))).all()
+
+def test_verify_counts_distinct_keys(tmp_path):
+    calls = []
+    def load_keys():
+        calls.append(1)
+        return keys_frame([1, 1, 2, 3]) # table with a duplicated key
+
+    index = SurrogateKeyIndex(str(tmp_path), 'stm')
+    assert not index.verify(3, load_keys)
+    assert len(index) == 3
+    assert SurrogateKeyIndex(str(tmp_path), 'stm').verify(3, load_keys)
+    assert len(calls) == 1
+
+def test_bloom_without_size_header_is_rebuilt(tmp_path):
+    index = SurrogateKeyIndex(str(tmp_path), 'stm', bloom_bits_per_key=10)
+    index.verify(7, lambda: keys_frame(range(7)))
+    # Bloom file as written before the size header: 70 bits packed into 9 bytes
+    legacy = np.packbits(np.ones(70, dtype=bool), bitorder='little')
+    np.save(index.bloom_path, legacy)
+
+    reopened = SurrogateKeyIndex(str(tmp_path), 'stm', bloom_bits_per_key=10)
+    assert reopened.bloom_size == 70 and reopened.modified
+    assert reopened.contains(digests(range(7))).all()
@@ -0,0 +1,77 @@
+import os
+import pytest
+from utils.manifest import RunManifest
+
+DATA_CONFIG = {
+    'file_pattern': r'^(\w+)_(\w+)_(stm|sec)_.*\.csv$'
+    , 'mapping': {'stm': {'swed': {'date_format': '%d.%m.%Y'}}, 'sec': {'lhv': {'date_format': '%Y-%m-%d'}}}
+}
+
+
+@pytest.fixture
+def csv_files(tmp_path):
+    paths = []
+    for name in ('swed_main_stm_01.csv', 'swed_main_stm_02.csv', 'lhv_inv_sec_01.csv'):
+        path = tmp_path / name
+        path.write_text(f'header\n{name}\n')
+        paths.append(str(path))
+    return paths
+
+def record_all(manifest_path, paths, data_config=DATA_CONFIG):
+    manifest = RunManifest(manifest_path)
+    for path in paths:
+        manifest.record(path, RunManifest.config_version(RunManifest.file_config(path, data_config)[1]))
+    manifest.save()
+
+def set_mtime(path, offset):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + offset))
+
+
+def test_new_files_are_changed(tmp_path, csv_files):
+    manifest = RunManifest(str(tmp_path / 'manifest.json'))
+    assert manifest.changed_files(csv_files, DATA_CONFIG) == csv_files
+
+def test_unchanged_files_are_skipped(tmp_path, csv_files):
+    manifest_path = str(tmp_path / 'manifest.json')
+    record_all(manifest_path, csv_files)
+    assert RunManifest(manifest_path).changed_files(csv_files, DATA_CONFIG) == []
+
+def test_changed_content_is_rerun(tmp_path, csv_files):
+    manifest_path = str(tmp_path / 'manifest.json')
+    record_all(manifest_path, csv_files)
+
+    with open(csv_files[0], 'a') as file:
+        file.write('new row\n') # other size
+    with open(csv_files[1], 'r+') as file:
+        file.write('HEADER') # same size, other content
+    set_mtime(csv_files[1], 10)
+    assert RunManifest(manifest_path).changed_files(csv_files, DATA_CONFIG) == csv_files[:2]
+
+def test_touched_file_is_skipped_and_remembered(tmp_path, csv_files):
+    manifest_path = str(tmp_path / 'manifest.json')
+    record_all(manifest_path, csv_files)
+    set_mtime(csv_files[0], 10)
+
+    manifest = RunManifest(manifest_path)
+    assert manifest.changed_files(csv_files, DATA_CONFIG) == []
+    assert manifest.modified
+    manifest.save()
+    assert RunManifest(manifest_path).entries[os.path.basename(csv_files[0])]['mtime'] == os.stat(csv_files[0]).st_mtime
+
+def test_changed_config_reruns_its_files(tmp_path, csv_files):
+    manifest_path = str(tmp_path / 'manifest.json')
+    record_all(manifest_path, csv_files)
+    data_config = {**DATA_CONFIG, 'mapping': {**DATA_CONFIG['mapping'], 'stm': {'swed': {'date_format': '%Y-%m-%d'}}}}
+    assert RunManifest(manifest_path).changed_files(csv_files, data_config) == csv_files[:2]
+
+def test_files_without_config_are_ignored(tmp_path, csv_files):
+    other = tmp_path / 'seb_main_stm_01.csv'
+    other.write_text('header\n')
+    manifest = RunManifest(str(tmp_path / 'manifest.json'))
+    assert manifest.changed_files([str(other), str(tmp_path / 'notes.txt')], DATA_CONFIG) == []
+
+def test_broken_manifest_reruns_everything(tmp_path, csv_files):
+    manifest_path = tmp_path / 'manifest.json'
+    manifest_path.write_text('{broken')
+    assert RunManifest(str(manifest_path)).changed_files(csv_files, DATA_CONFIG) == csv_files
@@ -0,0 +1,78 @@
+import hashlib
+import pandas as pd
+import pytest
+from sqlalchemy import event, text
+from utils.compact import compact_frame
+
+
+def stm_records(keys, details='x'):
+    return pd.DataFrame({
+        'surrogate_key': [hashlib.md5(str(k).encode()).hexdigest() for k in keys]
+        , 'acc_number': 'EE1'
+        , 'dt': pd.to_datetime('2024-01-15')
+        , 'year': 2024
+        , 'ym': '2024-01'
+        , 'details': details
+        , 'sum': 1.0
+    })
+
+def stored(db_manager):
+    query = f"select surrogate_key, details from {db_manager.schema_name}.stm order by surrogate_key"
+    with db_manager.engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text(query))]
+
+def expected(keys, details='x'):
+    return sorted((hashlib.md5(str(k).encode()).hexdigest(), details) for k in keys)
+
+@pytest.fixture(params=['aggregates', 'no aggregates'])
+def manager(request, db_manager):
+    # With aggregates the insert returns the inserted rows, without it only counts them
+    if request.param == 'no aggregates':
+        db_manager.aggregates = {}
+    return db_manager
+
+
+@pytest.mark.parametrize('strategy', ['anti_join', 'on_conflict'])
+def test_only_new_keys_are_inserted(manager, strategy):
+    assert manager.merge_records('stm', stm_records(range(5)), strategy=strategy)
+    assert manager.merge_records('stm', stm_records(range(3, 8), details='later'), strategy=strategy)
+    assert stored(manager) == sorted(expected(range(5)) + expected(range(5, 8), 'later'))
+
+@pytest.mark.parametrize('strategy', ['anti_join', 'on_conflict'])
+def test_compact_frames_merge(manager, strategy):
+    assert manager.merge_records('stm', compact_frame(stm_records(range(4))), strategy=strategy)
+    assert manager.merge_records('stm', compact_frame(stm_records(range(6))), strategy=strategy)
+    assert stored(manager) == expected(range(6))
+
+def test_on_conflict_inserts_repeated_key_once(manager):
+    assert manager.merge_records('stm', stm_records([1, 1, 2]), strategy='on_conflict')
+    assert stored(manager) == expected([1, 2])
+
+def test_anti_join_rolls_back_repeated_key(manager):
+    # Keys repeated within the batch hit the primary key: nothing of the batch is kept
+    assert manager.merge_records('stm', stm_records([0]), strategy='anti_join')
+    assert not manager.merge_records('stm', stm_records([1, 1, 2]), strategy='anti_join')
+    assert stored(manager) == expected([0])
+
+def test_empty_records_and_unknown_strategy(manager):
+    assert manager.merge_records('stm', stm_records([]))
+    with pytest.raises(ValueError):
+        manager.merge_records('stm', stm_records([1]), strategy='upsert')
+    assert stored(manager) == []
+
+@pytest.mark.parametrize('bulk_loader', ['copy', 'to_sql'])
+def test_table_named_like_staging_is_kept(manager, bulk_loader, monkeypatch):
+    # A real table with the staging table's name, on the search path (SQLite looks in 'main' after 'temp')
+    monkeypatch.setattr('utils.db_manager.BULK_LOADER', bulk_loader)
+    schema = manager.schema_name
+    if schema != 'main':
+        manager.engine.dispose()
+        event.listen(manager.engine, 'connect', lambda connection, _: connection.execute(f"set search_path to {schema}"))
+    with manager.engine.begin() as connection:
+        connection.execute(text(f"create table {schema}.staging_stm (id integer)"))
+        connection.execute(text(f"insert into {schema}.staging_stm values (1)"))
+
+    assert manager.merge_records('stm', stm_records(range(3)))
+    assert stored(manager) == expected(range(3))
+    with manager.engine.connect() as connection:
+        assert connection.execute(text("select id from staging_stm")).scalar() == 1
@@ -0,0 +1,86 @@
+import pytest
+from utils.read_plan import ReadPlan
+
+CONFIG = {
+    'csv_separator': ';'
+    , 'original_fields': {'Date': 'dt', 'Amount': 'sum', 'Qty': 'qty', 'Details': 'details', 'Ref': 'ref_no', 'Time': 'tm', 'Empty': 'memo'}
+    , 'surrogate_key_columns': ['dt', 'sum', 'qty', 'details', 'ref_no', 'tm', 'memo']
+}
+ROWS = [
+    'Date;Amount;Qty;Details;Ref;Time;Empty;Unused'
+    , '2024-01-15;12.50;0012;shop;2024-01-15T10:00;10:00;;a'
+    , '2024-01-16;;7;;;;;b'
+    , 'NA;-1;2;NA;2024-01-01;11:00;;c'
+]
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'swed_main_stm_01.csv'
+    path.write_text('\n'.join(ROWS) + '\n')
+    return str(path)
+
+
+def test_pyarrow_reads_key_columns_like_c_engine(csv_file):
+    pytest.importorskip('pyarrow')
+    c = ReadPlan(CONFIG, 'c').read_csv(csv_file)
+    pyarrow = ReadPlan(CONFIG, 'pyarrow').read_csv(csv_file)
+    assert list(pyarrow.columns) == list(c.columns) == list(CONFIG['original_fields'])
+    assert pyarrow.dtypes.to_dict() == c.dtypes.to_dict()
+    assert pyarrow.astype(str).values.tolist() == c.astype(str).values.tolist()
+
+def test_pyarrow_keeps_date_text(csv_file):
+    pytest.importorskip('pyarrow')
+    df = ReadPlan({**CONFIG, 'original_fields': {'Date': 'dt', 'Ref': 'send_dt'}}, 'pyarrow').read_csv(csv_file)
+    assert df.astype(str).values.tolist() == [['2024-01-15', '2024-01-15T10:00'], ['2024-01-16', 'nan'], ['nan', '2024-01-01']]
+
+def test_config_dtypes_apply_to_both_engines(csv_file):
+    pytest.importorskip('pyarrow')
+    config = {**CONFIG, 'surrogate_key_columns': ['dt', 'ref_no'], 'dtypes': {'Qty': 'float64', 'Details': 'category'}}
+    for engine in ('c', 'pyarrow'):
+        df = ReadPlan(config, engine).read_csv(csv_file)
+        assert str(df['Qty'].dtype) == 'float64' and str(df['Details'].dtype) == 'category'
+
+
+SEC_CONFIG = {
+    'csv_separator': ';'
+    , 'original_fields': {'Sent': 'send_dt', 'Ticker': 'ticker', 'Qty': 'qty', 'Price': 'price', 'Fee': 'fee', 'Flag': 'flag', 'Total': 'total'}
+    , 'surrogate_key_columns': ['send_dt', 'ticker', 'qty', 'price', 'fee', 'flag']
+}
+SEC_ROWS = [
+    'Sent;Ticker;Qty;Price;Fee;Flag;Total'
+    , '2024-01-15;T0;10;12,50;0012;true;125,00'
+    , '2024-01-16;T1;;3,1;7;false;31,00'
+    , '2024-01-17;T2;5;NA;2;TRUE;1,5'
+]
+
+def keys(config, csv_file):
+    from utils.key_hasher import SurrogateKeyHasher
+    df = ReadPlan(config).read_csv(csv_file).rename(columns=config['original_fields'])
+    return SurrogateKeyHasher(config['surrogate_key_columns']).add_keys(df)['concat_key'].tolist()
+
+@pytest.mark.parametrize('options', [
+    {'decimal_separator': ','}
+    , {'dtypes': {'Qty': 'float64', 'Price': 'string', 'Fee': 'float64'}}
+    , {'decimal_separator': ',', 'dtypes': {'Qty': 'float64', 'Total': 'string'}}
+])
+def test_read_options_keep_keys(tmp_path, options):
+    path = tmp_path / 'lhv_inv_sec_01.csv'
+    path.write_text('\n'.join(SEC_ROWS) + '\n')
+    assert keys({**SEC_CONFIG, **options}, str(path)) == keys(SEC_CONFIG, str(path))
+    assert keys(SEC_CONFIG, str(path))[0] == '2024-01-15#T0#10.0#12,50#12#True'
+
+def test_decimal_still_parses_other_columns(tmp_path):
+    path = tmp_path / 'lhv_inv_sec_01.csv'
+    path.write_text('\n'.join(SEC_ROWS) + '\n')
+    df = ReadPlan({**SEC_CONFIG, 'decimal_separator': ','}).read_csv(str(path))
+    assert df['Total'].tolist() == [125.0, 31.0, 1.5]
+
+@pytest.mark.parametrize('engine', ['c', 'pyarrow'])
+def test_na_values_are_missing(tmp_path, engine):
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow')
+    path = tmp_path / 'swed_main_stm_01.csv'
+    path.write_text('Date;Details\n' + ''.join(f'2024-01-15;{value}\n' for value in ReadPlan.NA_VALUES + ['n.a.']))
+    df = ReadPlan({'csv_separator': ';', 'original_fields': {'Date': 'dt', 'Details': 'details'}}, engine).read_csv(str(path))
+    assert df['Details'].isna().tolist() == [True] * len(ReadPlan.NA_VALUES) + [False]
@@ -0,0 +1,56 @@
+import json
+import os
+import pytest
+from config import settings
+
+CONFIG_YAML = "mapping:\n  stm:\n    swed:\n      date_format: '%d.%m.%Y'\n      debit_multiplier: {D: -1, K: 1}\n"
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'CONFIG_CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+def write_config(tmp_path, content):
+    path = tmp_path / 'data.yaml'
+    path.write_text(content)
+    return str(path)
+
+
+def test_config_cached_as_json(tmp_path, cache_dir):
+    path = write_config(tmp_path, CONFIG_YAML)
+    config = settings.config_loader(path)
+    [cache_file] = cache_dir.iterdir()
+    assert cache_file.suffix == '.json'
+    assert json.loads(cache_file.read_text())['config'] == config
+
+    # Served from the cache: a changed entry shows up as long as the file keeps its size and mtime
+    entry = json.loads(cache_file.read_text())
+    entry['config']['cached'] = True
+    cache_file.write_text(json.dumps(entry))
+    assert settings.config_loader(path) == {**config, 'cached': True}
+
+def test_changed_config_is_reparsed(tmp_path, cache_dir):
+    path = write_config(tmp_path, CONFIG_YAML)
+    settings.config_loader(path)
+    write_config(tmp_path, CONFIG_YAML + "file_pattern: x\n")
+    assert settings.config_loader(path)['file_pattern'] == 'x'
+
+def test_config_without_json_form_is_not_cached(tmp_path, cache_dir):
+    path = write_config(tmp_path, "accounts: {12345: main}\nsince: 2024-01-01\n")
+    config = settings.config_loader(path)
+    assert config['accounts'] == {12345: 'main'}
+    assert not cache_dir.exists() or not list(cache_dir.iterdir())
+    assert settings.config_loader(path) == config
+
+def test_broken_cache_entry_reparses(tmp_path, cache_dir):
+    path = write_config(tmp_path, CONFIG_YAML)
+    config = settings.config_loader(path)
+    [cache_file] = cache_dir.iterdir()
+    cache_file.write_text('{broken')
+    assert settings.config_loader(path) == config
+
+def test_state_is_kept_out_of_input_directory():
+    csv_files_dir = os.path.abspath(settings.CSV_FILES_DIR)
+    for path in (settings.MANIFEST_PATH, settings.KEY_INDEX_DIR, settings.BACKFILL_CHECKPOINT_PATH):
+        assert os.path.commonpath([csv_files_dir, os.path.abspath(path)]) != csv_files_dir
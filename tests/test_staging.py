@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+from utils.read_plan import ReadPlan
+from utils.staging import StagingCache
+
+CONFIG = {
+    'csv_separator': ';'
+    , 'original_fields': {'Date': 'dt', 'Amount': 'sum'}
+    , 'surrogate_key_columns': ['dt', 'sum']
+}
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'swed_main_stm_01.csv'
+    path.write_text('Date;Amount\n15.01.2024;12,50\n')
+    return str(path)
+
+def staged_path(tmp_path, csv_file, config, default_engine='c'):
+    return StagingCache(str(tmp_path / 'staging')).path(csv_file, 'stm', 'swed', 'main', config, ReadPlan(config, default_engine))
+
+
+def test_same_content_and_config_share_entry(tmp_path, csv_file):
+    assert staged_path(tmp_path, csv_file, CONFIG) == staged_path(tmp_path, csv_file, dict(CONFIG))
+
+def test_changed_content_invalidates(tmp_path, csv_file):
+    before = staged_path(tmp_path, csv_file, CONFIG)
+    with open(csv_file, 'a') as file:
+        file.write('16.01.2024;1,00\n')
+    assert staged_path(tmp_path, csv_file, CONFIG) != before
+
+@pytest.mark.parametrize('changed', [
+    {'csv_separator': ','}
+    , {'surrogate_key_columns': ['dt']}
+    , {'dtypes': {'Amount': 'string'}}
+    , {'decimal_separator': ','}
+    , {'csv_engine': 'pyarrow'}
+])
+def test_changed_config_invalidates(tmp_path, csv_file, changed):
+    assert staged_path(tmp_path, csv_file, {**CONFIG, **changed}) != staged_path(tmp_path, csv_file, CONFIG)
+
+def test_default_engine_invalidates(tmp_path, csv_file):
+    # CSV_ENGINE is not part of the file config, only of the effective read plan
+    assert staged_path(tmp_path, csv_file, CONFIG, 'pyarrow') != staged_path(tmp_path, csv_file, CONFIG, 'c')
+
+def test_save_and_load(tmp_path, csv_file):
+    pytest.importorskip('pyarrow')
+    cache = StagingCache(str(tmp_path / 'staging'))
+    path = staged_path(tmp_path, csv_file, CONFIG)
+    assert cache.load(path) is None
+
+    df = pd.DataFrame({'surrogate_key': ['a', 'b'], 'sum': [1.5, None]})
+    cache.save(path, df)
+    pd.testing.assert_frame_equal(cache.load(path), df)
+
+    with open(path, 'wb') as file:
+        file.write(b'broken')
+    assert cache.load(path) is None
@@ -0,0 +1,53 @@
+import pandas as pd
+from utils.data_manager import FileProcessor
+
+CONFIG = {
+    'csv_separator': ';'
+    , 'date_format': '%d.%m.%Y'
+    , 'original_fields': {'Account': 'acc_number', 'Date': 'dt', 'Details': 'details', 'Amount': 'sum', 'DC': 'dc', 'RefNo': 'ref_no', 'Qty': 'qty'}
+    , 'surrogate_key_columns': ['acc_number', 'dt', 'details', 'sum', 'dc', 'ref_no', 'qty']
+    , 'accounts': {'EE1': 'main'}
+    , 'debit_multiplier': {'D': -1, 'K': 1}
+    , 'desired_fields': ['surrogate_key', 'file_name', 'acc_number', 'acc_name', 'dt', 'year', 'ym', 'details', 'sum', 'dc', 'ref_no', 'qty', 'processed_at']
+}
+CHUNK_SIZE = 4
+
+def rows(n):
+    # RefNo looks numeric in the first chunk and is text later, Qty gets blanks (int -> float) in a later chunk
+    lines = ['Account;Date;Details;Amount;DC;RefNo;Qty']
+    for i in range(n):
+        ref_no = str(100 + i) if i < CHUNK_SIZE else f"A{i:03d}"
+        qty = '' if i == n - 1 else str(i)
+        lines.append(f"EE{1 + i % 2};{1 + i % 28:02d}.01.2024;Pay {i};{i},5{i % 10};{'DK'[i % 2]};{ref_no};{qty}")
+    return lines
+
+def processor(tmp_path, lines):
+    path = tmp_path / 'swed_main_stm_01.csv'
+    path.write_text('\n'.join(lines) + '\n')
+    return FileProcessor(str(path), path.name, 'swed', 'main', 'stm', CONFIG)
+
+
+def test_chunks_match_whole_file(tmp_path):
+    whole = processor(tmp_path, rows(10)).process_file().drop(columns=['processed_at'])
+    streamed = processor(tmp_path, rows(10))
+    chunks = list(streamed.iter_chunks(CHUNK_SIZE))
+    assert len(chunks) == 3 and streamed.stream_completed
+    chunked = pd.concat(chunks, ignore_index=True).drop(columns=['processed_at'])
+    assert chunked['ref_no'].tolist()[:2] == ['100', '101'] and chunked['qty'].tolist()[:2] == [0.0, 1.0]
+    assert chunked['surrogate_key'].tolist() == whole['surrogate_key'].tolist()
+    pd.testing.assert_frame_equal(chunked, whole)
+
+def test_failed_chunk_leaves_stream_incomplete(tmp_path):
+    lines = rows(10)
+    lines.insert(CHUNK_SIZE + 2, 'EE1;32.01.2024;Pay;1,00;D;X;1') # invalid date in the second chunk
+    streamed = processor(tmp_path, lines)
+    chunks = list(streamed.iter_chunks(CHUNK_SIZE))
+    assert [len(chunk) for chunk in chunks] == [CHUNK_SIZE] # the first chunk stays yielded
+    assert not streamed.stream_completed
+
+def test_unreadable_file_is_not_streamed(tmp_path):
+    lines = rows(10)
+    lines.insert(CHUNK_SIZE + 2, 'EE1;"01.01.2024;Pay') # unterminated quote
+    streamed = processor(tmp_path, lines)
+    assert list(streamed.iter_chunks(CHUNK_SIZE)) == []
+    assert not streamed.stream_completed
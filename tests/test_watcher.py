@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+from utils import watcher
+from utils.watcher import DirectoryWatcher
+
+DEBOUNCE = 0.3
+POLL_INTERVAL = 0.05
+
+
+@pytest.fixture
+def polling_watcher(tmp_path):
+    (tmp_path / 'old.csv').write_text('a\n') # there before the watcher starts
+    def build(**kwargs):
+        return DirectoryWatcher(str(tmp_path), debounce=DEBOUNCE, poll_interval=POLL_INTERVAL, use_inotify=False, **kwargs)
+    return build
+
+def next_batch(batches, timeout=5.0):
+    # next(batches) in a daemon thread, so a watcher that never yields fails the test instead of hanging it
+    result = []
+    thread = threading.Thread(target=lambda: result.append(next(batches)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert result, f"no batch within {timeout}s"
+    return result[0]
+
+def write_later(path, delay, text='b\n'):
+    def write():
+        time.sleep(delay)
+        with open(path, 'a') as file:
+            file.write(text)
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_falls_back_to_polling(tmp_path, monkeypatch):
+    def unavailable(directory):
+        raise OSError("inotify is not available")
+    monkeypatch.setattr(watcher, 'InotifyWatch', unavailable)
+    assert DirectoryWatcher(str(tmp_path)).inotify is None
+
+def test_new_file_waits_for_debounce(tmp_path, polling_watcher):
+    batches = polling_watcher().batches()
+    (tmp_path / 'new.csv').write_text('a\n')
+    (tmp_path / 'notes.txt').write_text('a\n')
+    started = time.monotonic()
+    assert next_batch(batches) == [str(tmp_path / 'new.csv')]
+    assert time.monotonic() - started >= DEBOUNCE
+
+def test_file_still_written_is_held_back(tmp_path, polling_watcher):
+    path = tmp_path / 'new.csv'
+    batches = polling_watcher().batches()
+    path.write_text('a\n')
+    started = time.monotonic()
+    write_later(path, DEBOUNCE / 2)
+    assert next_batch(batches) == [str(path)]
+    assert time.monotonic() - started >= DEBOUNCE * 1.5 # debounce starts over with the write
+    assert path.read_text() == 'a\nb\n'
+
+def test_changed_file_is_handed_out_again(tmp_path, polling_watcher):
+    path = tmp_path / 'new.csv'
+    batches = polling_watcher().batches()
+    path.write_text('a\n')
+    assert next_batch(batches) == [str(path)]
+    write_later(path, 0)
+    assert next_batch(batches) == [str(path)]
+
+def test_requeued_file_is_retried_after_delay(tmp_path, polling_watcher):
+    directory_watcher = polling_watcher()
+    batches = directory_watcher.batches()
+    (tmp_path / 'new.csv').write_text('a\n')
+    assert next_batch(batches) == [str(tmp_path / 'new.csv')]
+
+    directory_watcher.requeue([str(tmp_path / 'new.csv'), str(tmp_path / 'deleted.csv')], delay=0.2)
+    started = time.monotonic()
+    assert next_batch(batches) == [str(tmp_path / 'new.csv')]
+    assert time.monotonic() - started >= DEBOUNCE + 0.2 - POLL_INTERVAL
+
+def test_file_deleted_before_settling_is_dropped(tmp_path, polling_watcher):
+    directory_watcher = polling_watcher()
+    batches = directory_watcher.batches()
+    gone = tmp_path / 'gone.csv'
+    gone.write_text('a\n')
+    directory_watcher._mark([str(gone)], time.monotonic())
+    gone.unlink()
+    (tmp_path / 'new.csv').write_text('a\n')
+    assert next_batch(batches) == [str(tmp_path / 'new.csv')]
+    assert directory_watcher.pending == {}
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Any, List
+from sqlalchemy import BindParameter, Numeric, bindparam
+
+
+class AggregateSpec:
+    """ Summary table kept up to date from newly inserted rows, declared in the DB config:
+          aggregates:
+            - table_name: stm_monthly
+              source: stm                 # mapping type the rows come from
+              group_by: [acc_number, ym]  # String or Integer fields
+              sums: [sum]                 # numeric fields, stored as <field>_total
+        Every row also counts into row_count. Group keys are stored as text, '' for a missing value,
+        so they can form the primary key the upsert adds the deltas on. Totals are exact: Decimal fields
+        are summed in units of their scale, never as floats. """
+
+    KEY_TYPES = ('String', 'Integer')
+    COUNT_COLUMN = 'row_count'
+
+    def __init__(self, aggregate_config: Dict[str, Any], source_fields: Dict[str, Any]):
+        self.table_name = aggregate_config['table_name']
+        self.source = aggregate_config['source']
+        self.group_by: List[str] = list(aggregate_config['group_by'])
+        self.sums: List[str] = list(aggregate_config.get('sums') or [])
+        self.source_fields = source_fields
+
+        for column in self.group_by:
+            if column not in source_fields or source_fields[column]['type'] not in self.KEY_TYPES:
+                raise ValueError(f"AggregateSpec: Group column '{column}' of {self.table_name} must be a String or Integer field of {self.source}")
+        for column in self.sums:
+            if column not in source_fields or source_fields[column]['type'] not in ('Decimal', 'Integer'):
+                raise ValueError(f"AggregateSpec: Sum column '{column}' of {self.table_name} must be a Decimal or Integer field of {self.source}")
+
+    @staticmethod
+    def total_column(column: str) -> str:
+        return f"{column}_total"
+
+    def scale(self, column: str) -> int:
+        # Digits after the decimal point of a sum column (and of its total)
+        field = self.source_fields[column]
+        return field.get('scale', 2) if field['type'] == 'Decimal' else 0
+
+    @property
+    def value_columns(self) -> List[str]:
+        return [self.total_column(column) for column in self.sums] + [self.COUNT_COLUMN]
+
+    @property
+    def columns(self) -> List[str]:
+        return self.group_by + self.value_columns
+
+    def deltas_sql(self, relation: str) -> str:
+        # Deltas of the rows in relation (e.g. the whole source table)
+        keys = ', '.join(f"coalesce(cast(\"{column}\" as varchar), '') as \"{column}\"" for column in self.group_by)
+        totals = ', '.join(f"coalesce(sum(\"{column}\"), 0) as \"{self.total_column(column)}\"" for column in self.sums)
+        values = f"{totals}, count(*) as {self.COUNT_COLUMN}" if totals else f"count(*) as {self.COUNT_COLUMN}"
+        return f"select {keys}, {values} from {relation} group by {', '.join(str(i + 1) for i in range(len(self.group_by)))}"
+
+    def units(self, values: pd.Series, column: str) -> np.ndarray:
+        """ Values of a sum column as int64 in units of its scale (cents for scale 2), missing values as 0.
+            Each value is rounded half away from zero to the scale, like the database stores it.
+            Parsed once per distinct value. """
+
+        codes, uniques = pd.factorize(values)
+        if self.source_fields[column]['type'] == 'Integer':
+            parsed = [int(value) for value in uniques]
+        else:
+            quantum = Decimal(1).scaleb(-self.scale(column))
+            parsed = [int(Decimal(str(value)).quantize(quantum, ROUND_HALF_UP).scaleb(self.scale(column))) for value in uniques]
+        return np.append(np.array(parsed, dtype='i8'), 0)[codes]
+
+    def deltas_from_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Same deltas as deltas_sql, computed from a frame of inserted rows (regular or compact layout)
+        keys = {}
+        for column in self.group_by:
+            values = df[column]
+            if self.source_fields[column]['type'] == 'Integer':
+                values = pd.to_numeric(values).astype('Int64') # 2024.0 -> '2024', like the cast in SQL
+            keys[column] = values.astype(object).where(values.notna(), '').astype(str)
+        grouped = pd.DataFrame(keys).assign(**{self.total_column(c): self.units(df[c], c) for c in self.sums}).assign(**{self.COUNT_COLUMN: 1})
+        deltas = grouped.groupby(self.group_by, as_index=False, sort=False).sum()
+        for column in self.sums:
+            if self.source_fields[column]['type'] == 'Decimal':
+                total = self.total_column(column)
+                deltas[total] = [Decimal(int(units)).scaleb(-self.scale(column)) for units in deltas[total]]
+        return deltas
+
+    def upsert_sql(self, schema: str) -> str:
+        # Adds one delta row per group; PostgreSQL and SQLite (3.24+) share this syntax
+        columns = ', '.join(f'"{column}"' for column in self.columns)
+        params = ', '.join(f':{column}' for column in self.columns)
+        updates = ', '.join(f'"{column}" = a."{column}" + excluded."{column}"' for column in self.value_columns)
+        keys = ', '.join(f'"{column}"' for column in self.group_by)
+        return f"insert into {schema}.{self.table_name} as a ({columns}) values ({params}) on conflict ({keys}) do update set {updates}"
+
+    def upsert_params(self) -> List[BindParameter]:
+        # Typed totals: drivers without a Decimal type (sqlite3) get them converted
+        return [bindparam(self.total_column(column), type_=Numeric(precision=18, scale=self.scale(column))) for column in self.sums]
+
+    def rebuild_sql(self, schema: str, source_table: str) -> List[str]:
+        columns = ', '.join(f'"{column}"' for column in self.columns)
+        return [
+            f"delete from {schema}.{self.table_name}"
+            , f"insert into {schema}.{self.table_name} ({columns}) {self.deltas_sql(f'{schema}.{source_table}')}"
+        ]
+
+
+def load_aggregate_specs(db_config: Dict[str, Any]) -> Dict[str, List[AggregateSpec]]:
+    # Aggregates of the DB config by source mapping type
+    specs: Dict[str, List[AggregateSpec]] = {}
+    for aggregate_config in db_config.get('aggregates') or []:
+        source_fields = db_config['tables'][aggregate_config['source']]['fields']
+        specs.setdefault(aggregate_config['source'], []).append(AggregateSpec(aggregate_config, source_fields))
+    return specs
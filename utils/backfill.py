@@ -0,0 +1,76 @@
+import os
+import logging
+import threading
+from typing import Dict, Any, List, Tuple
+from config import logger
+from utils.manifest import RunManifest
+from utils.staging import open_staging_cache
+from utils.data_manager import DataManager
+from utils.db_manager import DatabaseManager
+from utils.instrumentation import REPORT
+from config.settings import DATA_CONFIG_PATH, CSV_FILES_DIR, DATABASE_URL, DB_CONFIG_PATH, STAGING_DIR
+
+MB = 1024 * 1024
+
+_worker = threading.local() # per worker: its own DatabaseManager (engine, connections) and DataManager
+
+
+def plan_shards(csv_files_paths: List[str], data_config: Dict[str, Any], shard_bytes: float) -> List[List[str]]:
+    """ Cuts the files of every mapping_type/bank/acc_type, in name order, into runs of about shard_bytes
+        (shard_bytes=inf: one shard per group). Only files of the same group can share keys, so with whole
+        groups as shards no key is ever merged by two concurrent transactions.
+        Largest shards come first, so the pool does not end on one big shard. """
+
+    groups: Dict[Tuple[str, str, str], List[str]] = {}
+    for csv_file_path in sorted(csv_files_paths, key=os.path.basename):
+        file_config = RunManifest.file_config(csv_file_path, data_config)
+        if not file_config:
+            logging.warning(f"Backfill: No config for file {os.path.basename(csv_file_path)}, skipped")
+            continue
+        groups.setdefault(file_config[0], []).append(csv_file_path)
+
+    shards: List[List[str]] = []
+    for paths in groups.values():
+        shard, size = [], 0
+        for csv_file_path in paths:
+            if shard and size >= shard_bytes:
+                shards.append(shard)
+                shard, size = [], 0
+            shard.append(csv_file_path)
+            size += os.path.getsize(csv_file_path)
+        shards.append(shard)
+    return sorted(shards, key=lambda shard: sum(os.path.getsize(p) for p in shard), reverse=True)
+
+def init_worker(process: bool = True, compact: bool = False):
+    # Pool initializer. Aggregates are not maintained per shard, the backfill rebuilds them once at the end.
+    if process:
+        logger.setup_worker_logger()
+    _worker.db_manager = DatabaseManager(DATABASE_URL, DB_CONFIG_PATH)
+    _worker.db_manager.aggregates = {}
+    _worker.data_manager = DataManager(CSV_FILES_DIR, DATA_CONFIG_PATH, full_reprocess=True, compact=compact, csv_files_paths=[], staging=open_staging_cache(STAGING_DIR))
+
+def load_shard(shard: List[str], strategy: str) -> Tuple[bool, List[str], List[Dict[str, Any]]]:
+    """ Processes the files of a shard and merges them in one transaction per mapping type (streamed
+        files: per chunk). Merging is idempotent, a shard that failed halfway is simply loaded again.
+        Returns (success, loaded files, stage records). """
+
+    data_manager, db_manager = _worker.data_manager, _worker.db_manager
+    try:
+        with REPORT.stage('backfill shard', files=len(shard), bytes_read=sum(os.path.getsize(p) for p in shard)) as stage:
+            data_manager.reset(shard)
+            data_manager.prepare_files()
+            ready_data = dict(zip(('stm', 'sec'), data_manager.process_csv_files()))
+
+            success = True
+            for mapping_type, records in ready_data.items():
+                success = db_manager.merge_records(mapping_type, records, strategy=strategy) and success
+            for mapping_type, chunk in data_manager.iter_streaming_chunks():
+                success = db_manager.merge_records(mapping_type, chunk, strategy=strategy) and success
+            stage['rows'] = sum(len(records) for records in ready_data.values())
+
+        loaded = [p.csv_file_path for processors in data_manager.processed_files.values() for p in processors]
+        loaded += [p.csv_file_path for p in data_manager.streaming_processors if p.stream_completed]
+        return success, loaded, REPORT.pop_records()
+    except Exception as e:
+        logging.error(f"Backfill: Shard of {len(shard)} files failed: {e}", exc_info=True)
+        return False, [], REPORT.pop_records()
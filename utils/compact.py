@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from typing import List, Iterable, Optional
+
+# Compact representation of processed stm/sec frames:
+# - repeated strings (same value for a whole file, or few distinct values) become categoricals
+# - the 32-char hex surrogate_key becomes two uint64 columns holding the 16-byte md5 digest
+# - intermediate columns are dropped, unless the config's desired_fields keep them
+# expand_frame() turns a compact frame back into the regular layout right before upload.
+
+CATEGORICAL_COLUMNS = ['bank_name', 'acc_type', 'file_name', 'acc_name', 'ym', 'effect_ym']
+TEMP_COLUMNS = ['concat_key', 'sum_tmp']
+KEY_COLUMN = 'surrogate_key'
+KEY_HI, KEY_LO = 'surrogate_key_hi', 'surrogate_key_lo'
+
+
+def is_compact(df: pd.DataFrame) -> bool:
+    return KEY_HI in df.columns
+
+def compact_frame(df: pd.DataFrame, desired_fields: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    if df.empty or is_compact(df):
+        return df
+
+    kept = set(desired_fields or [])
+    df = df.drop(columns=[c for c in TEMP_COLUMNS if c in df.columns and c not in kept])
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    # Digest split into two big-endian halves, so expanding gives back the exact hex string
+    halves = np.frombuffer(bytes.fromhex(''.join(df[KEY_COLUMN].tolist())), dtype='>u8').reshape(-1, 2)
+    position = df.columns.get_loc(KEY_COLUMN)
+    df = df.drop(columns=[KEY_COLUMN])
+    df.insert(position, KEY_LO, halves[:, 1].astype(np.uint64))
+    df.insert(position, KEY_HI, halves[:, 0].astype(np.uint64))
+    return df
+
+def expand_frame(df: pd.DataFrame) -> pd.DataFrame:
+    if not is_compact(df):
+        return df
+
+    position = df.columns.get_loc(KEY_HI)
+    keys = surrogate_keys(df)
+    df = df.drop(columns=[KEY_HI, KEY_LO])
+    df.insert(position, KEY_COLUMN, keys)
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df
+
+def expanded_columns(columns: Iterable[str]) -> List[str]:
+    columns = list(columns)
+    if KEY_HI not in columns:
+        return columns
+    return [KEY_COLUMN if c == KEY_HI else c for c in columns if c != KEY_LO]
+
+def key_digests(df: pd.DataFrame) -> np.ndarray:
+    # 16-byte binary surrogate keys ('S16') of either representation
+    if is_compact(df):
+        return np.column_stack([df[KEY_HI].to_numpy(), df[KEY_LO].to_numpy()]).astype('>u8').view('S16').ravel()
+    return np.frombuffer(bytes.fromhex(''.join(df[KEY_COLUMN].tolist())), dtype='S16')
+
+def surrogate_keys(df: pd.DataFrame) -> pd.Series:
+    # Hex surrogate keys of either representation
+    if not is_compact(df):
+        return df[KEY_COLUMN]
+    raw = key_digests(df).tobytes().hex()
+    return pd.Series([raw[i:i + 32] for i in range(0, len(raw), 32)], index=df.index, dtype=object, name=KEY_COLUMN)
+
+def bytes_per_row(df: pd.DataFrame) -> float:
+    if df.empty:
+        return 0.0
+    return df.memory_usage(deep=True, index=True).sum() / len(df)
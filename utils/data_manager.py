@@ -2,22 +2,72 @@ import os
 import re
 import pytz
 import logging
-import hashlib
+import multiprocessing
 import pandas as pd
 from datetime import datetime
-from typing import Dict, Tuple, Optional, Any
-from config.settings import config_loader, csv_files_loader
+from config import logger
+from typing import Dict, Tuple, Optional, Any, List, Iterator
+from utils.read_plan import ReadPlan
+from utils.manifest import RunManifest
+from utils.staging import StagingCache
+from utils.key_hasher import SurrogateKeyHasher, key_hash_pool
+from utils.key_index import SurrogateKeyIndex
+from utils.compact import compact_frame, key_digests, surrogate_keys, bytes_per_row
+from utils.frame_accumulator import FrameAccumulator
+from utils.derived_columns import date_parser, year_month
+from utils.instrumentation import REPORT
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from config.settings import config_loader, csv_files_loader, KEY_HASH_WORKERS, KEY_HASH_BATCH_SIZE, CSV_ENGINE
 
 class FileProcessor:
-    def __init__(self, csv_file_path:str, csv_file_name:str, bank:str, acc_type:str, mapping_type:str, file_specific_config:Dict[str, Any]):
+    def __init__(self, csv_file_path:str, csv_file_name:str, bank:str, acc_type:str, mapping_type:str, file_specific_config:Dict[str, Any], read_plan:Optional[ReadPlan] = None, compact:bool = False, staging:Optional[StagingCache] = None, key_hash_pool:Optional[Executor] = None):
         self.csv_file_path = csv_file_path
         self.csv_file_name = csv_file_name
         self.bank = bank
         self.acc_type = acc_type
         self.mapping_type = mapping_type
         self.file_specific_config = file_specific_config
+        self.read_plan = read_plan or ReadPlan(file_specific_config, CSV_ENGINE)
+        self.stream_completed = False # set by iter_chunks once every chunk was yielded
+        self.compact = compact # return frames in the compact layout, see utils/compact.py
+        self.staging = staging # transformed frames are staged as Parquet and reused, see utils/staging.py
+        self.key_hash_pool = key_hash_pool # the run's surrogate key hashing pool, None hashes in-process
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sent to a process worker: the pool stays with the parent, the worker hashes in-process
+        return {**self.__dict__, 'key_hash_pool': None}
 
     def process_file(self) -> pd.DataFrame:
+        if self.staging is None:
+            df = self._process_csv()
+        else:
+            df = self._process_staged()
+        return compact_frame(df, self.file_specific_config['desired_fields']) if self.compact and not df.empty else df
+
+    def _process_staged(self) -> pd.DataFrame:
+        # Same content and config staged before: read it back instead of parsing and transforming
+        staged_path = self.staging.path(self.csv_file_path, self.mapping_type, self.bank, self.acc_type, self.file_specific_config, self.read_plan)
+        with REPORT.stage('read_staged', file=self.csv_file_name, table=self.mapping_type) as stage:
+            df = self.staging.load(staged_path)
+            if df is None:
+                stage['discard'] = True
+            else:
+                stage['rows'] = len(df)
+                stage['bytes_read'] = os.path.getsize(staged_path)
+        if df is not None:
+            logging.info(f"DataManager: Reusing staged file: {os.path.basename(staged_path)}")
+            # Staged under another name or in an earlier run: these describe this load
+            refreshed = {'file_name': self.csv_file_name, 'processed_at': datetime.now(pytz.utc)}
+            return df.assign(**{column: value for column, value in refreshed.items() if column in df.columns})
+
+        df = self._process_csv()
+        if not df.empty:
+            with REPORT.stage('write_staged', file=self.csv_file_name, table=self.mapping_type, rows=len(df)) as stage:
+                self.staging.save(staged_path, df)
+                stage['bytes_written'] = os.path.getsize(staged_path) if os.path.exists(staged_path) else 0
+        return df
+
+    def _process_csv(self) -> pd.DataFrame:
         # Read CSV file
         df = self._read_csv()
         if df.empty:
@@ -31,13 +81,60 @@ class FileProcessor:
         # Transform data and return result
         return self._transform_data(df)
 
+    def iter_chunks(self, chunk_size: int) -> Iterator[pd.DataFrame]:
+        # Streaming variant of process_file: only one chunk of the file is held in memory at a time.
+        # Chunks already yielded stay yielded if a later chunk fails (they are deduped on the next run).
+        dtypes = self._infer_chunked_dtypes(chunk_size)
+        if not dtypes:
+            return
+
+        try:
+            reader = pd.read_csv(self.csv_file_path, **self.read_plan.read_csv_kwargs(chunksize=chunk_size, dtypes=dtypes))
+            with reader:
+                for chunk in REPORT.timed_iter('read_csv', reader, file=self.csv_file_name, table=self.mapping_type):
+                    chunk = self._select_and_rename_columns(self.read_plan.restore_key_types(chunk, dtypes))
+                    if chunk.empty:
+                        return
+
+                    chunk = self._transform_data(chunk)
+                    if chunk.empty:
+                        return
+
+                    yield compact_frame(chunk, self.file_specific_config['desired_fields']) if self.compact else chunk
+            self.stream_completed = True
+        except Exception as e:
+            logging.error(f"Error streaming CSV file: {self.csv_file_path}. Error: {e}")
+
+    def _infer_chunked_dtypes(self, chunk_size: int) -> Optional[Dict[str, Any]]:
+        # Types are inferred per chunk, so a column could be int64 in one chunk and float64 in another.
+        # That would change its str() form and with it the surrogate key, so a first (bounded memory)
+        # pass finds the dtype a whole-file read would have given every selected column.
+        try:
+            dtypes: Dict[str, Any] = {}
+            reader = pd.read_csv(self.csv_file_path, **self.read_plan.read_csv_kwargs(chunksize=chunk_size))
+            with reader:
+                for chunk in reader:
+                    for column, dtype in self.read_plan.restore_key_types(chunk).dtypes.items():
+                        dtypes[column] = self._common_dtype(dtypes[column], dtype) if column in dtypes else dtype
+            return dtypes
+        except Exception as e:
+            logging.error(f"Error inferring column types of CSV file: {self.csv_file_path}. Error: {e}")
+            return None
+
+    @staticmethod
+    def _common_dtype(left: Any, right: Any) -> Any:
+        if left == right:
+            return left
+        if all(pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in (left, right)):
+            return 'float64' # int + float (e.g. some chunks have blanks)
+        return 'object'
+
     def _read_csv(self) -> pd.DataFrame:
         try:
-            df = pd.read_csv(
-                self.csv_file_path
-                , sep=self.file_specific_config['csv_separator']
-                , encoding='utf-8'
-            )
+            # Only configured columns are parsed, with dtypes/decimal/engine from the read plan
+            with REPORT.stage('read_csv', file=self.csv_file_name, table=self.mapping_type, bytes_read=os.path.getsize(self.csv_file_path)) as stage:
+                df = self.read_plan.read_csv(self.csv_file_path)
+                stage['rows'] = len(df)
             return df
         except Exception as e:
             logging.error(f"Error reading CSV file: {self.csv_file_path}. Error: {e}")
@@ -56,31 +153,46 @@ class FileProcessor:
             logging.error(f"Error selecting and renaming fields in file: {self.csv_file_path}. Error: {e}")
             return pd.DataFrame()
 
+    @staticmethod
+    def _to_numeric(values: pd.Series) -> pd.Series:
+        # Already numeric when the read plan parsed the decimal separator
+        if pd.api.types.is_numeric_dtype(values):
+            return values
+        return pd.to_numeric(values.astype(str).str.replace(',', '.', regex=False), errors='coerce')
+
     def _transform_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        with REPORT.stage('transform', file=self.csv_file_name, table=self.mapping_type, rows=len(df)):
+            return self._transform(df)
+
+    def _transform(self, df: pd.DataFrame) -> pd.DataFrame:
         try:
             # Add surrogate key
-            df['concat_key'] = df[self.file_specific_config['surrogate_key_columns']].astype(str).agg('#'.join, axis=1)
-            df['surrogate_key'] = df['concat_key'].apply(lambda x: hashlib.md5(x.encode()).hexdigest())
+            hasher = SurrogateKeyHasher(self.file_specific_config['surrogate_key_columns'], batch_size=KEY_HASH_BATCH_SIZE, executor=self.key_hash_pool)
+            df = hasher.add_keys(df)
+            if 'concat_key' not in self.file_specific_config['desired_fields']:
+                del df['concat_key'] # only needed for hashing, free it right away
 
             # Add common fields for any file
             df = df.assign(bank_name=self.bank, acc_type=self.acc_type, file_name=self.csv_file_name, processed_at=datetime.now(pytz.utc))
 
-            # Do file specific transformations
+            # Do file specific transformations.
+            # Distinct dates are parsed once per run, 'YYYY-MM' is formatted once per distinct month
+            dates = date_parser(self.file_specific_config['date_format'])
             if self.mapping_type == 'stm':
                 df = df.assign(
                     acc_name=lambda x: x['acc_number'].map(self.file_specific_config['accounts'])
-                    , dt=lambda x: pd.to_datetime(x['dt'], format=self.file_specific_config['date_format'])
+                    , dt=lambda x: dates.parse(x['dt'])
                     , year=lambda x: x['dt'].dt.year
-                    , ym=lambda x: x['dt'].dt.strftime('%Y-%m')
-                    , sum_tmp=lambda x: pd.to_numeric(x['sum'].astype(str).str.replace(',', '.', regex=False),errors='coerce')
-                    , sum=lambda x: x['sum_tmp'] * x['dc'].map(self.file_specific_config['debit_multiplier'])
+                    , ym=lambda x: year_month(x['dt'])
+                    , sum_tmp=lambda x: self._to_numeric(x['sum'])
+                    , sum=lambda x: x['sum_tmp'] * x['dc'].map(self.file_specific_config['debit_multiplier']).astype(float) # categorical 'dc' maps to categorical
                 )
             elif self.mapping_type == 'sec':
                 df = df.assign(
-                    send_dt=lambda x: pd.to_datetime(x['send_dt'], format=self.file_specific_config['date_format'])
-                    , effect_dt=lambda x: pd.to_datetime(x['effect_dt'], format=self.file_specific_config['date_format'])
+                    send_dt=lambda x: dates.parse(x['send_dt'])
+                    , effect_dt=lambda x: dates.parse(x['effect_dt'])
                     , effect_year=lambda x: x['effect_dt'].dt.year
-                    , effect_ym=lambda x: x['effect_dt'].dt.strftime('%Y-%m')
+                    , effect_ym=lambda x: year_month(x['effect_dt'])
                 )
             else:
                 logging.error(f"Unsupported mapping type: {self.mapping_type}")
@@ -94,15 +206,57 @@ class FileProcessor:
             logging.error(f"Error transforming data in file: {self.csv_file_path}. Error: {e}")
             return pd.DataFrame()
 
+def _process_file_task(processor: FileProcessor) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    # Worker entry point: one failing file must never take down the rest of the run.
+    # Returns the frame with the file's stage records (a process worker has its own REPORT).
+    try:
+        logging.info(f"DataManager: Processing file: {processor.csv_file_name}")
+        df = processor.process_file()
+    except Exception as e:
+        logging.error(f"DataManager: Unexpected error processing file: {processor.csv_file_path}. Error: {e}", exc_info=True)
+        df = pd.DataFrame()
+    return df, REPORT.pop_file_records(processor.csv_file_name)
+
 class DataManager:
-    def __init__(self, csv_files_dir:str, data_config_path:str):
+    EXECUTORS = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}
+
+    def __init__(self, csv_files_dir:str, data_config_path:str, workers:int = 1, executor:str = 'process', manifest:Optional[RunManifest] = None, full_reprocess:bool = False, compact:bool = False, csv_files_paths:Optional[List[str]] = None, staging:Optional[StagingCache] = None):
         logging.info("Starting to initialize DataManager...")
+        if executor not in self.EXECUTORS:
+            raise ValueError(f"DataManager: Unsupported executor '{executor}'. Expected one of: {list(self.EXECUTORS)}")
         self.data_config = config_loader(data_config_path)
-        self.csv_files_paths = csv_files_loader(csv_files_dir)
-        self.ready_data: Dict[str, pd.DataFrame] = {'stm': pd.DataFrame(), 'sec': pd.DataFrame()}
+        self.workers = max(1, workers)
+        self.executor = executor
+        self.read_plans: Dict[Tuple[str, str], ReadPlan] = {} # compiled once per mapping_type/bank
+        self.manifest = manifest # unchanged files in manifest are skipped (unless full_reprocess)
+        self.full_reprocess = full_reprocess
+        self.compact = compact
+        self.staging = staging # streamed files are never staged, they are too big to hold as one frame
+        self.key_hash_pool = key_hash_pool(KEY_HASH_WORKERS) # shared by all files of the run, see close()
+        # csv_files_paths given: only these files (may be empty, e.g. a watched directory), else all CSVs in the dir
+        self.reset(csv_files_paths if csv_files_paths is not None else csv_files_loader(csv_files_dir))
         logging.info("DataManager initialized!")
 
-    def process_csv_files(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    def close(self):
+        # Stops the key hashing processes, call once the run (or watch mode) is over
+        if self.key_hash_pool is not None:
+            self.key_hash_pool.shutdown()
+            self.key_hash_pool = None
+
+    def reset(self, csv_files_paths: List[str]):
+        # Starts a new batch of files. Config, read plans and manifest are kept, so a long-running
+        # process (watch mode) does not reload them for every batch.
+        self.csv_files_paths = csv_files_paths
+        self.processed_files: Dict[str, List[FileProcessor]] = {'stm': [], 'sec': []} # candidates for the manifest
+        self.skipped_files: List[str] = []
+        self.ready_data: Dict[str, pd.DataFrame] = {'stm': pd.DataFrame(), 'sec': pd.DataFrame()}
+        self.streaming_processors: List[FileProcessor] = [] # files with 'chunk_size' in config, see iter_streaming_chunks
+        self.pending_processors: Optional[List[FileProcessor]] = None # set by prepare_files
+
+    def prepare_files(self) -> int:
+        # Matches files to configs and drops unchanged ones without parsing anything.
+        # Returns the number of files left to process (regular + streamed).
+
         # Get mandatory configs for CSV files transformations.
         # If they are missing, raise an error. Nothing to transform without configs.
         csv_file_pattern = self.data_config.get('file_pattern') # files must have specific naming conventions
@@ -110,11 +264,81 @@ class DataManager:
         if not csv_file_pattern or not csv_mapping_config:
             raise ValueError("DataManager: Missing mandatory configuration parameters!")
 
-        # Process each CSV file
+        # Prepare a processor for each CSV file we have a config for
+        processors = self._prepare_processors(csv_file_pattern, csv_mapping_config)
+
+        # Files configured with a chunk_size are not loaded here, they are streamed later
+        self.streaming_processors = [p for p in processors if p.file_specific_config.get('chunk_size')]
+        self.pending_processors = [p for p in processors if not p.file_specific_config.get('chunk_size')]
+        if self.streaming_processors:
+            logging.info(f"DataManager: {len(self.streaming_processors)} files will be streamed in chunks")
+
+        logging.info(f"DataManager: Run summary: {len(processors)} files to process, {len(self.skipped_files)} unchanged files skipped")
+        return len(processors)
+
+    def process_csv_files(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        if self.pending_processors is None:
+            self.prepare_files()
+        processors = self.pending_processors
+
+        # Process files (sequentially or in a worker pool). Results come back in file order.
+        accumulator = FrameAccumulator(self.ready_data.keys())
+        for processor, processed_df in zip(processors, self._run_processors(processors)):
+            # Only append non-empty results
+            if not processed_df.empty:
+                mapping_type = processor.mapping_type
+                total = accumulator.add(mapping_type, processed_df)
+                self.processed_files[mapping_type].append(processor)
+                logging.info(f"DataManager: Added to ready '{mapping_type}' dataframe: {len(processed_df)} records. Total: {total} records.")
+
+        # Build each ready dataframe once
+        for mapping_type in self.ready_data:
+            self.ready_data[mapping_type] = accumulator.materialize(mapping_type)
+            logging.info(f"DataManager: Ready '{mapping_type}' dataframe: {len(self.ready_data[mapping_type])} records, {bytes_per_row(self.ready_data[mapping_type]):.0f} bytes per row")
+
+        return self.ready_data['stm'], self.ready_data['sec']
+
+    def iter_streaming_chunks(self, mapping_type: Optional[str] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        # Yields (mapping_type, transformed chunk) for every file configured with a chunk_size
+        # (only files of mapping_type, if given)
+        for processor in self.streaming_processors:
+            if mapping_type and processor.mapping_type != mapping_type:
+                continue
+            chunk_size = int(processor.file_specific_config['chunk_size'])
+            logging.info(f"DataManager: Streaming file: {processor.csv_file_name} in chunks of {chunk_size} rows")
+            for chunk in processor.iter_chunks(chunk_size):
+                yield processor.mapping_type, chunk
+
+    def record_uploaded_files(self, mapping_type: str):
+        # Call only after the mapping type's records were uploaded, so a failed upload is retried next run
+        if self.manifest is None:
+            return
+
+        completed_streams = [p for p in self.streaming_processors if p.mapping_type == mapping_type and p.stream_completed]
+        for processor in self.processed_files[mapping_type] + completed_streams:
+            self.manifest.record(processor.csv_file_path, self._config_version(processor.mapping_type, processor.bank))
+        self.manifest.save()
+
+    def _config_version(self, mapping_type: str, bank: str) -> str:
+        return RunManifest.config_version(self.data_config['mapping'][mapping_type][bank])
+
+    def iter_new_streaming_records(self, existing_keys: Dict[str, pd.DataFrame], mapping_type: Optional[str] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        # Dedups each streamed chunk on its own. Keys of yielded records are added to existing_keys,
+        # so a later chunk (or file) cannot yield the same record again.
+        for mapping_type, chunk in self.iter_streaming_chunks(mapping_type):
+            new_records = self.get_new_records(chunk, existing_keys[mapping_type], df_name=f"{mapping_type} chunk")
+            if new_records.empty:
+                continue
+
+            existing_keys[mapping_type] = self.extend_keys(existing_keys[mapping_type], new_records)
+            yield mapping_type, new_records
+
+    def _prepare_processors(self, csv_file_pattern: str, csv_mapping_config: Dict[str, Any]) -> List[FileProcessor]:
+        processors = []
         for csv_file_path in self.csv_files_paths:
             # Get filename
             csv_file_name = os.path.basename(csv_file_path)
-            logging.info(f"DataManager: Processing file: {csv_file_name}")
+            logging.info(f"DataManager: Preparing file: {csv_file_name}")
 
             # Get file metadata parts.
             # If None - continue to the next file (unlucky with this one)
@@ -129,16 +353,50 @@ class DataManager:
             if not file_specific_config:
                 continue
 
+            # Skip files that were already uploaded with the same content and config
+            if self.manifest is not None and not self.full_reprocess:
+                if self.manifest.is_unchanged(csv_file_path, self._config_version(mapping_type, bank)):
+                    logging.info(f"DataManager: Skipping unchanged file: {csv_file_name}")
+                    self.skipped_files.append(csv_file_path)
+                    continue
+
+            # Compile read plan once per mapping_type/bank
+            if (mapping_type, bank) not in self.read_plans:
+                self.read_plans[(mapping_type, bank)] = ReadPlan(file_specific_config, CSV_ENGINE)
+
             # Setup a file processor based on file metadata groups and file_specific_config
-            processor = FileProcessor(csv_file_path, csv_file_name, bank, acc_type, mapping_type, file_specific_config)
-            processed_df = processor.process_file()
+            processors.append(FileProcessor(csv_file_path, csv_file_name, bank, acc_type, mapping_type, file_specific_config, self.read_plans[(mapping_type, bank)], self.compact, self.staging, self.key_hash_pool))
 
-            # Only append non-empty results
-            if not processed_df.empty:
-                self.ready_data[mapping_type] = pd.concat([self.ready_data[mapping_type], processed_df])
-                logging.info(f"DataManager: Added to ready '{mapping_type}' dataframe: {len(processed_df)} records. Total: {len(self.ready_data[mapping_type])} records.")
+        return processors
 
-        return self.ready_data['stm'], self.ready_data['sec']
+    def _run_processors(self, processors: List[FileProcessor]) -> Iterator[pd.DataFrame]:
+        # Sequential mode: same as a plain loop, nothing to set up
+        if self.workers == 1 or len(processors) < 2:
+            for processor in processors:
+                yield self._collect_task_result(_process_file_task(processor))
+            return
+
+        # Pool mode: every process worker gets its own log file (threads share the main log)
+        workers = min(self.workers, len(processors))
+        logging.info(f"DataManager: Processing {len(processors)} files with {workers} {self.executor} workers...")
+        # Processes are spawned, not forked: forking while other threads (e.g. the pipeline's
+        # database prefetch) hold locks can leave a worker deadlocked
+        pool_kwargs = {'initializer': logger.setup_worker_logger, 'mp_context': multiprocessing.get_context('spawn')} if self.executor == 'process' else {}
+        with self.EXECUTORS[self.executor](max_workers=workers, **pool_kwargs) as pool:
+            futures = [pool.submit(_process_file_task, processor) for processor in processors]
+            for processor, future in zip(processors, futures):
+                try:
+                    yield self._collect_task_result(future.result())
+                except Exception as e:
+                    # Worker died (e.g. BrokenProcessPool) - lose this file, not the run
+                    logging.error(f"DataManager: Worker failed on file: {processor.csv_file_path}. Error: {e}")
+                    yield pd.DataFrame()
+
+    @staticmethod
+    def _collect_task_result(result: Tuple[pd.DataFrame, List[Dict[str, Any]]]) -> pd.DataFrame:
+        df, stage_records = result
+        REPORT.add(stage_records)
+        return df
 
     def _extract_file_metadata_groups(self, csv_file_pattern: str, csv_file_name: str) -> Optional[Tuple[str, str, str]]:
         # Match file name against pattern
@@ -170,7 +428,49 @@ class DataManager:
         return file_specific_config
 
     @staticmethod
-    def get_new_records(source_df: pd.DataFrame, existing_keys_df: pd.DataFrame, df_name:str = 'unknown') -> pd.DataFrame:
+    def extend_keys(existing_keys_df: pd.DataFrame, new_records: pd.DataFrame) -> pd.DataFrame:
+        # Only the key column is copied, so this stays cheap even for a long key history
+        if new_records.empty:
+            return existing_keys_df
+        return pd.concat([existing_keys_df, surrogate_keys(new_records).to_frame()], ignore_index=True)
+
+    @staticmethod
+    def _table_of(df_name: str) -> str:
+        # 'stm_df' / 'stm chunk' -> 'stm', so report records group by mapping type
+        return df_name.split(' ')[0].removesuffix('_df')
+
+    @classmethod
+    def get_new_records_from_index(cls, source_df: pd.DataFrame, key_index: SurrogateKeyIndex, df_name:str = 'unknown') -> pd.DataFrame:
+        with REPORT.stage('get_new_records', table=cls._table_of(df_name), rows=len(source_df), dedup='index') as stage:
+            new_records = cls._new_records_from_index(source_df, key_index, df_name)
+            stage['new_rows'] = len(new_records)
+            return new_records
+
+    @staticmethod
+    def _new_records_from_index(source_df: pd.DataFrame, key_index: SurrogateKeyIndex, df_name:str) -> pd.DataFrame:
+        # Same result as get_new_records, but a vectorized lookup in the local key index
+        # replaces the download of all existing keys and the string hash-join
+        try:
+            if source_df.empty:
+                logging.warning(f"DataManager: Received empty source_df for {df_name}. Returning empty DataFrame")
+                return pd.DataFrame()
+
+            new_records = source_df[~key_index.contains(key_digests(source_df))]
+            logging.info(f"DataManager: Found {len(new_records)} new records out of {len(source_df)} total (key index)")
+            return new_records
+        except Exception as e:
+            logging.error(f"DataManager: Error getting new records for {df_name}: {str(e)}. Returning empty DataFrame")
+            return pd.DataFrame()
+
+    @classmethod
+    def get_new_records(cls, source_df: pd.DataFrame, existing_keys_df: pd.DataFrame, df_name:str = 'unknown') -> pd.DataFrame:
+        with REPORT.stage('get_new_records', table=cls._table_of(df_name), rows=len(source_df), dedup='client') as stage:
+            new_records = cls._new_records(source_df, existing_keys_df, df_name)
+            stage['new_rows'] = len(new_records)
+            return new_records
+
+    @staticmethod
+    def _new_records(source_df: pd.DataFrame, existing_keys_df: pd.DataFrame, df_name:str) -> pd.DataFrame:
         try:
             if source_df.empty:
                 logging.warning(f"DataManager: Received empty source_df for {df_name}. Returning empty DataFrame")
@@ -182,17 +482,8 @@ class DataManager:
                 return source_df
 
             # Get new records
-            new_records = (
-                pd.merge(
-                    source_df
-                    , existing_keys_df
-                    , on='surrogate_key'
-                    , how='left'
-                    , indicator=True
-                )
-                .query("_merge=='left_only'")
-                .drop(columns=['_merge'])
-            )
+            # Get new records (keys taken from either the regular or the compact frame layout)
+            new_records = source_df[~surrogate_keys(source_df).isin(existing_keys_df['surrogate_key'])]
 
             logging.info(f"DataManager: Found {len(new_records)} new records out of {len(source_df)} total")
             return new_records
@@ -1,21 +1,34 @@
+import io
 import logging
 import pandas as pd
-from typing import Tuple
-from sqlalchemy import create_engine
+from typing import Tuple, List, Optional, Dict, Callable
+from sqlalchemy import create_engine, text
 from contextlib import contextmanager
 from sqlalchemy.orm import sessionmaker
-from config.settings import config_loader
+from utils.compact import expand_frame, expanded_columns
+from utils.instrumentation import REPORT
+from utils.aggregates import AggregateSpec, load_aggregate_specs
+from config.settings import config_loader, BULK_LOADER, COPY_BATCH_SIZE, MAINTAIN_AGGREGATES
 from sqlalchemy.exc import SQLAlchemyError
 
 
 class DatabaseManager:
-    def __init__(self, connection_string: str, db_config_path: str):
+    DEDUP_STRATEGIES = ('anti_join', 'on_conflict')
+    COPY_NULL = '\\N' # NULL marker for COPY, so empty strings stay empty strings
+    TEMP_SCHEMAS = {'postgresql': 'pg_temp', 'sqlite': 'temp'} # schema of the session's temporary tables
+
+    def __init__(self, connection_string: str, db_config_path: str, pool_pre_ping: bool = False):
         logging.info("Starting to initialize DatabaseManager...")
         self.config = config_loader(db_config_path)
         self.schema_name = self.config['schema']
         self.stm_table_name = self.config['tables']['stm']['table_name']
         self.sec_table_name = self.config['tables']['sec']['table_name']
-        self.engine = create_engine(connection_string)
+        self.table_names = {'stm': self.stm_table_name, 'sec': self.sec_table_name}
+        self.mapping_types = {table_name: mapping_type for mapping_type, table_name in self.table_names.items()}
+        self.table_fields = {table['table_name']: table['fields'] for table in self.config['tables'].values()}
+        # Summary tables updated from inserted rows in the same transaction (see utils/aggregates.py)
+        self.aggregates: Dict[str, List[AggregateSpec]] = load_aggregate_specs(self.config) if MAINTAIN_AGGREGATES else {}
+        self.engine = create_engine(connection_string, pool_pre_ping=pool_pre_ping) # pre ping: long-running processes
         self.Session = sessionmaker(bind=self.engine)
         if not self.test_connection():
             raise ConnectionError("Database connection failed")
@@ -50,27 +63,126 @@ class DatabaseManager:
             logging.error(f"DatabaseManager: Connection test failed: {e}")
             return False
 
+    def has_unique_key(self, mapping_type: str) -> bool:
+        # True if the config gives surrogate_key a unique/primary key of its own ('on_conflict' needs one)
+        table_config = self.config['tables'][mapping_type]
+        fields = table_config['fields']
+        key = ['surrogate_key']
+        if [name for name, field in fields.items() if field.get('primary_key')] == key or fields.get('surrogate_key', {}).get('unique'):
+            return True
+        unique_keys = [index['columns'] for index in table_config.get('indexes') or [] if index.get('unique')]
+        unique_keys += [constraint['columns'] for constraint in table_config.get('unique_constraints') or []]
+        return any(list(columns) == key for columns in unique_keys)
+
     def get_existing_surrogate_keys(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
         logging.info("DatabaseManager: Extracting existing surrogate keys from both tables...")
 
-        stm_keys_query = f'select surrogate_key from {self.schema_name}.{self.stm_table_name};'
-        sec_keys_query = f'select surrogate_key from {self.schema_name}.{self.sec_table_name};'
-
-        stm_existing_keys = self._select_data(stm_keys_query)
-        sec_existing_keys = self._select_data(sec_keys_query)
+        stm_existing_keys = self.get_existing_keys('stm')
+        sec_existing_keys = self.get_existing_keys('sec')
 
         return stm_existing_keys, sec_existing_keys
 
-    def upload_new_records(self, stm_new: pd.DataFrame, sec_new: pd.DataFrame):
-        if not stm_new.empty:
-            self._insert_data(stm_new, self.stm_table_name, self.schema_name)
-        else:
-            logging.info("DatabaseManager: No new records to upload for stm")
+    def get_existing_keys(self, mapping_type: str) -> pd.DataFrame:
+        keys_query = f'select surrogate_key from {self.schema_name}.{self.table_names[mapping_type]};'
+        with REPORT.stage('get_existing_keys', table=mapping_type) as stage:
+            keys_df = self._select_data(keys_query)
+            stage['rows'] = len(keys_df)
+            stage['bytes_read'] = int(keys_df.memory_usage(deep=True, index=False).sum()) # as held in memory
+        return keys_df
+
+    def count_records(self, mapping_type: str) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(text(f'select count(*) from {self.schema_name}.{self.table_names[mapping_type]};')).scalar()
+
+    def count_distinct_keys(self, mapping_type: str) -> int:
+        # What a key index holds: every surrogate_key once, even if the table has duplicates
+        with self.engine.connect() as connection:
+            return connection.execute(text(f'select count(distinct surrogate_key) from {self.schema_name}.{self.table_names[mapping_type]};')).scalar()
+
+    def upload_new_records(self, stm_new: pd.DataFrame, sec_new: pd.DataFrame) -> Tuple[bool, bool]:
+        return self.upload_records('stm', stm_new), self.upload_records('sec', sec_new)
 
-        if not sec_new.empty:
-            self._insert_data(sec_new, self.sec_table_name, self.schema_name)
+    def upload_records(self, mapping_type: str, new_records: pd.DataFrame) -> bool:
+        # Returns False only if the upload failed (nothing to upload counts as success)
+        if not new_records.empty:
+            return self._insert_data(new_records, self.table_names[mapping_type], self.schema_name)
+        logging.info(f"DatabaseManager: No new records to upload for {mapping_type}")
+        return True
+
+    def merge_records(self, mapping_type: str, records: pd.DataFrame, strategy: str = 'anti_join') -> bool:
+        """ Server-side dedup: stages records in a temporary table and inserts only the ones
+            whose surrogate_key is not in the target table yet, all in one transaction.
+            'anti_join' works on any database, 'on_conflict' needs a unique/primary key on surrogate_key. """
+
+        if records.empty:
+            logging.info(f"DatabaseManager: No records to merge for {mapping_type}")
+            return True
+        if strategy not in self.DEDUP_STRATEGIES:
+            raise ValueError(f"DatabaseManager: Unsupported dedup strategy '{strategy}'. Expected one of: {self.DEDUP_STRATEGIES}")
+
+        table_name = self.table_names[mapping_type]
+        target = f"{self.schema_name}.{table_name}"
+        # Qualified with the session's temp schema: unqualified, the drop below could hit a real table
+        temp_schema = self.TEMP_SCHEMAS.get(self.engine.dialect.name)
+        staging_name = f"staging_{table_name}"
+        staging = f"{temp_schema}.{staging_name}" if temp_schema else staging_name
+        columns = ', '.join(f'"{column}"' for column in expanded_columns(records.columns))
+        specs = self.aggregates.get(mapping_type, [])
+
+        # 'where true' keeps SQLite from reading 'on conflict' as part of the select
+        insert_query = f"insert into {target} ({columns}) select {columns} from {staging} s where true"
+        if strategy == 'anti_join':
+            insert_query += f" and not exists (select 1 from {target} t where t.surrogate_key = s.surrogate_key)"
         else:
-            logging.info("DatabaseManager: No new records to upload for sec")
+            insert_query += " on conflict (surrogate_key) do nothing"
+        # With aggregates the rows actually inserted come back for their deltas (keys repeated within
+        # the batch are inserted only once by ON CONFLICT, so the staged rows would count them twice)
+        aggregated = list(dict.fromkeys(column for spec in specs for column in spec.group_by + spec.sums))
+        if aggregated:
+            returned = ', '.join(f'"{column}"' for column in aggregated)
+            insert_query += f" returning {returned}"
+
+        try:
+            logging.info(f"DatabaseManager: Merging {len(records)} {mapping_type} records via staging table ({strategy})...")
+            with REPORT.stage('merge_records', table=mapping_type, rows=len(records), strategy=strategy) as stage, self.engine.begin() as connection:
+                # Temp table has the target's columns and types, so values are converted while staging
+                connection.execute(text(f"drop table if exists {staging}"))
+                connection.execute(text(f"create temporary table {staging} as select * from {target} where 1 = 0"))
+                # Loaded by the plain name (to_sql does not find tables of the temp schema), the temp table comes first
+                stage['bytes_written'] = self._bulk_load(connection, records, staging_name, None, field_types_of=table_name)
+                result = connection.execute(text(insert_query))
+                if aggregated:
+                    inserted_rows = pd.DataFrame(result.fetchall(), columns=aggregated)
+                    self._update_aggregates(connection, mapping_type, lambda spec: spec.deltas_from_frame(inserted_rows))
+                    inserted = len(inserted_rows)
+                else:
+                    inserted = result.rowcount
+                connection.execute(text(f"drop table {staging}"))
+                stage['inserted'] = inserted
+            logging.info(f"DatabaseManager: Data merged successfully! Rows inserted: {inserted} of {len(records)} staged")
+            return True
+        except Exception as e:
+            logging.error(f"DatabaseManager: Error merging data: {e}")
+            return False
+
+    def _update_aggregates(self, connection, mapping_type: str, get_deltas: Callable[[AggregateSpec], pd.DataFrame]):
+        # Adds the deltas of newly inserted rows to every aggregate of the mapping type, in the insert's transaction
+        for spec in self.aggregates.get(mapping_type, []):
+            deltas = get_deltas(spec)
+            if not deltas.empty:
+                connection.execute(text(spec.upsert_sql(self.schema_name)).bindparams(*spec.upsert_params()), deltas.to_dict('records'))
+            logging.info(f"DatabaseManager: Aggregate {spec.table_name} updated with {len(deltas)} groups")
+
+    def rebuild_aggregates(self, aggregate_tables: Optional[List[str]] = None):
+        # Recomputes aggregates (the given ones, or all) from their whole source table
+        with self.engine.begin() as connection:
+            for source, specs in self.aggregates.items():
+                for spec in specs:
+                    if aggregate_tables is not None and spec.table_name not in aggregate_tables:
+                        continue
+                    for query in spec.rebuild_sql(self.schema_name, self.table_names[source]):
+                        connection.execute(text(query))
+                    logging.info(f"DatabaseManager: Aggregate {spec.table_name} rebuilt from {source}")
 
     def _select_data(self, query: str) -> pd.DataFrame:
         try:
@@ -82,10 +194,64 @@ class DatabaseManager:
             logging.error(f"DatabaseManager: Error selecting data: {e}")
             return pd.DataFrame()
 
-    def _insert_data(self, df: pd.DataFrame, table_name: str, schema: str):
+    def _insert_data(self, df: pd.DataFrame, table_name: str, schema: str) -> bool:
         try:
             logging.info("DatabaseManager: Inserting data to database...")
-            df.to_sql(table_name, self.engine, schema=schema, if_exists='append', index=False)
+            with REPORT.stage('insert_data', table=self.mapping_types.get(table_name, table_name), rows=len(df)) as stage, self.engine.begin() as connection:
+                stage['bytes_written'] = self._bulk_load(connection, df, table_name, schema)
+                self._update_aggregates(connection, self.mapping_types.get(table_name), lambda spec: spec.deltas_from_frame(df))
             logging.info(f"DatabaseManager: Data inserted successfully! Rows inserted: {df.shape[0]}")
+            return True
         except Exception as e:
             logging.error(f"DatabaseManager: Error inserting data: {e}")
+            return False
+
+    def _bulk_load(self, connection, df: pd.DataFrame, table_name: str, schema: str = None, field_types_of: str = None) -> Optional[int]:
+        """ Loads df into an existing table with COPY FROM STDIN on PostgreSQL/psycopg,
+            or with to_sql (multi-row INSERTs) on any other engine or when BULK_LOADER='to_sql'.
+            Compact frames are expanded to the table layout (per batch for COPY).
+            field_types_of: config table whose field types apply (for staging tables).
+            Returns the size of the COPY payload sent (None for to_sql, which does not expose it). """
+
+        dialect = connection.dialect
+        if BULK_LOADER == 'copy' and dialect.name == 'postgresql' and dialect.driver == 'psycopg':
+            return self._copy_data(connection, df, table_name, schema, self._integer_fields(field_types_of or table_name))
+        expand_frame(df).to_sql(table_name, connection, schema=schema, if_exists='append', index=False)
+        return None
+
+    def _integer_fields(self, table_name: str) -> List[str]:
+        fields = self.table_fields.get(table_name, {})
+        return [name for name, field in fields.items() if field['type'] == 'Integer']
+
+    def _copy_null(self, df: pd.DataFrame) -> str:
+        # NULL marker of a COPY. to_csv writes it unquoted, the same as a text value that happens to be
+        # the marker, which would then load as NULL: the marker is made longer until no value matches.
+        text_columns = df.select_dtypes(include=['object', 'string', 'category'])
+        null = self.COPY_NULL
+        while text_columns.isin([null]).any(axis=None):
+            null += self.COPY_NULL
+        return null
+
+    def _copy_data(self, connection, df: pd.DataFrame, table_name: str, schema: str, integer_fields: List[str]) -> int:
+        target = f"{schema}.{table_name}" if schema else table_name
+        columns = ', '.join(f'"{column}"' for column in expanded_columns(df.columns))
+        null = self._copy_null(df)
+        copy_query = f"copy {target} ({columns}) from stdin with (format csv, null '{null}')"
+
+        # Integer columns with missing values are floats in pandas ('2024.0'), which COPY rejects
+        to_integer = {c: 'Int64' for c in integer_fields if c in df.columns and pd.api.types.is_float_dtype(df[c])}
+
+        # Encode and send one batch at a time instead of building one CSV string for the whole frame
+        sent = 0
+        with connection.connection.driver_connection.cursor() as cursor, cursor.copy(copy_query) as copy:
+            for start in range(0, len(df), COPY_BATCH_SIZE):
+                batch = expand_frame(df.iloc[start:start + COPY_BATCH_SIZE])
+                if to_integer:
+                    batch = batch.astype(to_integer)
+                buffer = io.StringIO()
+                batch.to_csv(buffer, header=False, index=False, na_rep=null)
+                payload = buffer.getvalue().encode()
+                copy.write(payload)
+                sent += len(payload)
+        logging.debug(f"DatabaseManager: Copied {len(df)} rows into {target} in batches of {COPY_BATCH_SIZE}")
+        return sent
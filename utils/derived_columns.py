@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict
+
+NAT = np.datetime64('NaT', 'ns').view('i8')
+
+
+class DateParser:
+    """ pd.to_datetime with a fixed format, parsing every distinct value once per run:
+        statement dates repeat a lot, within a file and across files of the same bank.
+        Values are mapped back through pd.factorize codes, missing values stay NaT. """
+
+    MAX_CACHE_SIZE = 100_000 # distinct values, the cache starts over when full
+
+    def __init__(self, date_format: str):
+        self.date_format = date_format
+        self.cache: Dict[Any, int] = {} # raw value -> datetime64[ns] as int64
+
+    def parse(self, values: pd.Series) -> pd.Series:
+        codes, uniques = pd.factorize(values)
+        uniques = uniques.tolist()
+        missing = [value for value in uniques if value not in self.cache]
+        if missing:
+            if len(self.cache) + len(missing) > self.MAX_CACHE_SIZE:
+                self.cache.clear()
+                missing = uniques # values cached before are gone too
+            parsed = pd.to_datetime(pd.Series(missing), format=self.date_format)
+            if parsed.dtype != 'datetime64[ns]':
+                return pd.to_datetime(values, format=self.date_format) # e.g. tz-aware (%z), not cached
+            self.cache.update(zip(missing, parsed.to_numpy().view('i8').tolist()))
+
+        # Code -1 (missing value) picks the NaT appended at the end
+        parsed_uniques = np.fromiter((self.cache[value] for value in uniques), dtype='i8', count=len(uniques))
+        dates = np.append(parsed_uniques, NAT)[codes]
+        return pd.Series(dates.view('datetime64[ns]'), index=values.index, name=values.name)
+
+_DATE_PARSERS: Dict[str, DateParser] = {}
+
+def date_parser(date_format: str) -> DateParser:
+    # One parser (and cache) per date format for the whole process, shared by all files
+    if date_format not in _DATE_PARSERS:
+        _DATE_PARSERS[date_format] = DateParser(date_format)
+    return _DATE_PARSERS[date_format]
+
+def year_month(dates: pd.Series) -> pd.Series:
+    # Same values as dates.dt.strftime('%Y-%m'), but one string per distinct month instead of one per row
+    months = dates.dt.year * 12 + dates.dt.month - 1
+    codes, uniques = pd.factorize(months)
+    labels = np.array([f"{int(month) // 12}-{int(month) % 12 + 1:02d}" for month in uniques] + [np.nan], dtype=object)
+    return pd.Series(labels[codes], index=dates.index, name=dates.name)
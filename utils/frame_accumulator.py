@@ -0,0 +1,47 @@
+import logging
+import pandas as pd
+from typing import Dict, List, Iterable
+
+
+class FrameAccumulator:
+    """ Collects processed per-file frames for each mapping type and concatenates them once.
+        Appending with pd.concat per file copies the whole growing frame every time (quadratic);
+        here every frame is only referenced until materialize() builds the final one. """
+
+    def __init__(self, mapping_types: Iterable[str]):
+        self.frames: Dict[str, List[pd.DataFrame]] = {mapping_type: [] for mapping_type in mapping_types}
+        self.row_counts: Dict[str, int] = {mapping_type: 0 for mapping_type in self.frames}
+
+    def add(self, mapping_type: str, df: pd.DataFrame) -> int:
+        # Returns running total of rows for the mapping type
+        self.frames[mapping_type].append(df)
+        self.row_counts[mapping_type] += len(df)
+        return self.row_counts[mapping_type]
+
+    def materialize(self, mapping_type: str) -> pd.DataFrame:
+        frames = self.frames[mapping_type]
+        if not frames:
+            return pd.DataFrame()
+
+        # Align columns to the order they were first seen in, so frames with
+        # different column sets still line up (missing values become NaN)
+        columns = list(dict.fromkeys(column for df in frames for column in df.columns))
+        frames = [df if list(df.columns) == columns else df.reindex(columns=columns) for df in frames]
+
+        # Categoricals only survive concat if categories match, so give every frame the union
+        for column in columns:
+            if all(isinstance(df[column].dtype, pd.CategoricalDtype) for df in frames):
+                categories = pd.api.types.union_categoricals([df[column] for df in frames]).categories
+                frames = [df.assign(**{column: df[column].cat.set_categories(categories)}) for df in frames]
+
+        # Same column with different dtypes across files is upcast by concat; worth knowing about
+        for column in columns:
+            dtypes = {str(df[column].dtype) for df in frames}
+            if len(dtypes) > 1:
+                logging.debug(f"FrameAccumulator: Column '{column}' in '{mapping_type}' has mixed dtypes {sorted(dtypes)}, upcasting")
+
+        result = pd.concat(frames, ignore_index=True)
+
+        # Release per-file frames, only the materialized frame is kept alive
+        self.frames[mapping_type] = []
+        return result
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+
+try:
+    import resource # not on Windows, peak RSS is reported as None there
+except ImportError:
+    resource = None
+
+PROFILERS = ('cprofile', 'tracemalloc')
+MB = 1024 * 1024
+
+
+def peak_rss_mb(who: Optional[int] = None) -> Optional[float]:
+    # High water mark of the resident set of this process (or of its finished children)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    return peak / MB if sys.platform == 'darwin' else peak / 1024 # bytes on macOS, kilobytes elsewhere
+
+
+class RunReport:
+    """ Collects wall time, rows, rows/sec, bytes read/written and memory of every pipeline stage
+        (per file and per table) and writes them as a machine-readable JSON run report.
+        One instance per process (REPORT): pool workers hand the records of their file back to the
+        parent together with the processed frame, see DataManager._run_processors.
+        Memory: peak_rss_mb is the process high water mark when the stage ended, rss_growth_mb how much
+        the stage raised it; py_peak_mb (tracemalloc profiler only) is approximate when stages overlap. """
+
+    TOP_ALLOCATIONS = 25
+    TOP_FUNCTIONS = 25
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self.lock = threading.Lock() # stages run on pipeline threads
+        self.started_at = time.time()
+        self.profiler_name: Optional[str] = None
+        self.profiler: Optional[cProfile.Profile] = None
+
+    def start(self, profiler: str = ''):
+        # profiler: '' (off), 'cprofile' (main thread only, stats dumped to a .prof file) or 'tracemalloc'
+        self.records = []
+        self.started_at = time.time()
+        if profiler and profiler not in PROFILERS:
+            logging.warning(f"RunReport: Unknown profiler '{profiler}', expected one of: {PROFILERS}. Profiling is off")
+            profiler = ''
+        self.profiler_name = profiler or None
+        if profiler == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif profiler == 'tracemalloc':
+            tracemalloc.start()
+        if profiler:
+            logging.info(f"RunReport: Profiling with {profiler}")
+
+    @contextmanager
+    def stage(self, name: str, file: Optional[str] = None, table: Optional[str] = None, **values) -> Iterator[Dict[str, Any]]:
+        # Yields the stage record, so the caller can fill in 'rows', 'bytes_read', 'bytes_written' etc.
+        record: Dict[str, Any] = {'stage': name, 'file': file, 'table': table, **values}
+        rss_before = peak_rss_mb()
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        record['started_at'] = time.time()
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            rows = record.get('rows')
+            rss_after = peak_rss_mb()
+            record.update({
+                'seconds': round(seconds, 6)
+                , 'rows_per_sec': round(rows / seconds, 1) if rows and seconds > 0 else None
+                , 'peak_rss_mb': round(rss_after, 1) if rss_after is not None else None
+                , 'rss_growth_mb': round(rss_after - rss_before, 1) if rss_after is not None else None
+                , 'pid': os.getpid()
+                , 'thread': threading.current_thread().name
+            })
+            if tracing:
+                record['py_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / MB, 1)
+            if not record.pop('discard', False):
+                self.add([record])
+
+    def timed_iter(self, name: str, iterable: Iterable, **values) -> Iterator[Any]:
+        # One stage record per item, timing only how long the item took to produce (e.g. a CSV chunk)
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name, **values) as record:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    record['discard'] = True
+                    return
+                record['rows'] = len(item)
+            yield item
+
+    def add(self, records: List[Dict[str, Any]]):
+        with self.lock:
+            self.records.extend(records)
+
+    def pop_file_records(self, file: str) -> List[Dict[str, Any]]:
+        # Records of one file, removed from this report (a pool worker returns them to the parent)
+        with self.lock:
+            popped = [r for r in self.records if r['file'] == file]
+            self.records = [r for r in self.records if r['file'] != file]
+        return popped
+
+    def pop_records(self) -> List[Dict[str, Any]]:
+        # All records, removed from this report (a backfill worker returns them with its shard)
+        with self.lock:
+            popped, self.records = self.records, []
+        return popped
+
+    @staticmethod
+    def _aggregate(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        totals: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            total = totals.setdefault(record['stage'], {'count': 0, 'seconds': 0.0, 'rows': 0, 'bytes_read': 0, 'bytes_written': 0, 'peak_rss_mb': None})
+            total['count'] += 1
+            total['seconds'] += record['seconds']
+            for key in ('rows', 'bytes_read', 'bytes_written'):
+                total[key] += record.get(key) or 0
+            if record.get('peak_rss_mb') is not None:
+                total['peak_rss_mb'] = max(total['peak_rss_mb'] or 0, record['peak_rss_mb'])
+        for total in totals.values():
+            total['seconds'] = round(total['seconds'], 6)
+            total['rows_per_sec'] = round(total['rows'] / total['seconds'], 1) if total['rows'] and total['seconds'] > 0 else None
+        return totals
+
+    def _group(self, key: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for record in self.records:
+            if record.get(key):
+                groups.setdefault(record[key], []).append(record)
+        return {name: self._aggregate(records) for name, records in sorted(groups.items())}
+
+    def _stop_profiler(self, report_path: str) -> Dict[str, Any]:
+        if self.profiler_name == 'cprofile' and self.profiler is not None:
+            self.profiler.disable()
+            profile_path = os.path.splitext(report_path)[0] + '.prof'
+            self.profiler.dump_stats(profile_path)
+            stats = pstats.Stats(self.profiler)
+            top = [
+                {'function': pstats.func_std_string(func), 'calls': calls, 'total_seconds': round(total, 6), 'cumulative_seconds': round(cumulative, 6)}
+                for func, (_, calls, total, cumulative, _) in sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.TOP_FUNCTIONS]
+            ]
+            self.profiler = None
+            return {'profiler': 'cprofile', 'profile_path': profile_path, 'top_functions': top}
+        if self.profiler_name == 'tracemalloc' and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            top = [
+                {'location': str(stat.traceback), 'size_mb': round(stat.size / MB, 3), 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]
+            ]
+            return {'profiler': 'tracemalloc', 'py_peak_mb': round(peak / MB, 1), 'top_allocations': top}
+        return {}
+
+    def write(self, report_path: str, **extra) -> Dict[str, Any]:
+        # Stops the profiler (if any) and writes the report. extra: run level values, e.g. mode flags
+        profile = self._stop_profiler(report_path)
+        with self.lock:
+            records = sorted(self.records, key=lambda r: r['started_at'])
+        for record in records:
+            record['offset'] = round(record['started_at'] - self.started_at, 6) # from the start of the run
+
+        children_rss = peak_rss_mb(resource.RUSAGE_CHILDREN) if resource is not None else None
+        report = {
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat()
+            , 'seconds': round(time.time() - self.started_at, 6)
+            , 'peak_rss_mb': peak_rss_mb()
+            , 'children_peak_rss_mb': children_rss or None # worker processes that already exited
+            , **extra
+            , 'summary': self._aggregate(records)
+            , 'tables': self._group('table')
+            , 'files': self._group('file')
+            , 'stages': records
+            , **profile
+        }
+
+        # Write to a temp file first, same as the manifest
+        tmp_path = f"{report_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, default=str)
+        os.replace(tmp_path, report_path)
+        logging.info(f"RunReport: Wrote run report with {len(records)} stage records to {report_path}")
+        return report
+
+
+REPORT = RunReport()
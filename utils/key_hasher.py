@@ -0,0 +1,63 @@
+import hashlib
+import logging
+import multiprocessing
+import pandas as pd
+from typing import List, Sequence, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+
+def _md5_hex_batch(keys: List[str]) -> List[str]:
+    # Module level so it can be pickled and sent to worker processes
+    md5 = hashlib.md5
+    return [md5(key.encode()).hexdigest() for key in keys]
+
+
+def key_hash_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    # Pool for SurrogateKeyHasher, created once per run: spawning processes for every file
+    # (or streamed chunk) would cost more than it saves. None for one worker (hash in-process).
+    # Spawned, not forked: the caller may have other threads running (see pipeline).
+    # Worker processes only start with the first batch submitted.
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+class SurrogateKeyHasher:
+    """ Builds '#'-joined surrogate key strings column by column and md5-hashes them in batches.
+        Output is byte-identical to the former row-wise
+        `astype(str).agg('#'.join, axis=1)` + `hashlib.md5(...).hexdigest()` per row.
+        executor: process pool shared by the whole run (see key_hash_pool), None hashes in-process. """
+
+    SEPARATOR = '#'
+
+    def __init__(self, key_columns: Sequence[str], batch_size: int = 100_000, executor: Optional[Executor] = None):
+        self.key_columns = list(key_columns)
+        self.batch_size = max(1, batch_size)
+        self.executor = executor
+
+    def concat_keys(self, df: pd.DataFrame) -> pd.Series:
+        # Each column is cast to str on its own (same as DataFrame.astype(str)) and then
+        # joined with the vectorized str.cat instead of a Python join per row
+        first, *rest = [df[column].astype(str) for column in self.key_columns]
+        if not rest:
+            return first
+        return first.str.cat(rest, sep=self.SEPARATOR)
+
+    def hash_keys(self, concat_keys: pd.Series) -> pd.Series:
+        keys = concat_keys.tolist()
+
+        # md5 only releases the GIL for inputs over 2KB, so short keys are fanned out
+        # to processes, and only when there is more than one batch worth of work
+        if self.executor is not None and len(keys) > self.batch_size:
+            batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+            hashed = [digest for batch in self.executor.map(_md5_hex_batch, batches) for digest in batch]
+            logging.debug(f"SurrogateKeyHasher: Hashed {len(keys)} keys in {len(batches)} batches")
+        else:
+            hashed = _md5_hex_batch(keys)
+
+        return pd.Series(hashed, index=concat_keys.index, dtype=object)
+
+    def add_keys(self, df: pd.DataFrame) -> pd.DataFrame:
+        df['concat_key'] = self.concat_keys(df)
+        df['surrogate_key'] = self.hash_keys(df['concat_key'])
+        return df
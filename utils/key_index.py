@@ -0,0 +1,129 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from typing import Callable, Optional, Tuple
+from utils.compact import key_digests
+
+
+class SurrogateKeyIndex:
+    """ Local on-disk index of surrogate keys already in a table: sorted 16-byte digests in a
+        memory-mapped .npy file, optionally with a Bloom filter in front of the binary search.
+        It is only a cache of the table - verify() rebuilds it whenever key counts disagree.
+        Bloom file: the filter's size in bits (8 bytes, little endian), then the bits. """
+
+    BLOOM_HASHES = 3 # digest is already uniformly distributed, so its 32-bit words serve as hashes
+    BLOOM_HEADER = 8
+
+    def __init__(self, index_dir: str, name: str, bloom_bits_per_key: int = 10):
+        os.makedirs(index_dir, exist_ok=True)
+        self.keys_path = os.path.join(index_dir, f'{name}.keys.npy')
+        self.bloom_path = os.path.join(index_dir, f'{name}.bloom.npy')
+        self.name = name
+        self.bloom_bits_per_key = bloom_bits_per_key
+        self.keys = self._load(self.keys_path, np.empty(0, dtype='S16'))
+        self.bloom: Optional[np.ndarray] = None # packed bits
+        self.bloom_size = 0 # bits the positions were taken modulo, the packed array may be padded
+        self.modified = False
+        if bloom_bits_per_key:
+            self._load_bloom()
+
+    @staticmethod
+    def _load(path: str, default):
+        if not os.path.exists(path):
+            return default
+        return np.load(path, mmap_mode='r')
+
+    def _load_bloom(self):
+        bloom = self._load(self.bloom_path, None)
+        if bloom is not None and len(bloom) > self.BLOOM_HEADER:
+            size = int(np.frombuffer(bloom[:self.BLOOM_HEADER].tobytes(), dtype='<u8')[0])
+            if size >= 64 and len(bloom) - self.BLOOM_HEADER == (size + 7) // 8:
+                self.bloom, self.bloom_size = bloom[self.BLOOM_HEADER:], size
+                return
+
+        # Missing, or written by an older version without the size header
+        if len(self.keys):
+            logging.warning(f"SurrogateKeyIndex: '{self.name}' Bloom filter missing or unreadable, rebuilding it in memory")
+            self.bloom, self.bloom_size = self._build_bloom(self.keys)
+            self.modified = True
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def verify(self, key_count: int, load_keys: Callable[[], pd.DataFrame]) -> bool:
+        # key_count: distinct surrogate keys in the table (the index holds every key once).
+        # Returns True if the index matched the table, otherwise rebuilds it from load_keys()
+        if len(self.keys) == key_count:
+            logging.info(f"SurrogateKeyIndex: '{self.name}' index matches table ({key_count} keys)")
+            return True
+
+        logging.warning(f"SurrogateKeyIndex: '{self.name}' index has {len(self.keys)} keys, table has {key_count}. Rebuilding...")
+        keys_df = load_keys()
+        self.keys = np.unique(key_digests(keys_df)) if not keys_df.empty else np.empty(0, dtype='S16')
+        self.save()
+        return False
+
+    def contains(self, digests: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(digests), dtype=bool)
+        if len(self.keys) == 0 or len(digests) == 0:
+            return found
+
+        # Bloom filter rules out most new keys without touching the (memory-mapped) key array
+        candidates = np.flatnonzero(self._bloom_contains(digests)) if self.bloom is not None else np.arange(len(digests))
+        positions = np.searchsorted(self.keys, digests[candidates])
+        in_range = positions < len(self.keys)
+        hits = np.zeros(len(candidates), dtype=bool)
+        hits[in_range] = self.keys[positions[in_range]] == digests[candidates][in_range]
+        found[candidates] = hits
+        return found
+
+    def add(self, digests: np.ndarray):
+        # In memory only, call save() once the batch of uploads is done. The Bloom filter keeps its
+        # size until then (more false positives, never a false negative)
+        if len(digests):
+            self.keys = np.union1d(self.keys, digests)
+            if self.bloom is not None:
+                if not self.bloom.flags.writeable:
+                    self.bloom = np.array(self.bloom) # memory-mapped read-only
+                positions = self._bloom_positions(digests, self.bloom_size).ravel()
+                np.bitwise_or.at(self.bloom, positions >> 3, np.left_shift(1, positions & 7).astype(np.uint8))
+            elif self.bloom_bits_per_key:
+                self.bloom, self.bloom_size = self._build_bloom(self.keys) # first keys of an empty index
+            self.modified = True
+
+    def save(self):
+        self._save_array(self.keys_path, np.ascontiguousarray(self.keys))
+        if self.bloom_bits_per_key:
+            bloom, size = self._build_bloom(self.keys)
+            header = np.frombuffer(np.array([size], dtype='<u8').tobytes(), dtype=np.uint8)
+            self._save_array(self.bloom_path, np.concatenate([header, bloom]))
+        self.keys = self._load(self.keys_path, self.keys)
+        if self.bloom_bits_per_key:
+            self._load_bloom()
+        self.modified = False
+        logging.info(f"SurrogateKeyIndex: Saved '{self.name}' index with {len(self.keys)} keys")
+
+    @staticmethod
+    def _save_array(path: str, array: np.ndarray):
+        # Write next to the target and swap, readers never see a half-written file
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    def _bloom_positions(self, digests: np.ndarray, size_bits: int) -> np.ndarray:
+        words = np.frombuffer(digests.tobytes(), dtype='<u4').reshape(-1, 4)[:, :self.BLOOM_HASHES]
+        return words.astype(np.uint64) % size_bits
+
+    def _build_bloom(self, keys: np.ndarray) -> Tuple[np.ndarray, int]:
+        # (packed bits, size in bits); packbits pads to whole bytes, lookups must use the size
+        size_bits = max(64, len(keys) * self.bloom_bits_per_key)
+        bits = np.zeros(size_bits, dtype=bool)
+        if len(keys):
+            bits[self._bloom_positions(keys, size_bits).ravel()] = True
+        return np.packbits(bits, bitorder='little'), size_bits
+
+    def _bloom_contains(self, digests: np.ndarray) -> np.ndarray:
+        positions = self._bloom_positions(digests, self.bloom_size)
+        bits = (self.bloom[positions >> 3] >> (positions & 7).astype(np.uint8)) & 1
+        return bits.all(axis=1)
@@ -0,0 +1,108 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class RunManifest:
+    """ Persistent record of CSV files that were processed and uploaded successfully.
+        A file is skipped on later runs while its size, mtime (or, if only mtime changed,
+        its content hash) and the config version used to process it stay the same. """
+
+    HASH_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+        self.modified = False # entries changed since load/save
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.manifest_path):
+            logging.info(f"RunManifest: No manifest at {self.manifest_path}, all files will be processed")
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except Exception as e:
+            # A broken manifest only costs a full reprocess, never a wrong skip
+            logging.error(f"RunManifest: Error reading manifest {self.manifest_path}, ignoring it. Error: {e}")
+            return {}
+
+    @staticmethod
+    def config_version(file_specific_config: Dict[str, Any]) -> str:
+        config_json = json.dumps(file_specific_config, sort_keys=True, default=str)
+        return hashlib.sha256(config_json.encode()).hexdigest()[:16]
+
+    @classmethod
+    def content_hash(cls, csv_file_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(csv_file_path, 'rb') as file:
+            for block in iter(lambda: file.read(cls.HASH_BLOCK_SIZE), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def is_unchanged(self, csv_file_path: str, config_version: str) -> bool:
+        entry = self.entries.get(os.path.basename(csv_file_path))
+        if not entry or entry['config_version'] != config_version:
+            return False
+
+        stat = os.stat(csv_file_path)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime == entry['mtime']:
+            return True
+
+        # Same size, different mtime (copied or touched): content decides
+        if self.content_hash(csv_file_path) != entry['content_hash']:
+            return False
+        entry['mtime'] = stat.st_mtime
+        self.modified = True
+        return True
+
+    def changed_files(self, csv_files_paths: List[str], data_config: Dict[str, Any]) -> List[str]:
+        # Files DataManager would process: new or changed ones that match file_pattern and have a config.
+        # Needs neither pandas nor the database, so a run with nothing to do can stop right away.
+        csv_file_pattern = data_config.get('file_pattern')
+        csv_mapping_config = data_config.get('mapping')
+        if not csv_file_pattern or not csv_mapping_config:
+            return csv_files_paths # DataManager reports the broken config
+
+        changed = []
+        for csv_file_path in csv_files_paths:
+            file_config = self.file_config(csv_file_path, data_config)
+            if file_config and not self.is_unchanged(csv_file_path, self.config_version(file_config[1])):
+                changed.append(csv_file_path)
+        return changed
+
+    @staticmethod
+    def file_config(csv_file_path: str, data_config: Dict[str, Any]) -> Optional[Tuple[Tuple[str, str, str], Dict[str, Any]]]:
+        # ((bank, acc_type, mapping_type), file specific config) of a file, None if DataManager would not process it
+        groups = re.match(data_config['file_pattern'], os.path.basename(csv_file_path))
+        if not groups or len(groups.groups()) != 3:
+            return None
+        bank, _, mapping_type = groups.groups()
+        file_specific_config = (data_config['mapping'].get(mapping_type) or {}).get(bank)
+        return (groups.groups(), file_specific_config) if file_specific_config else None
+
+    def record(self, csv_file_path: str, config_version: str):
+        stat = os.stat(csv_file_path)
+        self.entries[os.path.basename(csv_file_path)] = {
+            'size': stat.st_size
+            , 'mtime': stat.st_mtime
+            , 'content_hash': self.content_hash(csv_file_path)
+            , 'config_version': config_version
+            , 'processed_at': datetime.now(timezone.utc).isoformat()
+        }
+
+    def save(self):
+        # Write to a temp file first, so an interrupted run cannot leave a half-written manifest
+        tmp_path = f"{self.manifest_path}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self.modified = False
+        logging.info(f"RunManifest: Saved {len(self.entries)} entries to {self.manifest_path}")
@@ -0,0 +1,130 @@
+import time
+import logging
+import threading
+import pandas as pd
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Future
+from utils.compact import key_digests
+from utils.key_index import SurrogateKeyIndex
+from utils.instrumentation import REPORT
+from utils.data_manager import DataManager
+from utils.db_manager import DatabaseManager
+from config.settings import DEDUP_STRATEGY, KEY_INDEX_DIR, KEY_INDEX_BLOOM_BITS
+
+MAPPING_TYPES = ('stm', 'sec')
+
+
+class StageClock:
+    """ Runs pipeline stages and logs their start/finish offsets from the start of the run,
+        so overlapping stages are visible in the log. Each stage is also a run report record. """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def run(self, stage: str, func: Callable, *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        thread = threading.current_thread().name
+        logging.info(f"Pipeline: Stage '{stage}' started at +{start - self.started:.2f}s [{thread}]")
+        try:
+            with REPORT.stage(f'pipeline: {stage}'):
+                return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            logging.info(f"Pipeline: Stage '{stage}' finished at +{end - self.started:.2f}s, took {end - start:.2f}s [{thread}]")
+
+
+def prefetch_existing_keys(db_future: Future, dedup_mode: str, mapping_type: str) -> Any:
+    # What a load branch needs from the database before dedup: all keys ('client'),
+    # a verified local key index ('index') or nothing ('server' dedups in the database)
+    db_manager = db_future.result()
+    if dedup_mode == 'client':
+        return db_manager.get_existing_keys(mapping_type)
+    if dedup_mode == 'index':
+        return open_key_index(db_manager, mapping_type)
+    return None
+
+def refresh_known_keys(db_manager: DatabaseManager, dedup_mode: str, mapping_type: str, known_keys: Any) -> Any:
+    # Keys kept in memory between batches (watch mode) are reused while the table's (distinct key)
+    # count still matches them; a count query is far cheaper than downloading every key again
+    if dedup_mode == 'index':
+        known_keys.verify(db_manager.count_distinct_keys(mapping_type), lambda: db_manager.get_existing_keys(mapping_type))
+        return known_keys
+    if dedup_mode == 'client':
+        row_count = db_manager.count_records(mapping_type)
+        if len(known_keys) != row_count:
+            logging.warning(f"Pipeline: {len(known_keys)} known {mapping_type} keys, table has {row_count}. Fetching keys again...")
+            return db_manager.get_existing_keys(mapping_type)
+    return known_keys
+
+def completed(value: Any) -> Future:
+    # Already resolved future, for passing values kept in memory where a prefetch is expected
+    future = Future()
+    future.set_result(value)
+    return future
+
+def open_key_index(db_manager: DatabaseManager, mapping_type: str) -> SurrogateKeyIndex:
+    name = f"{db_manager.schema_name}.{db_manager.table_names[mapping_type]}"
+    key_index = SurrogateKeyIndex(KEY_INDEX_DIR, name, KEY_INDEX_BLOOM_BITS)
+    key_index.verify(db_manager.count_distinct_keys(mapping_type), lambda: db_manager.get_existing_keys(mapping_type))
+    return key_index
+
+def load_mapping_type(data_manager: DataManager, db_manager: DatabaseManager, dedup_mode: str, mapping_type: str, records: pd.DataFrame, prefetch_future: Future, known_keys: Optional[Dict[str, Any]] = None) -> bool:
+    # Dedups and uploads one mapping type (ready frame + its streamed files). Returns upload success.
+    # known_keys: if given, receives the mapping type's keys after the upload (watch mode keeps them)
+    prefetched = prefetch_future.result()
+    if dedup_mode == 'server':
+        return _load_server_side(data_manager, db_manager, mapping_type, records)
+    if dedup_mode == 'index':
+        if known_keys is not None:
+            known_keys[mapping_type] = prefetched # updated in place
+        return _load_with_key_index(data_manager, db_manager, mapping_type, records, prefetched)
+    return _load_client_side(data_manager, db_manager, mapping_type, records, prefetched, known_keys)
+
+def _load_server_side(data_manager: DataManager, db_manager: DatabaseManager, mapping_type: str, records: pd.DataFrame) -> bool:
+    # Database filters out existing records itself, no need to download keys
+    uploaded = db_manager.merge_records(mapping_type, records, strategy=DEDUP_STRATEGY)
+
+    # Stream files configured with a chunk_size, one chunk at a time
+    for _, chunk in data_manager.iter_streaming_chunks(mapping_type):
+        uploaded = db_manager.merge_records(mapping_type, chunk, strategy=DEDUP_STRATEGY) and uploaded
+
+    return uploaded
+
+def _load_with_key_index(data_manager: DataManager, db_manager: DatabaseManager, mapping_type: str, records: pd.DataFrame, key_index: SurrogateKeyIndex) -> bool:
+    # Local index replaces the key download; it was rebuilt from the table if row counts disagreed
+    def upload(chunk: pd.DataFrame) -> bool:
+        new_records = data_manager.get_new_records_from_index(chunk, key_index, df_name=mapping_type)
+        success = db_manager.upload_records(mapping_type, new_records)
+        if success and not new_records.empty:
+            key_index.add(key_digests(new_records))
+        return success
+
+    uploaded = upload(records)
+
+    # Stream files configured with a chunk_size, one chunk at a time (index grows with every upload)
+    for _, chunk in data_manager.iter_streaming_chunks(mapping_type):
+        uploaded = upload(chunk) and uploaded
+
+    if key_index.modified:
+        key_index.save()
+    return uploaded
+
+def _load_client_side(data_manager: DataManager, db_manager: DatabaseManager, mapping_type: str, records: pd.DataFrame, existing_keys: pd.DataFrame, known_keys: Optional[Dict[str, Any]] = None) -> bool:
+    # Get only new records from DataFrames to be uploaded to database
+    new_records = data_manager.get_new_records(records, existing_keys, df_name=f"{mapping_type}_df")
+
+    # Upload new records to database
+    uploaded = db_manager.upload_records(mapping_type, new_records)
+
+    # Stream files configured with a chunk_size through dedup and upload, one chunk at a time
+    keys = {mapping_type: data_manager.extend_keys(existing_keys, new_records)}
+    for _, new_chunk in data_manager.iter_new_streaming_records(keys, mapping_type):
+        uploaded = db_manager.upload_records(mapping_type, new_chunk) and uploaded
+
+    # Keys of failed uploads are kept too; the row count check in refresh_known_keys catches that
+    if known_keys is not None:
+        known_keys[mapping_type] = keys[mapping_type]
+    return uploaded
@@ -0,0 +1,139 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+
+
+class ReadPlan:
+    """ read_csv arguments compiled once per mapping_type/bank config.
+        Optional file config keys:
+          dtypes: {original column: dtype}  - explicit dtypes, e.g. 'string' or 'category'
+          decimal_separator: ','            - parse decimal commas in read_csv instead of a str.replace pass
+          csv_engine: 'pyarrow'             - faster parser (optional pyarrow package)
+        Neither dtypes nor decimal_separator change surrogate key columns: keys are built from str() of the
+        values as a plain read gives them, '12,50' parsed to 12.5 would no longer match rows in the database. """
+
+    DATE_FIELDS = ('dt', 'send_dt', 'effect_dt') # parsed from their text in FileProcessor._transform
+    # Default na_values of read_csv, as documented (pandas 2.x): missing values with either engine
+    NA_VALUES = [
+        '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN'
+        , '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+    ]
+    BOOL_VALUES = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False} # read_csv defaults
+
+    def __init__(self, file_specific_config: Dict[str, Any], default_engine: str = 'c'):
+        self.separator = file_specific_config['csv_separator']
+        self.usecols: List[str] = list(file_specific_config['original_fields'].keys())
+        self.engine: str = file_specific_config.get('csv_engine', default_engine)
+
+        # Original names of the columns whose text matters: the surrogate key is built from str() of
+        # the key columns as the c engine reads them, dates are parsed with the configured format
+        original_fields = file_specific_config['original_fields']
+        key_fields = file_specific_config.get('surrogate_key_columns') or []
+        self.date_columns: List[str] = [original for original, field in original_fields.items() if field in self.DATE_FIELDS]
+        self.key_columns: List[str] = [original for original, field in original_fields.items() if field in key_fields]
+
+        self.dtypes: Dict[str, Any] = self._resolve_dtypes(file_specific_config)
+        self.decimal: Optional[str] = self._resolve_decimal(file_specific_config)
+
+    def _resolve_dtypes(self, file_specific_config: Dict[str, Any]) -> Dict[str, Any]:
+        dtypes = dict(file_specific_config.get('dtypes') or {})
+        ignored = [column for column in dtypes if column in self.key_columns]
+        if ignored:
+            # {'Qty': 'float64'} would turn key text '10' into '10.0'
+            logging.warning(f"ReadPlan: dtypes of surrogate key columns ignored: {ignored}")
+        return {column: dtype for column, dtype in dtypes.items() if column not in ignored}
+
+    def _resolve_decimal(self, file_specific_config: Dict[str, Any]) -> Optional[str]:
+        decimal = file_specific_config.get('decimal_separator')
+        if not decimal or decimal == '.':
+            return None
+        if self.engine == 'pyarrow':
+            logging.warning("ReadPlan: decimal_separator is not supported by the pyarrow engine and is ignored")
+            return None
+        return decimal
+
+    def read_csv_kwargs(self, chunksize: Optional[int] = None, dtypes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            'sep': self.separator
+            , 'encoding': 'utf-8'
+            , 'usecols': self.usecols
+            , 'engine': self.engine
+        }
+
+        # Explicit config dtypes always win over the ones passed in (e.g. inferred for streaming)
+        merged_dtypes = {**(dtypes or {}), **self.dtypes}
+        if self.decimal:
+            # decimal applies to every column: key columns are read as text, see restore_key_types
+            kwargs['decimal'] = self.decimal
+            merged_dtypes.update({column: str for column in self.key_columns})
+        if merged_dtypes:
+            kwargs['dtype'] = merged_dtypes
+        if chunksize:
+            kwargs['chunksize'] = chunksize
+            if self.engine == 'pyarrow':
+                kwargs['engine'] = 'c' # pyarrow engine cannot read in chunks
+        return kwargs
+
+    def read_csv(self, csv_file_path: str) -> pd.DataFrame:
+        """ Whole file read with read_csv_kwargs. pandas' pyarrow engine infers dates, times and timestamps
+            in text columns and applies dtype only afterwards ('2024-01-15T10:00' comes back as
+            '2024-01-15 10:00:00', a missing value as 'NaT'), which would change surrogate keys and date
+            parsing. So pyarrow is called directly, with the date columns typed as strings; key columns it
+            still reads as dates or times are read again as the c engine reads them. """
+
+        kwargs = self.read_csv_kwargs()
+        if kwargs['engine'] != 'pyarrow':
+            return self.restore_key_types(pd.read_csv(csv_file_path, **kwargs))
+
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+
+        table = pa_csv.read_csv(
+            csv_file_path
+            , parse_options=pa_csv.ParseOptions(delimiter=self.separator)
+            , convert_options=pa_csv.ConvertOptions(
+                include_columns=self.usecols
+                , column_types={column: pa.string() for column in self.date_columns}
+                , null_values=self.NA_VALUES
+                , strings_can_be_null=True
+            )
+        )
+        # All-missing columns are float64 NaN, as with the c engine
+        table = table.cast(pa.schema([pa.field(f.name, pa.float64()) if pa.types.is_null(f.type) else f for f in table.schema]))
+        df = table.to_pandas()
+
+        strings = [f.name for f in table.schema if pa.types.is_string(f.type)]
+        df[strings] = df[strings].fillna(np.nan) # None -> NaN, so str() gives 'nan' like the c engine
+        temporal = [column for column in self.key_columns if pa.types.is_temporal(table.schema.field(column).type)]
+        if temporal:
+            df[temporal] = pd.read_csv(csv_file_path, sep=self.separator, encoding='utf-8', usecols=temporal, engine='c')[temporal]
+        return df.astype(kwargs['dtype']) if 'dtype' in kwargs else df
+
+    def restore_key_types(self, df: pd.DataFrame, dtypes: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """ Key columns read as text (with decimal_separator) get the type a read without decimal would
+            have given them: numbers ('0012' -> 12, '12.50' -> 12.5, int with blanks -> float) and
+            booleans, anything else stays text. dtypes: the whole file's types of a streamed chunk. """
+
+        if not self.decimal:
+            return df
+        for column in self.key_columns:
+            values = self._default_type(df[column])
+            target = (dtypes or {}).get(column)
+            if target is None:
+                df[column] = values
+            elif target != object:
+                df[column] = values.astype(target) # e.g. int64 in this chunk, float64 in the whole file
+        return df
+
+    @classmethod
+    def _default_type(cls, values: pd.Series) -> pd.Series:
+        try:
+            return pd.to_numeric(values)
+        except (ValueError, TypeError):
+            pass
+        present = values.dropna()
+        if len(present) and present.isin(list(cls.BOOL_VALUES)).all():
+            flags = values.map(cls.BOOL_VALUES)
+            return flags.astype(bool) if len(present) == len(values) else flags.astype(object)
+        return values
@@ -0,0 +1,58 @@
+import os
+import logging
+import importlib.util
+import pandas as pd
+from typing import Dict, Any, Optional
+from utils.manifest import RunManifest
+from utils.read_plan import ReadPlan
+
+
+class StagingCache:
+    """ Parquet copies of transformed files (regular layout, before compaction), keyed by file content
+        hash, the file name parts and a version of the config together with the effective read_csv
+        arguments (engine, dtypes, decimal separator), which can change key columns. A later run of the same content and config reads
+        the staged frame back instead of parsing and transforming the CSV again, e.g. a --full-reprocess
+        into a freshly initialized database. Entries are never updated in place; delete any at any time. """
+
+    FORMAT_VERSION = 2 # bump when the transformation gives different output for the same file and config
+
+    def __init__(self, staging_dir: str):
+        self.staging_dir = staging_dir
+        os.makedirs(staging_dir, exist_ok=True)
+
+    def path(self, csv_file_path: str, mapping_type: str, bank: str, acc_type: str, file_specific_config: Dict[str, Any], read_plan: ReadPlan) -> str:
+        content_hash = RunManifest.content_hash(csv_file_path)[:32]
+        config_version = RunManifest.config_version({'config': file_specific_config, 'read_csv': read_plan.read_csv_kwargs()})
+        return os.path.join(self.staging_dir, f"{mapping_type}_{bank}_{acc_type}_{content_hash}_{config_version}_v{self.FORMAT_VERSION}.parquet")
+
+    def load(self, staged_path: str) -> Optional[pd.DataFrame]:
+        if not os.path.exists(staged_path):
+            return None
+        try:
+            return pd.read_parquet(staged_path)
+        except Exception as e:
+            # A broken entry only costs a reprocess of the file
+            logging.warning(f"StagingCache: Error reading {staged_path}, processing the CSV file instead. Error: {e}")
+            return None
+
+    def save(self, staged_path: str, df: pd.DataFrame):
+        # Temp file per process: two workers may stage the same content at the same time
+        tmp_path = f"{staged_path}.{os.getpid()}.tmp"
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, staged_path)
+        except Exception as e:
+            logging.warning(f"StagingCache: Error staging {staged_path}. Error: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def open_staging_cache(staging_dir: str) -> Optional[StagingCache]:
+    # None (no staging) if staging_dir is empty or the optional pyarrow package is missing
+    if not staging_dir:
+        return None
+    if importlib.util.find_spec('pyarrow') is None:
+        logging.warning("StagingCache: Staging needs the optional pyarrow package and is disabled")
+        return None
+    logging.info(f"StagingCache: Staging transformed files in {staging_dir}")
+    return StagingCache(staging_dir)
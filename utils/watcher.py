@@ -0,0 +1,173 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import logging
+import ctypes.util
+from typing import Dict, List, Optional, Set, Tuple, Iterable, Iterator
+
+# inotify(7) constants, see <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len (name follows, NUL padded)
+
+
+class InotifyWatch:
+    """ Minimal inotify watch on one directory through libc (Linux only, no extra package).
+        Raises OSError if inotify is not available, so the caller can fall back to polling. """
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory: str):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, "libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+
+    def read(self, timeout: Optional[float]) -> Optional[Set[str]]:
+        # Names of files with events, empty on timeout. None if the kernel queue overflowed
+        # (events were lost, the caller has to rescan the directory)
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        names: Set[str] = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = IN_EVENT_HEADER.unpack_from(data, offset)
+            offset += IN_EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if length:
+                names.add(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DirectoryWatcher:
+    """ Yields batches of files (by suffix) that appeared or changed in a directory and then kept the
+        same size and mtime for `debounce` seconds, so files still being written are not picked up.
+        Uses inotify where available and polls the directory every poll_interval seconds otherwise.
+        Files present when the watcher starts count as seen; handle them before calling batches(). """
+
+    def __init__(self, directory: str, suffix: str = '.csv', debounce: float = 2.0, poll_interval: float = 5.0, use_inotify: bool = True):
+        self.directory = directory
+        self.suffix = suffix
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.seen: Dict[str, Tuple[int, float]] = self._scan()
+        self.pending: Dict[str, Tuple[Tuple[int, float], float]] = {} # path -> (stat, stable since)
+        self.inotify: Optional[InotifyWatch] = None
+        if use_inotify:
+            try:
+                self.inotify = InotifyWatch(directory)
+                logging.info(f"DirectoryWatcher: Watching {directory} with inotify (debounce {debounce}s)")
+            except OSError as e:
+                logging.warning(f"DirectoryWatcher: inotify not available ({e}), polling {directory} every {poll_interval}s")
+        else:
+            logging.info(f"DirectoryWatcher: Polling {directory} every {poll_interval}s (debounce {debounce}s)")
+
+    def _stat(self, path: str) -> Optional[Tuple[int, float]]:
+        try:
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        stats = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                path = os.path.join(self.directory, name)
+                stat = self._stat(path)
+                if stat is not None:
+                    stats[path] = stat
+        return stats
+
+    def _mark(self, paths: Iterable[str], now: float):
+        # New or changed files (compared to what was handed out already) start their debounce
+        for path in paths:
+            stat = self._stat(path)
+            if stat is None or self.seen.get(path) == stat:
+                continue
+            if path not in self.pending or self.pending[path][0] != stat:
+                self.pending[path] = (stat, now)
+
+    def _ready(self, now: float) -> List[str]:
+        ready = []
+        for path, (stat, stable_since) in list(self.pending.items()):
+            current = self._stat(path)
+            if current is None:
+                del self.pending[path] # deleted (or renamed) before it settled
+            elif current != stat:
+                self.pending[path] = (current, now) # still being written
+            elif now - stable_since >= self.debounce:
+                ready.append(path)
+                self.seen[path] = current
+                del self.pending[path]
+        return sorted(ready)
+
+    def requeue(self, paths: List[str], delay: float):
+        # Hands paths out again after debounce + delay (e.g. their upload failed)
+        retry_at = time.monotonic() + delay
+        for path in paths:
+            stat = self._stat(path)
+            self.seen.pop(path, None)
+            if stat is not None:
+                self.pending[path] = (stat, retry_at)
+
+    def _wait(self) -> Optional[Set[str]]:
+        # Changed paths, or None when the whole directory has to be rescanned
+        timeout = self.poll_interval
+        if self.pending:
+            now = time.monotonic()
+            next_due = min(stable_since for _, stable_since in self.pending.values()) + self.debounce
+            timeout = min(timeout, max(0.05, next_due - now))
+
+        if self.inotify is None:
+            time.sleep(timeout)
+            return None
+        names = self.inotify.read(timeout)
+        if names is None:
+            logging.warning("DirectoryWatcher: inotify queue overflowed, rescanning directory")
+            return None
+        return {os.path.join(self.directory, name) for name in names if name.endswith(self.suffix)}
+
+    def batches(self) -> Iterator[List[str]]:
+        try:
+            while True:
+                changed = self._wait()
+                now = time.monotonic()
+                self._mark(self._scan().keys() if changed is None else changed, now)
+                ready = self._ready(now)
+                if ready:
+                    yield ready
+        finally:
+            self.close()
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None